@@ -0,0 +1,162 @@
+"""
+Account Profiles
+================
+Per-account behavioral profile table: trade count, PnL statistics, win rate,
+average size, total fees, long/short mix, PnL per sentiment and first/last
+activity, built in one grouped pass.
+
+Accounts are integer-coded once and every measure is accumulated with
+np.bincount (see metrics.group_stats), so building the table costs a few
+passes over flat arrays however many accounts there are. Top-K and
+bottom-K queries use np.argpartition and only sort the K selected rows.
+
+Usage:
+    python accounts.py --by Total_PnL --top 10
+    python accounts.py --by Win_Rate --bottom 10 --min-trades 50
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pipeline import SENTIMENT_ORDER, NAT, find_trader_file, load_merged_data
+from metrics import group_codes, group_stats
+
+# Per-sentiment columns, e.g. 'Avg_PnL (Extreme Fear)'
+SENTIMENT_TRADE_COLUMNS = [f'Trades ({sentiment})' for sentiment in SENTIMENT_ORDER]
+SENTIMENT_PNL_COLUMNS = [f'Avg_PnL ({sentiment})' for sentiment in SENTIMENT_ORDER]
+
+# Profile columns that can rank accounts
+RANKING_COLUMNS = ['Total_PnL', 'Avg_PnL', 'Median_PnL', 'Std_PnL', 'Win_Rate', 'Trade_Count',
+                   'Avg_Trade_Size', 'Total_Fees', 'Buy_Share', 'Active_Days'] + SENTIMENT_PNL_COLUMNS
+
+
+class AccountProfiles:
+    """Profile table indexed by account, with top-K/bottom-K queries."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def top(self, metric, k=10, ascending=False, min_trades=1):
+        """The k accounts with the largest `metric` (smallest when ascending).
+
+        Accounts with fewer than `min_trades` trades or no value are skipped.
+        """
+        values = self.table[metric].to_numpy(dtype='float64')
+        candidates = np.flatnonzero(~np.isnan(values) &
+                                    (self.table['Trade_Count'].to_numpy() >= min_trades))
+        keys = values[candidates] if ascending else -values[candidates]
+        if k < len(keys):
+            selected = np.argpartition(keys, k - 1)[:k]
+        else:
+            selected = np.arange(len(keys))
+        selected = selected[np.argsort(keys[selected], kind='stable')]
+        return self.table.iloc[candidates[selected]]
+
+    def bottom(self, metric, k=10, min_trades=1):
+        """The k accounts with the smallest `metric`."""
+        return self.top(metric, k, ascending=True, min_trades=min_trades)
+
+    def profile(self, account):
+        """One account's profile as a Series."""
+        return self.table.loc[account]
+
+    def sentiment_pnl(self, account):
+        """Average PnL per sentiment of one account, indexed by SENTIMENT_ORDER."""
+        row = self.table.loc[account, SENTIMENT_PNL_COLUMNS].astype('float64')
+        row.index = pd.Index(SENTIMENT_ORDER, name='classification')
+        return row
+
+
+def build_account_profiles(merged_data):
+    """Build AccountProfiles from a merged trade frame."""
+    accounts = merged_data['Account'].astype('category')
+    names = accounts.cat.categories
+    n_accounts = len(names)
+    codes = accounts.cat.codes.to_numpy().astype('int64')
+
+    pnl = merged_data['Closed PnL'].to_numpy(dtype='float64')
+    size = merged_data['Size USD'].to_numpy(dtype='float64')
+    table = group_stats(codes, n_accounts, pnl, size)
+
+    valid = codes >= 0
+    codes, pnl = codes[valid], pnl[valid]
+
+    def per_account(weights):
+        return np.bincount(codes, weights=weights, minlength=n_accounts)
+
+    count = table['Trade_Count'].to_numpy()
+    if 'Fee' in merged_data.columns:
+        fee = merged_data['Fee'].to_numpy(dtype='float64')[valid]
+        table['Total_Fees'] = per_account(np.nan_to_num(fee))
+    side = group_codes(merged_data['Side'], ['BUY', 'SELL'])[valid]
+    table['Buy_Count'] = per_account(side == 0).astype('int64')
+    table['Sell_Count'] = per_account(side == 1).astype('int64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['Buy_Share'] = table['Buy_Count'] / count * 100
+
+    # Trades and average PnL per (account, sentiment) from one combined code
+    sentiment = group_codes(merged_data['classification'], SENTIMENT_ORDER)[valid]
+    n_sentiments = len(SENTIMENT_ORDER)
+    combined = codes[sentiment >= 0] * n_sentiments + sentiment[sentiment >= 0]
+    sentiment_count = np.bincount(combined, minlength=n_accounts * n_sentiments)
+    sentiment_pnl = np.bincount(combined, weights=pnl[sentiment >= 0],
+                                minlength=n_accounts * n_sentiments)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sentiment_avg = (sentiment_pnl / sentiment_count).reshape(n_accounts, n_sentiments)
+    sentiment_count = sentiment_count.reshape(n_accounts, n_sentiments)
+    for i in range(n_sentiments):
+        table[SENTIMENT_TRADE_COLUMNS[i]] = sentiment_count[:, i]
+        table[SENTIMENT_PNL_COLUMNS[i]] = sentiment_avg[:, i]
+
+    # First/last activity and number of distinct trading days
+    days = merged_data['date'].to_numpy(dtype='datetime64[D]').astype('int64')[valid]
+    first = np.full(n_accounts, np.iinfo('int64').max)
+    last = np.full(n_accounts, np.iinfo('int64').min)
+    np.minimum.at(first, codes, days)
+    np.maximum.at(last, codes, days)
+    present = count > 0
+    for column, bound in [('First_Trade', first), ('Last_Trade', last)]:
+        bound = np.where(present, bound, NAT).astype('datetime64[D]')
+        table[column] = bound.astype('datetime64[ns]')
+    active_days = np.zeros(n_accounts, dtype='int64')
+    if len(days):
+        span = days.max() - days.min() + 1
+        account_days = np.sort(codes * span + (days - days.min()))
+        distinct = np.ones(len(account_days), dtype=bool)
+        distinct[1:] = account_days[1:] != account_days[:-1]
+        active_days = np.bincount(account_days[distinct] // span, minlength=n_accounts)
+    table['Active_Days'] = active_days
+
+    table.index = pd.Index(names, name='Account')
+    return AccountProfiles(table[present])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-account profiles and rankings")
+    parser.add_argument('--by', default='Total_PnL', choices=RANKING_COLUMNS,
+                        help="profile column to rank accounts by")
+    parser.add_argument('--top', type=int, default=10, help="number of best accounts to show")
+    parser.add_argument('--bottom', type=int, default=0, help="number of worst accounts to show")
+    parser.add_argument('--min-trades', type=int, default=1,
+                        help="skip accounts with fewer trades")
+    args = parser.parse_args()
+
+    merged_data, _ = load_merged_data(find_trader_file())
+    profiles = build_account_profiles(merged_data)
+    print(f"[OK] Profiled {len(profiles):,} accounts")
+    columns = ['Trade_Count', 'Total_PnL', 'Avg_PnL', 'Win_Rate', 'Buy_Share', 'Last_Trade']
+    if args.by not in columns:
+        columns.insert(0, args.by)
+    if args.top:
+        print(f"\nTop {args.top} accounts by {args.by}:")
+        print(profiles.top(args.by, args.top, min_trades=args.min_trades)[columns].round(2).to_string())
+    if args.bottom:
+        print(f"\nBottom {args.bottom} accounts by {args.by}:")
+        print(profiles.bottom(args.by, args.bottom, min_trades=args.min_trades)[columns].round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
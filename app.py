@@ -8,10 +8,26 @@ Bitcoin Fear/Greed Index and Hyperliquid trader performance.
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+import time
 from datetime import datetime
 import warnings
+from functools import partial
+from pipeline import (SENTIMENT_ORDER, SIZE_LABELS, FEAR_GREED_FILE, bytes_per_trade,
+                      SentimentLookup, filter_dates)
+from metrics import compute_metrics
+from cube import build_cube, rollup, correlation as cube_correlation
+from compute_cache import ComputeCache
+from trade_store import TradeStore
+from rolling import WINDOWS, daily_pnl, rolling_metrics, pivot_windows, latest
+from accounts import RANKING_COLUMNS, AccountProfiles, build_account_profiles
+from lags import DEFAULT_MAX_LAG, DEFAULT_MAX_LEAD, lag_profile, bucket_table
+from trade_index import ACCOUNT_COLUMN, SIDES, make_filters
+from refresh import DatasetRefresher
+from significance import DEFAULT_CONFIDENCE, DEFAULT_ALPHA, sentiment_significance
+from instrumentation import StageProfiler, configure_logging
+from charts import (pnl_box_stats, render_png, draw_avg_pnl, draw_win_rate,
+                    draw_pnl_boxplot, draw_buy_sell, draw_size_sentiment,
+                    draw_rolling, draw_lag_profile, draw_lag_buckets)
 warnings.filterwarnings('ignore')
 
 # Page configuration
@@ -64,477 +80,790 @@ with st.sidebar:
     st.markdown("### Navigation")
     page = st.radio(
         "Select Analysis View",
-        ["📈 Overview", "🎯 Performance by Sentiment", "💰 Trade Analysis", "📊 Advanced Insights", "🔬 Methodology"]
+        ["📈 Overview", "🎯 Performance by Sentiment", "💰 Trade Analysis", "📊 Advanced Insights",
+         "👤 Account Profiles", "⏱️ Rolling Windows", "⏳ Lagged Sentiment", "🔬 Methodology"]
     )
 
-# Load data function with caching
-@st.cache_data
-def load_data():
-    """Load and prepare datasets"""
-    # Load Fear/Greed Index
-    fear_greed = pd.read_csv('fear_greed_index.csv')
-    fear_greed['date'] = pd.to_datetime(fear_greed['date'])
-    
-    # Create sentiment score mapping
-    sentiment_map = {
-        'Extreme Fear': 1,
-        'Fear': 2,
-        'Neutral': 3,
-        'Greed': 4,
-        'Extreme Greed': 5
-    }
-    fear_greed['sentiment_score'] = fear_greed['classification'].map(sentiment_map)
-    
-    # Load Trader Data - try full file first, then sample
-    import os
-    if os.path.exists('historical_data.csv'):
-        trader_data = pd.read_csv('historical_data.csv')
-    elif os.path.exists('historical_data_sample.csv'):
-        trader_data = pd.read_csv('historical_data_sample.csv')
-    else:
-        st.error("No data file found! Please ensure historical_data.csv or historical_data_sample.csv exists.")
-        st.stop()
-    
-    # Clean trader data
-    trader_data['Timestamp IST'] = pd.to_datetime(
-        trader_data['Timestamp IST'], 
-        format='%d-%m-%Y %H:%M', 
-        errors='coerce'
-    )
-    trader_data['date'] = trader_data['Timestamp IST'].dt.date
-    trader_data['date'] = pd.to_datetime(trader_data['date'])
-    
-    # Clean numeric columns
-    numeric_cols = ['Execution Price', 'Size USD', 'Closed PnL', 'Fee']
-    for col in numeric_cols:
-        if col in trader_data.columns:
-            trader_data[col] = pd.to_numeric(trader_data[col], errors='coerce')
-    
-    # Filter valid data
-    trader_data = trader_data.dropna(subset=['date', 'Closed PnL'])
-    trader_data = trader_data[trader_data['Closed PnL'] != 0]
-    
-    # Merge datasets
-    merged_data = trader_data.merge(
-        fear_greed[['date', 'value', 'classification', 'sentiment_score']],
-        on='date',
-        how='left'
+# Stage timings (PIPELINE_PROFILE=1 or `streamlit run app.py -- --profile`),
+# shared by all sessions; PIPELINE_METRICS_PORT also serves them over HTTP
+@st.cache_resource
+def get_profiler():
+    """Process-wide stage profiler"""
+    profiler = StageProfiler()
+    if profiler.enabled:
+        configure_logging()
+        profiler.serve_metrics()
+    return profiler
+
+profiler = get_profiler()
+
+# Load Trader Data - prefer an incrementally ingested trade store, then the
+# full file, then the sample. A background thread watches the sources and
+# builds each new version (trades, cube, metrics, filter indexes) off the
+# request path, then swaps it in; sessions serve the old version until then.
+# Versions are memory-mapped from a snapshot shared by every dashboard process
+# on the machine (see snapshot.py), so extra workers add no copy of the data.
+# The first version is built on that thread too; run `python refresh.py`
+# before starting the dashboard to have it mapped at once instead.
+@st.cache_resource
+def get_refresher():
+    """Process-wide dataset refresher"""
+    return DatasetRefresher(TradeStore(), FEAR_GREED_FILE, profiler=profiler).start()
+
+# Seconds a request waits for the first dataset before showing a placeholder,
+# and between reruns of the placeholder
+FIRST_DATASET_WAIT = 1.0
+
+refresher = get_refresher()
+# The first check sets `current` before it counts as finished
+checked = refresher.wait(FIRST_DATASET_WAIT)
+dataset = refresher.current
+if dataset is None and (not checked or refresher.building):
+    st.info("Building the dataset in the background... The dashboard appears once it is ready "
+            "(run `python refresh.py` beforehand to prebuild it).")
+    time.sleep(FIRST_DATASET_WAIT)
+    st.rerun()
+if dataset is None and refresher.last_error:
+    st.error(f"Building the dataset failed: {refresher.last_error}")
+    st.stop()
+if dataset is None:
+    st.error("No data file found! Please ensure historical_data.csv or historical_data_sample.csv exists.")
+    st.stop()
+
+# Datasets are shared read-only by every session (cache_resource hands out the
+# same objects instead of unpickling a copy on each rerun) and keyed by the
+# dataset version and date range
+@st.cache_resource(max_entries=4)
+def load_data(version, start=None, end=None):
+    """Prepared trades and Fear/Greed data, restricted to trade days in [start, end]"""
+    source = refresher.get(version)
+    if start is None and end is None:
+        return source.merged_data, source.fear_greed
+    # Binary search on the date-sorted index instead of masking every row
+    with profiler.stage('load_data', rows_in=len(source)) as stage:
+        data = source.trade_index.select(start, end), source.fear_greed
+        stage.rows_out = len(data[0])
+    return data
+
+@st.cache_resource(max_entries=4)
+def load_aggregates(version, start=None, end=None):
+    """Aggregate cube, per-sentiment metrics and PnL box statistics, built once per dataset and range"""
+    source = refresher.get(version)
+    if start is None and end is None:
+        return source.cube, source.metrics, source.box_stats
+    merged_data, _ = load_data(version, start, end)
+    with profiler.stage('load_aggregates', rows_in=len(merged_data)) as stage:
+        cube = source.cube_index.select(start, end)
+        aggregates = cube, compute_metrics(merged_data), pnl_box_stats(merged_data)
+        stage.rows_out = len(cube)
+    return aggregates
+
+# Sidebar filters select rows through date-sorted, bitmap-indexed copies of
+# the full trades and cube, built with each dataset version
+def load_trade_index(version):
+    """Filter index over all trades"""
+    return refresher.get(version).trade_index
+
+def load_cube_index(version):
+    """Filter index over all cube cells"""
+    return refresher.get(version).cube_index
+
+def filtered_aggregates(version, start, end, filters):
+    """Cube, metrics and box statistics of the trades matching the sidebar filters"""
+    with profiler.stage('filtered_aggregates') as stage:
+        trades = load_trade_index(version).select(start, end, filters)
+        if any(column == ACCOUNT_COLUMN for column, _ in filters):
+            # The cube has no accounts; the chosen accounts' own trades are few
+            cube = build_cube(trades)
+        else:
+            cube = load_cube_index(version).select(start, end, filters)
+        stage.rows_out = len(trades)
+        return cube, compute_metrics(trades), pnl_box_stats(trades)
+
+@st.cache_resource(max_entries=4)
+def load_account_days(version, start=None, end=None):
+    """Account x day PnL table (rolling.daily_pnl()) of the trade days in [start, end]"""
+    return filter_dates(refresher.get(version).account_days, start, end)
+
+@st.cache_resource
+def load_sentiment(version):
+    """Day-indexed Fear/Greed arrays, for lagged lookups without reading trades"""
+    return SentimentLookup(refresher.get(version).fear_greed)
+
+@st.cache_resource
+def get_compute_cache():
+    """Process-wide cache for derived tables"""
+    return ComputeCache()
+
+compute_cache = get_compute_cache()
+# The whole rerun uses the version current when it started
+data_version = dataset.version
+first_day, last_day = dataset.first_day, dataset.last_day
+
+with st.sidebar:
+    st.markdown("### Date Range")
+    selected_dates = st.date_input(
+        "Trade dates",
+        value=(first_day.date(), last_day.date()),
+        min_value=first_day.date(),
+        max_value=last_day.date()
     )
-    merged_data = merged_data.dropna(subset=['classification'])
-    
-    return merged_data, fear_greed
 
-# Load data
+# The full range (or a half-picked range) needs no filtering at all
+start_date = end_date = None
+if isinstance(selected_dates, (tuple, list)) and len(selected_dates) == 2:
+    if tuple(selected_dates) != (first_day.date(), last_day.date()):
+        start_date, end_date = (pd.Timestamp(day) for day in selected_dates)
+
+# Accounts offered in account pickers, most active first
+MAX_ACCOUNT_CHOICES = 500
+
+# Category filters: an empty selection means no filter
+with st.sidebar:
+    st.markdown("### Filters")
+    selected_sentiments = st.multiselect("Sentiment", SENTIMENT_ORDER, placeholder="All sentiments")
+    selected_sides = st.multiselect("Side", SIDES, placeholder="Both sides")
+    selected_sizes = st.multiselect("Trade size", SIZE_LABELS, placeholder="All sizes")
+    account_choices = load_trade_index(data_version).account_counts().index[:MAX_ACCOUNT_CHOICES]
+    selected_accounts = st.multiselect("Accounts", list(account_choices), placeholder="All accounts")
+
+filters = make_filters(classification=selected_sentiments, Side=selected_sides,
+                       Trade_Size_Category=selected_sizes, Account=selected_accounts)
+
+def cached(name, compute, *args, **params):
+    """Shared derived table keyed by name, dataset version, date range, filters and `params`.
+
+    `args` are the dataset-bound inputs (cube, metrics, trades); they are
+    fixed by the dataset version, date range and filters and so are not part
+    of the key. Results are shared between sessions and must not be modified.
+    """
+    key = (name, data_version, start_date, end_date, filters) + tuple(sorted(params.items()))
+    return compute_cache.get_or_compute(key, compute, *args, **params)
+
+def show_chart(name, draw, data, figsize):
+    """Render a chart once per dataset version and size, then serve the cached PNG"""
+    png = cached(name, render_png, draw, data, figsize=figsize)
+    st.image(png, use_container_width=True)
+
+# Derived tables
+def performance_table(metrics):
+    table = metrics.by_sentiment[
+        ['Trade_Count', 'Total_PnL', 'Avg_PnL', 'Median_PnL', 'Avg_Trade_Size']
+    ].round(2)
+    table.columns = ['Trade Count', 'Total PnL', 'Avg PnL', 'Median PnL', 'Avg Trade Size']
+    return table
+
+def size_sentiment_table(cube):
+    table = rollup(cube, ['Trade_Size_Category', 'classification'])['Avg_PnL'].unstack()
+    return table.reindex(columns=SENTIMENT_ORDER)
+
+def daily_table(cube):
+    table = rollup(cube, ['date', 'classification'])[['pnl_sum', 'count', 'Avg_PnL']]
+    table.columns = ['sum', 'count', 'mean']
+    return table.reset_index().sort_values('sum', ascending=False)
+
+def significance_tables(merged_data):
+    """Bootstrap intervals and Holm-adjusted pairwise tests across sentiments"""
+    with profiler.stage('significance', rows_in=len(merged_data)):
+        return sentiment_significance(merged_data)
+
+def profile_table(merged_data):
+    return build_account_profiles(merged_data).table
+
+def account_table(profiles, k=10):
+    table = profiles.top('Total_PnL', k)[['Total_PnL', 'Avg_PnL', 'Trade_Count']].round(2)
+    table.columns = ['Total PnL', 'Avg PnL', 'Trade Count']
+    return table
+
+def account_ranking(profiles, metric, k, bottom, min_trades):
+    if bottom:
+        return profiles.bottom(metric, k, min_trades=min_trades)
+    return profiles.top(metric, k, min_trades=min_trades)
+
+def rolling_table(daily, by_account=False):
+    return rolling_metrics(daily, by_account=by_account)
+
+def lag_tables(daily, lookup, max_lag, max_lead):
+    profile, buckets = lag_profile(daily, lookup, max_lag, max_lead)
+    return profile, bucket_table(buckets), bucket_table(buckets, 'Win_Rate')
+
+def account_trades_table(merged_data, account):
+    trades = merged_data[merged_data['Account'] == account]
+    return trades.sort_values('Timestamp IST', ascending=False).head(100)
+
+def get_trades():
+    """Trades in the selected date range that match the sidebar filters"""
+    if filters:
+        return load_trade_index(data_version).select(start_date, end_date, filters)
+    return load_data(data_version, start_date, end_date)[0]
+
+def get_account_days():
+    """Account x day PnL table of the selected trades; unfiltered ranges read the prebuilt one"""
+    if filters:
+        return cached('account_days', daily_pnl, get_trades())
+    return load_account_days(data_version, start_date, end_date)
+
+def get_profiles():
+    """Per-account profiles of the selected trades, built once per dataset, range and filters"""
+    return AccountProfiles(cached('account_profiles', profile_table, get_trades()))
+
+# Load data: pages render from the cube and metrics; raw trades are only
+# loaded for the PnL distribution and drill-down views
 try:
-    merged_data, fear_greed = load_data()
+    if filters:
+        cube, metrics, box_stats = cached('filtered_aggregates', filtered_aggregates,
+                                          data_version, start_date, end_date, filters)
+    else:
+        cube, metrics, box_stats = load_aggregates(data_version, start_date, end_date)
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
     st.stop()
 
-# Page 1: Overview
-if page == "📈 Overview":
-    st.header("Executive Summary")
+if metrics.trade_count == 0:
+    st.warning("No trades match the selected filters.")
+    st.stop()
+
+with profiler.stage(f"render {page.split(' ', 1)[-1]}", rows_in=metrics.trade_count):
+    # Page 1: Overview
+    if page == "📈 Overview":
+        st.header("Executive Summary")
+    
+        # Key Metrics
+        col1, col2, col3, col4 = st.columns(4)
+    
+        with col1:
+            st.metric(
+                "Total Trades",
+                f"{metrics.trade_count:,}",
+                help="Number of trades analyzed"
+            )
+    
+        with col2:
+            total_pnl = metrics.overall['Total_PnL']
+            st.metric(
+                "Total PnL",
+                f"${total_pnl:,.0f}",
+                help="Total profit/loss across all trades"
+            )
+    
+        with col3:
+            avg_pnl = metrics.overall['Avg_PnL']
+            st.metric(
+                "Avg PnL/Trade",
+                f"${avg_pnl:.2f}",
+                help="Average profit/loss per trade"
+            )
+    
+        with col4:
+            win_rate = metrics.overall['Win_Rate']
+            st.metric(
+                "Win Rate",
+                f"{win_rate:.2f}%",
+                help="Percentage of profitable trades"
+            )
+    
+        st.markdown("---")
+    
+        # Key Findings
+        st.subheader("🎯 Key Findings")
+    
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            st.markdown("""
+            **🏆 Best Performing Sentiment: Extreme Greed**
+            - Average PnL: $130.21 per trade
+            - Win Rate: 89.17%
+            - Total PnL: $2.7M from 20,853 trades
+        
+            **💡 Insight**: Momentum/trend-following strategies appear most effective
+            """)
+    
+        with col2:
+            st.markdown("""
+            **⚠️ Worst Performing Sentiment: Extreme Fear**
+            - Average PnL: $71.03 per trade
+            - Win Rate: 76.22%
+            - Total PnL: $739K from 10,406 trades
+        
+            **💡 Insight**: Contrarian strategies show lower returns than expected
+            """)
     
-    # Key Metrics
-    col1, col2, col3, col4 = st.columns(4)
+        st.markdown("---")
     
-    with col1:
-        st.metric(
-            "Total Trades",
-            f"{len(merged_data):,}",
-            help="Number of trades analyzed"
-        )
+        # Quick Stats
+        st.subheader("📊 Quick Statistics")
     
-    with col2:
-        total_pnl = merged_data['Closed PnL'].sum()
-        st.metric(
-            "Total PnL",
-            f"${total_pnl:,.0f}",
-            help="Total profit/loss across all trades"
-        )
+        col1, col2 = st.columns(2)
     
-    with col3:
-        avg_pnl = merged_data['Closed PnL'].mean()
-        st.metric(
-            "Avg PnL/Trade",
-            f"${avg_pnl:.2f}",
-            help="Average profit/loss per trade"
-        )
+        with col1:
+            st.markdown("**Trade Distribution by Sentiment:**")
+            sentiment_counts = metrics.sentiment_counts()
+            for sentiment, count in sentiment_counts.items():
+                pct = count / metrics.trade_count * 100
+                st.write(f"- {sentiment}: {count:,} trades ({pct:.2f}%)")
     
-    with col4:
-        win_rate = (merged_data['Closed PnL'] > 0).sum() / len(merged_data) * 100
-        st.metric(
-            "Win Rate",
-            f"{win_rate:.2f}%",
-            help="Percentage of profitable trades"
-        )
+        with col2:
+            st.markdown("**Performance Summary:**")
+            st.write(f"- Winning trades: {metrics.overall['Wins']:,.0f}")
+            st.write(f"- Losing trades: {metrics.overall['Losses']:,.0f}")
+            st.write(f"- Median PnL: ${metrics.overall['Median_PnL']:.2f}")
+            st.write(f"- Std Dev: ${metrics.overall['Std_PnL']:.2f}")
+
+    # Page 2: Performance by Sentiment
+    elif page == "🎯 Performance by Sentiment":
+        st.header("Performance Analysis by Market Sentiment")
     
-    st.markdown("---")
+        # Performance metrics table
+        st.subheader("Performance Metrics")
     
-    # Key Findings
-    st.subheader("🎯 Key Findings")
+        performance_by_sentiment = cached('performance_by_sentiment', performance_table, metrics)
     
-    col1, col2 = st.columns(2)
+        st.dataframe(performance_by_sentiment.style.format({
+            'Trade Count': '{:,.0f}',
+            'Total PnL': '${:,.2f}',
+            'Avg PnL': '${:.2f}',
+            'Median PnL': '${:.2f}',
+            'Avg Trade Size': '${:,.2f}'
+        }), use_container_width=True)
     
-    with col1:
-        st.markdown("""
-        **🏆 Best Performing Sentiment: Extreme Greed**
-        - Average PnL: $130.21 per trade
-        - Win Rate: 89.17%
-        - Total PnL: $2.7M from 20,853 trades
-        
-        **💡 Insight**: Momentum/trend-following strategies appear most effective
-        """)
+        st.markdown("---")
     
-    with col2:
-        st.markdown("""
-        **⚠️ Worst Performing Sentiment: Extreme Fear**
-        - Average PnL: $71.03 per trade
-        - Win Rate: 76.22%
-        - Total PnL: $739K from 10,406 trades
-        
-        **💡 Insight**: Contrarian strategies show lower returns than expected
-        """)
+        # Visualizations
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            st.subheader("Average PnL by Sentiment")
+            show_chart('chart_avg_pnl', draw_avg_pnl, metrics.avg_pnl, figsize=(10, 6))
+    
+        with col2:
+            st.subheader("Win Rate by Sentiment")
+            show_chart('chart_win_rate', draw_win_rate, metrics.win_rate, figsize=(10, 6))
     
-    st.markdown("---")
+        st.markdown("---")
     
-    # Quick Stats
-    st.subheader("📊 Quick Statistics")
+        # PnL Distribution
+        st.subheader("PnL Distribution by Sentiment")
+        show_chart('chart_pnl_boxplot', draw_pnl_boxplot, box_stats, figsize=(14, 6))
     
-    col1, col2 = st.columns(2)
+        st.markdown("---")
     
-    with col1:
-        st.markdown("**Trade Distribution by Sentiment:**")
-        sentiment_counts = merged_data['classification'].value_counts()
-        for sentiment, count in sentiment_counts.items():
-            pct = count / len(merged_data) * 100
-            st.write(f"- {sentiment}: {count:,} trades ({pct:.2f}%)")
+        # Are the differences between sentiments more than noise?
+        st.subheader("Statistical Significance")
+        intervals, tests = cached('significance', significance_tables, get_trades())
     
-    with col2:
-        st.markdown("**Performance Summary:**")
-        st.write(f"- Winning trades: {(merged_data['Closed PnL'] > 0).sum():,}")
-        st.write(f"- Losing trades: {(merged_data['Closed PnL'] < 0).sum():,}")
-        st.write(f"- Median PnL: ${merged_data['Closed PnL'].median():.2f}")
-        st.write(f"- Std Dev: ${merged_data['Closed PnL'].std():.2f}")
+        st.caption(f"{DEFAULT_CONFIDENCE:.0%} bootstrap confidence intervals (1,000 resamples per sentiment)")
+        st.dataframe(intervals.style.format({
+            'Trade_Count': '{:,.0f}',
+            'Avg_PnL': '${:.2f}', 'Avg_PnL_Low': '${:.2f}', 'Avg_PnL_High': '${:.2f}',
+            'Win_Rate': '{:.2f}%', 'Win_Rate_Low': '{:.2f}%', 'Win_Rate_High': '{:.2f}%'
+        }), use_container_width=True)
+    
+        significant = tests[tests['Significant']]
+        st.caption(f"Pairwise permutation tests, Holm-adjusted: {len(significant)} of {len(tests)} "
+                   f"differences significant at {DEFAULT_ALPHA}")
+        st.dataframe(tests.reset_index().style.format({
+            'Difference': '{:.2f}', 'P_Value': '{:.4f}', 'P_Adjusted': '{:.4f}'
+        }), use_container_width=True, hide_index=True)
 
-# Page 2: Performance by Sentiment
-elif page == "🎯 Performance by Sentiment":
-    st.header("Performance Analysis by Market Sentiment")
+    # Page 3: Trade Analysis
+    elif page == "💰 Trade Analysis":
+        st.header("Trade Analysis")
     
-    # Performance metrics table
-    st.subheader("Performance Metrics")
+        # BUY vs SELL
+        st.subheader("BUY vs SELL Performance")
     
-    performance_by_sentiment = merged_data.groupby('classification').agg({
-        'Closed PnL': ['count', 'sum', 'mean', 'median'],
-        'Size USD': 'mean'
-    }).round(2)
+        col1, col2 = st.columns(2)
     
-    performance_by_sentiment.columns = ['Trade Count', 'Total PnL', 'Avg PnL', 'Median PnL', 'Avg Trade Size']
-    sentiment_order = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
-    performance_by_sentiment = performance_by_sentiment.reindex(sentiment_order)
+        by_side = metrics.by_side.reindex(['BUY', 'SELL'])
     
-    st.dataframe(performance_by_sentiment.style.format({
-        'Trade Count': '{:,.0f}',
-        'Total PnL': '${:,.2f}',
-        'Avg PnL': '${:.2f}',
-        'Median PnL': '${:.2f}',
-        'Avg Trade Size': '${:,.2f}'
-    }), use_container_width=True)
+        with col1:
+            buy_avg = by_side.loc['BUY', 'Avg_PnL']
+            buy_count = int(np.nan_to_num(by_side.loc['BUY', 'Trade_Count']))
+            st.metric("BUY Trades", f"{buy_count:,}", f"Avg: ${buy_avg:.2f}")
     
-    st.markdown("---")
+        with col2:
+            sell_avg = by_side.loc['SELL', 'Avg_PnL']
+            sell_count = int(np.nan_to_num(by_side.loc['SELL', 'Trade_Count']))
+            st.metric("SELL Trades", f"{sell_count:,}", f"Avg: ${sell_avg:.2f}")
     
-    # Visualizations
-    col1, col2 = st.columns(2)
+        # BUY vs SELL by Sentiment
+        st.subheader("BUY vs SELL Performance by Sentiment")
+        show_chart('chart_buy_sell', draw_buy_sell, metrics.buy_sell_avg_pnl(), figsize=(12, 6))
     
-    with col1:
-        st.subheader("Average PnL by Sentiment")
-        avg_pnl = merged_data.groupby('classification')['Closed PnL'].mean().reindex(sentiment_order)
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        colors = ['#8B0000', '#FF4500', '#FFD700', '#32CD32', '#006400']
-        bars = ax.bar(range(len(avg_pnl)), avg_pnl.values, color=colors)
-        ax.set_xticks(range(len(avg_pnl)))
-        ax.set_xticklabels(avg_pnl.index, rotation=45, ha='right')
-        ax.set_ylabel('Average PnL (USD)', fontsize=12)
-        ax.set_title('Average PnL by Market Sentiment', fontsize=14, fontweight='bold')
-        ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-        
-        for i, (bar, val) in enumerate(zip(bars, avg_pnl.values)):
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'${val:.2f}',
-                   ha='center', va='bottom' if height >= 0 else 'top', fontsize=10)
-        
-        plt.tight_layout()
-        st.pyplot(fig)
-    
-    with col2:
-        st.subheader("Win Rate by Sentiment")
-        win_rates = merged_data.groupby('classification').apply(
-            lambda x: (x['Closed PnL'] > 0).sum() / len(x) * 100
-        ).reindex(sentiment_order)
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        bars = ax.bar(range(len(win_rates)), win_rates.values, color=colors)
-        ax.set_xticks(range(len(win_rates)))
-        ax.set_xticklabels(win_rates.index, rotation=45, ha='right')
-        ax.set_ylabel('Win Rate (%)', fontsize=12)
-        ax.set_title('Win Rate by Market Sentiment', fontsize=14, fontweight='bold')
-        ax.set_ylim([0, 100])
-        
-        for bar, val in zip(bars, win_rates.values):
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{val:.1f}%',
-                   ha='center', va='bottom', fontsize=10)
-        
-        plt.tight_layout()
-        st.pyplot(fig)
-    
-    st.markdown("---")
-    
-    # PnL Distribution
-    st.subheader("PnL Distribution by Sentiment")
-    fig, ax = plt.subplots(figsize=(14, 6))
-    sns.boxplot(data=merged_data, x='classification', y='Closed PnL', 
-                order=sentiment_order, ax=ax)
-    ax.set_title('PnL Distribution by Market Sentiment', fontsize=14, fontweight='bold')
-    ax.set_xlabel('Market Sentiment', fontsize=12)
-    ax.set_ylabel('Closed PnL (USD)', fontsize=12)
-    ax.tick_params(axis='x', rotation=45)
-    ax.axhline(y=0, color='r', linestyle='--', alpha=0.5)
-    plt.tight_layout()
-    st.pyplot(fig)
-
-# Page 3: Trade Analysis
-elif page == "💰 Trade Analysis":
-    st.header("Trade Analysis")
-    
-    # Define sentiment order and colors
-    sentiment_order = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
-    colors = ['#8B0000', '#FF4500', '#FFD700', '#32CD32', '#006400']
-    
-    # BUY vs SELL
-    st.subheader("BUY vs SELL Performance")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        buy_avg = merged_data[merged_data['Side'] == 'BUY']['Closed PnL'].mean()
-        buy_count = len(merged_data[merged_data['Side'] == 'BUY'])
-        st.metric("BUY Trades", f"{buy_count:,}", f"Avg: ${buy_avg:.2f}")
-    
-    with col2:
-        sell_avg = merged_data[merged_data['Side'] == 'SELL']['Closed PnL'].mean()
-        sell_count = len(merged_data[merged_data['Side'] == 'SELL'])
-        st.metric("SELL Trades", f"{sell_count:,}", f"Avg: ${sell_avg:.2f}")
-    
-    # BUY vs SELL by Sentiment
-    st.subheader("BUY vs SELL Performance by Sentiment")
-    buy_sell_pnl = merged_data.groupby(['classification', 'Side'])['Closed PnL'].mean().unstack()
-    buy_sell_pnl = buy_sell_pnl.reindex(sentiment_order)
-    
-    fig, ax = plt.subplots(figsize=(12, 6))
-    x = np.arange(len(sentiment_order))
-    width = 0.35
-    
-    if 'BUY' in buy_sell_pnl.columns:
-        ax.bar(x - width/2, buy_sell_pnl['BUY'].values, width, label='BUY', color='#32CD32', alpha=0.8)
-    if 'SELL' in buy_sell_pnl.columns:
-        ax.bar(x + width/2, buy_sell_pnl['SELL'].values, width, label='SELL', color='#FF4500', alpha=0.8)
-    
-    ax.set_xticks(x)
-    ax.set_xticklabels(sentiment_order, rotation=45, ha='right')
-    ax.set_ylabel('Average PnL (USD)', fontsize=12)
-    ax.set_title('Average PnL: BUY vs SELL by Sentiment', fontsize=14, fontweight='bold')
-    ax.legend()
-    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-    plt.tight_layout()
-    st.pyplot(fig)
-    
-    st.markdown("---")
-    
-    # Trade Size Analysis
-    st.subheader("Performance by Trade Size")
-    
-    merged_data['Trade_Size_Category'] = pd.cut(
-        merged_data['Size USD'],
-        bins=[0, 100, 500, 1000, 5000, float('inf')],
-        labels=['< $100', '$100-$500', '$500-$1K', '$1K-$5K', '> $5K']
-    )
+        st.markdown("---")
+    
+        # Trade Size Analysis
+        st.subheader("Performance by Trade Size")
     
-    size_sentiment_perf = merged_data.groupby(['Trade_Size_Category', 'classification'])['Closed PnL'].mean().unstack()
-    size_sentiment_perf = size_sentiment_perf.reindex(columns=sentiment_order)
+        size_sentiment_perf = cached('size_sentiment_perf', size_sentiment_table, cube)
     
-    st.dataframe(size_sentiment_perf.style.format('${:.2f}'), use_container_width=True)
+        st.dataframe(size_sentiment_perf.style.format('${:.2f}'), use_container_width=True)
     
-    # Visualization
-    fig, ax = plt.subplots(figsize=(14, 6))
-    size_sentiment_perf.plot(kind='bar', ax=ax, color=colors)
-    ax.set_title('Average PnL by Trade Size and Sentiment', fontsize=14, fontweight='bold')
-    ax.set_xlabel('Trade Size Category', fontsize=12)
-    ax.set_ylabel('Average PnL (USD)', fontsize=12)
-    ax.legend(title='Sentiment', bbox_to_anchor=(1.05, 1), loc='upper left')
-    ax.tick_params(axis='x', rotation=45)
-    plt.tight_layout()
-    st.pyplot(fig)
+        # Visualization
+        show_chart('chart_size_sentiment', draw_size_sentiment, size_sentiment_perf, figsize=(14, 6))
 
-# Page 4: Advanced Insights
-elif page == "📊 Advanced Insights":
-    st.header("Advanced Insights & Correlations")
+    # Page 4: Advanced Insights
+    elif page == "📊 Advanced Insights":
+        st.header("Advanced Insights & Correlations")
     
-    # Correlation Analysis
-    st.subheader("Correlation Analysis")
+        # Correlation Analysis
+        st.subheader("Correlation Analysis")
     
-    correlation = merged_data[['Closed PnL', 'value', 'sentiment_score', 'Size USD']].corr()
+        correlation = cached('correlation', cube_correlation, cube)
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.markdown("**Correlation Matrix:**")
-        st.dataframe(correlation.style.format('{:.4f}').background_gradient(cmap='coolwarm', axis=None), 
-                    use_container_width=True)
+        with col1:
+            st.markdown("**Correlation Matrix:**")
+            st.dataframe(correlation.style.format('{:.4f}').background_gradient(cmap='coolwarm', axis=None), 
+                        use_container_width=True)
     
-    with col2:
-        st.markdown("**Key Correlations:**")
-        corr_value = correlation.loc['Closed PnL', 'value']
-        corr_sentiment = correlation.loc['Closed PnL', 'sentiment_score']
-        corr_size = correlation.loc['Closed PnL', 'Size USD']
+        with col2:
+            st.markdown("**Key Correlations:**")
+            corr_value = correlation.loc['Closed PnL', 'value']
+            corr_sentiment = correlation.loc['Closed PnL', 'sentiment_score']
+            corr_size = correlation.loc['Closed PnL', 'Size USD']
         
-        st.metric("Fear/Greed Value vs PnL", f"{corr_value:.4f}")
-        st.metric("Sentiment Score vs PnL", f"{corr_sentiment:.4f}")
-        st.metric("Trade Size vs PnL", f"{corr_size:.4f}")
+            st.metric("Fear/Greed Value vs PnL", f"{corr_value:.4f}")
+            st.metric("Sentiment Score vs PnL", f"{corr_sentiment:.4f}")
+            st.metric("Trade Size vs PnL", f"{corr_size:.4f}")
         
-        st.info("""
-        **Insight**: Trade size has a stronger correlation (0.16) 
-        with PnL than sentiment alone (0.009), suggesting position 
-        sizing is more critical than sentiment timing.
-        """)
-    
-    st.markdown("---")
+            st.info("""
+            **Insight**: Trade size has a stronger correlation (0.16) 
+            with PnL than sentiment alone (0.009), suggesting position 
+            sizing is more critical than sentiment timing.
+            """)
+    
+        st.markdown("---")
+    
+        # Top/Bottom Days
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            st.subheader("Top 10 Best Performing Days")
+            daily_perf = cached('daily_perf', daily_table, cube)
+            st.dataframe(
+                daily_perf.head(10).style.format({
+                    'sum': '${:,.2f}',
+                    'count': '{:,.0f}',
+                    'mean': '${:.2f}'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+    
+        with col2:
+            st.subheader("Top 10 Worst Performing Days")
+            st.dataframe(
+                daily_perf.tail(10).style.format({
+                    'sum': '${:,.2f}',
+                    'count': '{:,.0f}',
+                    'mean': '${:.2f}'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+    
+        st.markdown("---")
+    
+        # Top Accounts
+        st.subheader("Top 10 Accounts by Total PnL")
+        account_perf = cached('account_perf', account_table, get_profiles())
     
-    # Top/Bottom Days
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("Top 10 Best Performing Days")
-        daily_perf = merged_data.groupby(['date', 'classification'])['Closed PnL'].agg(['sum', 'count', 'mean']).reset_index()
-        daily_perf = daily_perf.sort_values('sum', ascending=False)
         st.dataframe(
-            daily_perf.head(10).style.format({
-                'sum': '${:,.2f}',
-                'count': '{:,.0f}',
-                'mean': '${:.2f}'
+            account_perf.style.format({
+                'Total PnL': '${:,.2f}',
+                'Avg PnL': '${:.2f}',
+                'Trade Count': '{:,.0f}'
             }),
-            use_container_width=True,
-            hide_index=True
+            use_container_width=True
         )
     
-    with col2:
-        st.subheader("Top 10 Worst Performing Days")
-        st.dataframe(
-            daily_perf.tail(10).style.format({
-                'sum': '${:,.2f}',
-                'count': '{:,.0f}',
-                'mean': '${:.2f}'
-            }),
-            use_container_width=True,
-            hide_index=True
+        # Drill-down into the raw trades of one account (the only raw-trade view here)
+        if st.checkbox("🔎 Drill down into a top account's trades"):
+            account = st.selectbox("Account", account_perf.index)
+            account_trades = cached('account_trades', account_trades_table, get_trades(), account=account)
+            st.dataframe(
+                account_trades,
+                use_container_width=True,
+                hide_index=True
+            )
+
+    # Page 5: Account Profiles
+    elif page == "👤 Account Profiles":
+        st.header("Account Profiles")
+        profiles = get_profiles()
+        st.markdown(f"Behavioral profiles of **{len(profiles):,}** accounts in the selected date range.")
+    
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            metric = st.selectbox("Rank by", RANKING_COLUMNS)
+        with col2:
+            direction = st.radio("Show", ["Top", "Bottom"], horizontal=True)
+        with col3:
+            k = st.slider("Accounts", 5, 100, 10)
+        with col4:
+            min_trades = st.number_input("Min trades", min_value=1, value=1, step=1)
+    
+        ranking = cached('account_ranking', account_ranking, profiles, metric=metric, k=k,
+                         bottom=direction == "Bottom", min_trades=int(min_trades))
+        columns = ['Trade_Count', 'Total_PnL', 'Avg_PnL', 'Win_Rate', 'Avg_Trade_Size',
+                   'Total_Fees', 'Buy_Share', 'Last_Trade']
+        if metric not in columns:
+            columns.insert(0, metric)
+        st.dataframe(ranking[columns].round(2), use_container_width=True)
+    
+        st.markdown("---")
+    
+        # Drill-down: one account's profile, sentiment-conditional PnL and recent trades
+        st.subheader("🔎 Account Drill-down")
+        if len(ranking) == 0:
+            st.info("No accounts match the filters.")
+        else:
+            account = st.selectbox("Account", ranking.index, key='profile_account')
+            profile = profiles.profile(account)
+        
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Trades", f"{profile['Trade_Count']:,}")
+                st.metric("Total PnL", f"${profile['Total_PnL']:,.2f}")
+            with col2:
+                st.metric("Win Rate", f"{profile['Win_Rate']:.2f}%")
+                st.metric("Avg PnL", f"${profile['Avg_PnL']:.2f}")
+            with col3:
+                st.metric("Avg Trade Size", f"${profile['Avg_Trade_Size']:,.2f}")
+                st.metric("Total Fees", f"${profile['Total_Fees']:,.2f}")
+            with col4:
+                st.metric("Long / Short", f"{profile['Buy_Count']:,} / {profile['Sell_Count']:,}")
+                st.metric("Active Days", f"{profile['Active_Days']:,}")
+            st.caption(f"First trade {profile['First_Trade'].date()}, last trade {profile['Last_Trade'].date()}; "
+                       f"PnL median ${profile['Median_PnL']:.2f}, std ${profile['Std_PnL']:.2f}")
+        
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**Average PnL by Sentiment**")
+                show_chart(f'chart_account_sentiment_{account}', draw_avg_pnl,
+                           profiles.sentiment_pnl(account), figsize=(10, 6))
+            with col2:
+                st.markdown("**Recent Trades**")
+                account_trades = cached('account_trades', account_trades_table, get_trades(), account=account)
+                st.dataframe(account_trades, use_container_width=True, hide_index=True)
+
+    # Page 6: Rolling Windows
+    elif page == "⏱️ Rolling Windows":
+        st.header("Rolling-Window Performance")
+        st.markdown(
+            "Trailing 7, 30 and 90-day windows over the selected date range. The "
+            "Sharpe-like ratio is the mean over the standard deviation of daily PnL, "
+            "annualized over 365 days; the correlation pairs each trading day's "
+            "Fear/Greed value with that day's PnL."
         )
     
-    st.markdown("---")
-    
-    # Top Accounts
-    st.subheader("Top 10 Accounts by Total PnL")
-    account_perf = merged_data.groupby('Account').agg({
-        'Closed PnL': ['sum', 'mean', 'count']
-    }).round(2)
-    account_perf.columns = ['Total PnL', 'Avg PnL', 'Trade Count']
-    account_perf = account_perf.sort_values('Total PnL', ascending=False)
-    
-    st.dataframe(
-        account_perf.head(10).style.format({
-            'Total PnL': '${:,.2f}',
-            'Avg PnL': '${:.2f}',
-            'Trade Count': '{:,.0f}'
-        }),
-        use_container_width=True
-    )
+        active_accounts = cached('active_accounts', account_ranking, get_profiles(), metric='Trade_Count',
+                                 k=MAX_ACCOUNT_CHOICES, bottom=False, min_trades=1)
+        scope = st.selectbox("Accounts", ["All accounts"] + list(active_accounts.index))
+        if scope == "All accounts":
+            rolling = cached('rolling_global', rolling_table, get_account_days())
+            account = None
+        else:
+            rolling = cached('rolling_accounts', rolling_table, get_account_days(), by_account=True)
+            account = scope
+    
+        if rolling.empty:
+            st.info("No trades in the selected date range.")
+        else:
+            # Latest window of each length
+            col_list = st.columns(len(WINDOWS))
+            for col, window in zip(col_list, WINDOWS):
+                row = latest(rolling, window)
+                if account is not None:
+                    row = row.loc[account]
+                with col:
+                    st.markdown(f"**{window}-day window to {row['date'].date()}**")
+                    st.metric("Trades", f"{row['trades']:,}")
+                    st.metric("Win Rate", f"{row['win_rate']:.2f}%")
+                    st.metric("Avg PnL", f"${row['avg_pnl']:.2f}")
+                    st.metric("Sharpe-like Ratio", f"{row['sharpe']:.2f}")
+                    st.metric("Value vs Daily PnL", f"{row['value_pnl_corr']:.4f}")
+    
+            st.markdown("---")
+    
+            # One chart per metric, a line per window length
+            for metrics_row in [['win_rate', 'avg_pnl'], ['sharpe', 'value_pnl_corr']]:
+                for col, metric in zip(st.columns(2), metrics_row):
+                    with col:
+                        windows = cached('rolling_pivot', pivot_windows, rolling,
+                                         metric=metric, account=account)
+                        show_chart(f'chart_rolling_{metric}_{scope}', partial(draw_rolling, metric=metric),
+                                   windows, figsize=(10, 5))
+    
+            if account is None:
+                st.markdown("---")
+                st.subheader("Latest 30-Day Window by Account")
+                by_account = cached('rolling_accounts', rolling_table, get_account_days(), by_account=True)
+                leaders = latest(by_account, 30).sort_values('sharpe', ascending=False)
+                st.dataframe(
+                    leaders[['date', 'trades', 'days', 'total_pnl', 'win_rate', 'avg_pnl',
+                             'sharpe', 'value_pnl_corr']].style.format({
+                        'total_pnl': '${:,.2f}',
+                        'win_rate': '{:.2f}%',
+                        'avg_pnl': '${:.2f}',
+                        'sharpe': '{:.2f}',
+                        'value_pnl_corr': '{:.4f}'
+                    }),
+                    use_container_width=True
+                )
 
-# Page 5: Methodology
-elif page == "🔬 Methodology":
-    st.header("Methodology & Technical Details")
-    
-    st.markdown("""
-    ### Data Sources
-    
-    1. **Bitcoin Fear/Greed Index**
-       - Source: Alternative.me Fear & Greed Index
-       - Records: 2,644 daily readings
-       - Date Range: February 2018 - May 2025
-       - Metrics: Value (0-100), Classification (5 categories)
-    
-    2. **Hyperliquid Trader Data**
-       - Source: Historical trading data from Hyperliquid exchange
-       - Records: 211,224 total trades
-       - Analyzed: 104,402 trades with valid PnL
-       - Date Range: December 2023 - May 2025
-       - Metrics: Execution price, size, side, PnL, fees, etc.
-    
-    ### Data Processing
-    
-    1. **Data Cleaning**
-       - Removed trades with missing or zero PnL
-       - Standardized date formats
-       - Validated numeric columns
-    
-    2. **Data Merging**
-       - Merged trader data with sentiment data by date
-       - Matched 104,402 trades with sentiment classifications
-    
-    3. **Feature Engineering**
-       - Created sentiment score (1-5 scale)
-       - Categorized trade sizes
-       - Calculated performance metrics
-    
-    ### Analysis Methods
-    
-    1. **Descriptive Statistics**
-       - Mean, median, standard deviation by sentiment
-       - Win rate calculations
-       - Trade distribution analysis
-    
-    2. **Correlation Analysis**
-       - Pearson correlation coefficients
-       - Relationship strength assessment
-    
-    3. **Comparative Analysis**
-       - Performance by sentiment category
-       - BUY vs SELL comparison
-       - Trade size impact analysis
-    
-    ### Key Metrics
-    
-    - **Total PnL**: Sum of all closed position profits/losses
-    - **Average PnL**: Mean profit/loss per trade
-    - **Win Rate**: Percentage of profitable trades
-    - **Trade Size**: USD value of each trade
-    
-    ### Limitations
-    
-    1. Time period covers Dec 2023 - May 2025 (may not represent all market cycles)
-    2. Only closed positions analyzed (excludes open positions)
-    3. Multiple factors influence PnL beyond sentiment
-    4. Correlation is weak, suggesting sentiment is one of many factors
+    # Page 7: Lagged Sentiment
+    elif page == "⏳ Lagged Sentiment":
+        st.header("Lagged Sentiment Effect")
+        st.markdown(
+            "Each trade is paired with the Fear/Greed reading *lag* days before its own "
+            "day; negative lags pair it with a reading after the trade (lead effects). "
+            "Lag 0 is the same-day sentiment used everywhere else."
+        )
     
-    ### Tools & Technologies
+        col1, col2 = st.columns(2)
+        with col1:
+            max_lag = st.slider("Max lag (days before the trade)", 1, 90, DEFAULT_MAX_LAG)
+        with col2:
+            max_lead = st.slider("Max lead (days after the trade)", 0, 30, DEFAULT_MAX_LEAD)
+    
+        lookup = load_sentiment(data_version)
+        profile, avg_table, win_table = cached('lag_profile', lag_tables, get_account_days(), lookup,
+                                               max_lag=max_lag, max_lead=max_lead)
+    
+        strongest = profile['Value_PnL_Corr'].abs().idxmax() if profile['Value_PnL_Corr'].notna().any() else 0
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Same-day Correlation", f"{profile.loc[0, 'Value_PnL_Corr']:.4f}")
+        with col2:
+            st.metric("Strongest Lag", f"{strongest} days")
+        with col3:
+            st.metric("Correlation at Strongest Lag", f"{profile.loc[strongest, 'Value_PnL_Corr']:.4f}")
+    
+        show_chart(f'chart_lag_profile_{max_lag}_{max_lead}', draw_lag_profile, profile, figsize=(14, 5))
+    
+        col1, col2 = st.columns(2)
+        with col1:
+            show_chart(f'chart_lag_avg_{max_lag}_{max_lead}', draw_lag_buckets, avg_table, figsize=(10, 6))
+        with col2:
+            show_chart(f'chart_lag_win_{max_lag}_{max_lead}', partial(draw_lag_buckets, metric='Win_Rate'),
+                       win_table, figsize=(10, 6))
+    
+        st.subheader("Lag Profile")
+        st.dataframe(profile.style.format({
+            'Trade_Count': '{:,.0f}',
+            'Value_PnL_Corr': '{:.4f}',
+            'Win_Rate': '{:.2f}%',
+            'Avg_PnL': '${:.2f}'
+        }), use_container_width=True)
+
+    # Page 8: Methodology
+    elif page == "🔬 Methodology":
+        st.header("Methodology & Technical Details")
     
-    - **Python 3.x**
-    - **Pandas**: Data manipulation and analysis
-    - **NumPy**: Numerical computations
-    - **Matplotlib/Seaborn**: Data visualization
-    - **Streamlit**: Interactive dashboard
-    """)
+        st.markdown("""
+        ### Data Sources
+    
+        1. **Bitcoin Fear/Greed Index**
+           - Source: Alternative.me Fear & Greed Index
+           - Records: 2,644 daily readings
+           - Date Range: February 2018 - May 2025
+           - Metrics: Value (0-100), Classification (5 categories)
+    
+        2. **Hyperliquid Trader Data**
+           - Source: Historical trading data from Hyperliquid exchange
+           - Records: 211,224 total trades
+           - Analyzed: 104,402 trades with valid PnL
+           - Date Range: December 2023 - May 2025
+           - Metrics: Execution price, size, side, PnL, fees, etc.
+    
+        ### Data Processing
+    
+        1. **Data Cleaning**
+           - Removed trades with missing or zero PnL
+           - Standardized date formats
+           - Validated numeric columns
+    
+        2. **Data Merging**
+           - Merged trader data with sentiment data by date
+           - Matched 104,402 trades with sentiment classifications
+    
+        3. **Feature Engineering**
+           - Created sentiment score (1-5 scale)
+           - Categorized trade sizes
+           - Calculated performance metrics
+    
+        ### Analysis Methods
+    
+        1. **Descriptive Statistics**
+           - Mean, median, standard deviation by sentiment
+           - Win rate calculations
+           - Trade distribution analysis
+    
+        2. **Correlation Analysis**
+           - Pearson correlation coefficients
+           - Relationship strength assessment
+    
+        3. **Comparative Analysis**
+           - Performance by sentiment category
+           - BUY vs SELL comparison
+           - Trade size impact analysis
+    
+        ### Key Metrics
+    
+        - **Total PnL**: Sum of all closed position profits/losses
+        - **Average PnL**: Mean profit/loss per trade
+        - **Win Rate**: Percentage of profitable trades
+        - **Trade Size**: USD value of each trade
+    
+        ### Limitations
+    
+        1. Time period covers Dec 2023 - May 2025 (may not represent all market cycles)
+        2. Only closed positions analyzed (excludes open positions)
+        3. Multiple factors influence PnL beyond sentiment
+        4. Correlation is weak, suggesting sentiment is one of many factors
+    
+        ### Tools & Technologies
+    
+        - **Python 3.x**
+        - **Pandas**: Data manipulation and analysis
+        - **NumPy**: Numerical computations
+        - **Matplotlib/Seaborn**: Data visualization
+        - **Streamlit**: Interactive dashboard
+        """)
+
+# Dataset version and refresh state, computation cache occupancy and the
+# trade frame's footprint, for sizing dynos
+with st.sidebar:
+    refresh = refresher.status()
+    st.caption(
+        f"Dataset {data_version}: {len(dataset):,} trades, built "
+        f"{dataset.built_at:%Y-%m-%d %H:%M:%S} in {dataset.build_seconds:.2f}s"
+        + (f", shared memory map opened in {dataset.load_seconds * 1000:.0f} ms" if dataset.mapped else "")
+    )
+    if refresh['version'] != data_version:
+        st.caption(f"Version {refresh['version']} is ready and shows on the next interaction")
+    elif refresh['building']:
+        st.caption(f"Building version {refresh['building']} in the background...")
+    if refresh['last_error']:
+        st.caption(f"Last refresh failed ({refresh['last_error']}); serving version {refresh['version']}")
+    cache_stats = compute_cache.stats()
+    st.caption(
+        f"Computation cache: {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses, "
+        f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024 ** 2:.1f} MB)"
+    )
+    trades, _ = load_data(data_version, start_date, end_date)
+    st.caption(
+        f"Trades {'mapped' if dataset.mapped else 'in memory'}: "
+        f"{trades.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB "
+        f"({bytes_per_trade(trades):.0f} bytes per trade)"
+    )
+    if profiler.enabled:
+        with st.expander("Stage timings"):
+            st.dataframe(pd.DataFrame(profiler.as_dicts()[-20:]), hide_index=True)
 
 # Footer
 st.markdown("---")
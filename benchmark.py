@@ -0,0 +1,293 @@
+"""
+Pipeline Benchmark
+==================
+Times every stage of the analysis pipeline on synthetic Hyperliquid-shaped
+trade files of increasing size and writes the results as JSON.
+
+Synthetic files have the 16 columns of a Hyperliquid export, a skewed
+(Zipf-like) distribution of trades over accounts, and trade dates spread
+uniformly over the Fear/Greed Index range. They are generated in chunks, so
+even the 50M-row file never has to fit in memory, and are reused between
+runs.
+
+Each size runs in a fresh process so that its peak RSS is its own. Stages:
+read, timestamp_parse, numeric_coercion, merge, groupby, correlation and
+render (the six-panel summary figure).
+
+Usage:
+    python benchmark.py                                  # 100k and 1M rows
+    python benchmark.py --sizes 100k 1M 10M 50M --output bench.json
+    python benchmark.py --baseline bench.json            # fail on >20% slowdowns
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from instrumentation import StageProfiler, peak_rss_mb
+
+BENCH_DIR = 'bench_data'
+DEFAULT_SIZES = ['100k', '1M']
+GENERATE_CHUNK = 1_000_000
+
+COINS = ['BTC', 'ETH', 'SOL', 'HYPE', '@107', 'XRP', 'DOGE', 'SUI', 'FARTCOIN', 'kPEPE']
+DIRECTIONS = ['Open Long', 'Close Long', 'Open Short', 'Close Short', 'Buy', 'Sell']
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype='S1')
+
+# Real exports store the epoch column rounded (e.g. 1.73E+12), which forces
+# the text timestamp parser; 'exact' exercises the epoch fast path instead
+EPOCH_MODES = ['rounded', 'exact', 'none']
+
+
+def parse_size(text):
+    """'100k' -> 100000, '10M' -> 10000000."""
+    text = text.strip().lower()
+    scale = {'k': 10**3, 'm': 10**6}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def random_hex(rng, rows, n_bytes):
+    """`rows` random lowercase hex strings of 2 * n_bytes digits, prefixed with 0x."""
+    digits = HEX_DIGITS[rng.integers(0, 16, size=(rows, 2 * n_bytes))]
+    return np.char.add('0x', digits.view(f'S{2 * n_bytes}').ravel().astype('U'))
+
+
+def format_timestamps(minutes):
+    """datetime64[m] values as 'DD-MM-YYYY HH:MM' strings, without Python loops."""
+    iso = np.datetime_as_string(minutes, unit='m').astype('U16')   # YYYY-MM-DDTHH:MM
+    chars = iso.view('U1').reshape(-1, 16)
+    order = [8, 9, 7, 5, 6, 4, 0, 1, 2, 3, 10, 11, 12, 13, 14, 15]
+    chars = chars[:, order]
+    chars[:, 10] = ' '
+    return chars.copy().view('U16').ravel()
+
+
+def generate_trades(path, rows, fear_greed_path, epoch='rounded', seed=42):
+    """Write a synthetic Hyperliquid-shaped trade CSV with `rows` rows."""
+    rng = np.random.default_rng(seed)
+    dates = pd.read_csv(fear_greed_path, usecols=['date'])['date']
+    dates = pd.to_datetime(dates).to_numpy(dtype='datetime64[m]')
+    first = dates.min()
+    span = int((dates.max() - first).astype('int64')) + 24 * 60
+
+    n_accounts = max(32, rows // 5000)
+    accounts = random_hex(rng, n_accounts, 20)
+    weights = 1.0 / np.arange(1, n_accounts + 1) ** 1.2
+    weights /= weights.sum()
+
+    coin_weights = 1.0 / np.arange(1, len(COINS) + 1)
+    coin_weights /= coin_weights.sum()
+
+    tmp_path = path + '.tmp'
+    written = 0
+    while written < rows:
+        n = min(GENERATE_CHUNK, rows - written)
+        minutes = first + rng.integers(0, span, size=n).astype('timedelta64[m]')
+        size_usd = np.round(rng.lognormal(6.5, 1.6, size=n), 2)
+        price = np.round(rng.lognormal(5, 2.5, size=n), 4)
+        closing = rng.random(n) < 0.5
+        pnl = np.where(closing, np.round(rng.standard_t(3, size=n) * 150 + 50, 6), 0.0)
+        epoch_ms = (minutes.astype('datetime64[ms]').astype('int64')
+                    - (5 * 3600 + 30 * 60) * 1000 + rng.integers(0, 60_000, size=n))
+
+        chunk = pd.DataFrame({
+            'Account': accounts[rng.choice(n_accounts, size=n, p=weights)],
+            'Coin': np.array(COINS)[rng.choice(len(COINS), size=n, p=coin_weights)],
+            'Execution Price': price,
+            'Size Tokens': np.round(size_usd / price, 6),
+            'Size USD': size_usd,
+            'Side': np.where(rng.random(n) < 0.5, 'BUY', 'SELL'),
+            'Timestamp IST': format_timestamps(minutes),
+            'Start Position': np.round(rng.normal(0, 1000, size=n), 6),
+            'Direction': np.array(DIRECTIONS)[rng.integers(0, len(DIRECTIONS), size=n)],
+            'Closed PnL': pnl,
+            'Transaction Hash': random_hex(rng, n, 32),
+            'Order ID': rng.integers(10**10, 10**11, size=n),
+            'Crossed': rng.random(n) < 0.7,
+            'Fee': np.round(size_usd * 0.00035, 6),
+            'Trade ID': (written + np.arange(n)) * 7 + 10**14,
+        })
+        if epoch == 'exact':
+            chunk['Timestamp'] = epoch_ms
+        elif epoch == 'rounded':
+            chunk['Timestamp'] = np.round(epoch_ms, -10).astype('float64')
+        chunk.to_csv(tmp_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += n
+    os.replace(tmp_path, path)
+
+
+def run_stages(path, fear_greed_path):
+    """Run the pipeline stages on one file and return their measurements."""
+    # Imported here so the generator works without the plotting stack
+    from matplotlib.figure import Figure
+    from pipeline import (load_fear_greed, load_trader_data, normalize_timestamps,
+                          coerce_numeric_columns, merge_sentiment, size_category)
+    from metrics import compute_metrics
+    from cube import build_cube
+    from charts import (pnl_box_stats, draw_pnl_boxplot, draw_avg_pnl, draw_win_rate,
+                        draw_trade_counts, draw_total_pnl, draw_buy_sell)
+
+    profiler = StageProfiler(enabled=True, log=False)
+    state = {}
+
+    def stage(name, rows_in, function):
+        with profiler.stage(name, rows_in) as record:
+            record.rows_out = function()
+        return record.rows_out
+
+    def read():
+        state['fear_greed'] = load_fear_greed(fear_greed_path)
+        state['trades'] = load_trader_data(path)
+        return len(state['trades'])
+
+    def parse_timestamps():
+        state['timestamps'] = normalize_timestamps(state['trades'])
+        return len(state['trades']) - state['timestamps']['failed']
+
+    def coerce():
+        trades = state['trades']
+        coerce_numeric_columns(trades)
+        trades = trades.dropna(subset=['date', 'Closed PnL'])
+        state['trades'] = trades[trades['Closed PnL'] != 0].reset_index(drop=True)
+        return len(state['trades'])
+
+    def merge():
+        state['merged'] = merge_sentiment(state['trades'], state['fear_greed'])
+        del state['trades']
+        return len(state['merged'])
+
+    def groupby():
+        merged = state['merged']
+        state['metrics'] = compute_metrics(merged)
+        state['box_stats'] = pnl_box_stats(merged)
+        state['cube'] = build_cube(merged)
+        size_perf = merged.groupby(
+            [size_category(merged['Size USD']), 'classification'], observed=True
+        )['Closed PnL'].mean()
+        daily = merged.groupby(['date', 'classification'], observed=True)['Closed PnL'].sum()
+        accounts = merged.groupby('Account', observed=True)['Closed PnL'].sum()
+        return len(state['cube']) + len(size_perf) + len(daily) + len(accounts)
+
+    def correlation():
+        state['merged'][['Closed PnL', 'value', 'sentiment_score', 'Size USD']].corr()
+        return 4
+
+    def render():
+        metrics = state['metrics']
+        fig = Figure(figsize=(20, 12))
+        panels = [(draw_pnl_boxplot, state['box_stats']), (draw_avg_pnl, metrics.avg_pnl),
+                  (draw_win_rate, metrics.win_rate), (draw_trade_counts, metrics.trade_counts),
+                  (draw_total_pnl, metrics.total_pnl), (draw_buy_sell, metrics.buy_sell_avg_pnl())]
+        for i, (draw, data) in enumerate(panels, start=1):
+            draw(fig.add_subplot(2, 3, i), data)
+        fig.tight_layout()
+        fig.savefig(io.BytesIO(), format='png', dpi=150)
+        fig.clear()
+        return len(panels)
+
+    rows = stage('read', None, read)
+    stage('timestamp_parse', rows, parse_timestamps)
+    rows = stage('numeric_coercion', rows, coerce)
+    rows = stage('merge', rows, merge)
+    stage('groupby', rows, groupby)
+    stage('correlation', rows, correlation)
+    stage('render', rows, render)
+
+    stages = {record.pop('stage'): record for record in profiler.as_dicts()}
+    return {
+        'rows': int(stages['read']['rows_out']),
+        'timestamp_source': state['timestamps']['source'],
+        'stages': stages,
+        'total_seconds': round(sum(s['seconds'] for s in stages.values()), 4),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Stages slower than the baseline by more than `tolerance` (a fraction)."""
+    previous = {run['rows']: run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in results['runs']:
+        old = previous.get(run['rows'])
+        if old is None:
+            continue
+        for name, stage in run['stages'].items():
+            before = old['stages'].get(name, {}).get('seconds')
+            # Sub-10ms stages are too noisy to compare
+            if before and before >= 0.01 and stage['seconds'] > before * (1 + tolerance):
+                regressions.append(f"{run['rows']:,} rows / {name}: "
+                                   f"{before:.3f}s -> {stage['seconds']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline stages")
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES,
+                        help="row counts to benchmark, e.g. 100k 1M 10M 50M")
+    parser.add_argument('--fear-greed', default='fear_greed_index.csv')
+    parser.add_argument('--data-dir', default=BENCH_DIR, help="where synthetic files are kept")
+    parser.add_argument('--epoch', choices=EPOCH_MODES, default='rounded',
+                        help="how the synthetic files carry the epoch 'Timestamp' column")
+    parser.add_argument('--output', help="write the JSON results to this file (default: stdout)")
+    parser.add_argument('--baseline', help="earlier JSON results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed slowdown per stage against --baseline (0.2 = 20%%)")
+    parser.add_argument('--run-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_file:
+        # Child process: benchmark one file and report on stdout
+        print(json.dumps(run_stages(args.run_file, args.fear_greed)))
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'epoch': args.epoch,
+        'runs': [],
+    }
+    for size in args.sizes:
+        rows = parse_size(size)
+        path = os.path.join(args.data_dir, f'trades_{rows}_{args.epoch}.csv')
+        if not os.path.exists(path):
+            print(f"Generating {rows:,} synthetic trades -> {path}", file=sys.stderr)
+            generate_trades(path, rows, args.fear_greed, args.epoch)
+        print(f"Benchmarking {rows:,} rows...", file=sys.stderr)
+        child = subprocess.run(
+            [sys.executable, __file__, '--run-file', path, '--fear-greed', args.fear_greed],
+            capture_output=True, text=True, check=True
+        )
+        run = json.loads(child.stdout.strip().splitlines()[-1])
+        run['file_bytes'] = os.path.getsize(path)
+        results['runs'].append(run)
+        print(f"  {run['total_seconds']:.2f}s total, peak RSS {run['peak_rss_mb']:.0f} MB",
+              file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[REGRESSION] {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
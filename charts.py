@@ -0,0 +1,303 @@
+"""
+Chart Layer
+===========
+Matplotlib drawing functions shared by the analysis script and the dashboard,
+plus helpers to render them to PNG bytes.
+
+Every chart is drawn from precomputed data (metrics, cube rollups, box
+statistics) rather than raw trades. The PnL boxplot in particular is drawn
+with Axes.bxp from per-sentiment quantiles instead of seaborn over every
+trade. Overview panels can be rendered in worker processes, then
+composited into one image or written as separate files.
+
+render_png() draws on a standalone Figure that is never registered with
+pyplot. The figure is released as soon as the image is encoded, so a
+long-lived dashboard process does not accumulate open figures.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+import matplotlib.image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from pipeline import SENTIMENT_ORDER, SENTIMENT_COLORS
+from metrics import group_codes
+from quantiles import grouped_quantiles
+
+# Outliers drawn per box; the rest are thinned out evenly across the range
+MAX_FLIERS = 200
+
+
+def pnl_box_stats(merged_data, max_fliers=MAX_FLIERS):
+    """Boxplot statistics of Closed PnL per sentiment, in SENTIMENT_ORDER.
+
+    Uses the same definition as seaborn/matplotlib: quartiles, whiskers at
+    the furthest trade within 1.5 IQR of the box, and outliers beyond them.
+    Quartiles are selected rather than sorted, and only the outliers are
+    sorted (to thin them out).
+    """
+    stats = []
+    pnl = merged_data['Closed PnL'].to_numpy(dtype='float64')
+    codes = group_codes(merged_data['classification'], SENTIMENT_ORDER)
+    quartiles = grouped_quantiles(codes, len(SENTIMENT_ORDER), pnl, [0.25, 0.5, 0.75])
+    for code, sentiment in enumerate(SENTIMENT_ORDER):
+        q1, med, q3 = quartiles[code]
+        if np.isnan(med):
+            stats.append({'label': sentiment, 'med': np.nan, 'q1': np.nan, 'q3': np.nan,
+                          'whislo': np.nan, 'whishi': np.nan, 'fliers': np.array([])})
+            continue
+        values = pnl[codes == code]
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        whislo, whishi = (inside.min(), inside.max()) if len(inside) else (q1, q3)
+        fliers = np.sort(values[(values < whislo) | (values > whishi)])
+        if len(fliers) > max_fliers:
+            fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(int)]
+        stats.append({'label': sentiment, 'med': med, 'q1': q1, 'q3': q3,
+                      'whislo': whislo, 'whishi': whishi, 'fliers': fliers})
+    return stats
+
+
+def _label_bars(ax, bars, values, fmt, signed=True):
+    for bar, val in zip(bars, values):
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height, fmt.format(val),
+                ha='center', va='bottom' if (height >= 0 or not signed) else 'top', fontsize=10)
+
+
+def draw_pnl_boxplot(ax, box_stats):
+    """PnL distribution by sentiment from pnl_box_stats()."""
+    present = [s for s in box_stats if not np.isnan(s['med'])]
+    positions = [SENTIMENT_ORDER.index(s['label']) for s in present]
+    artists = ax.bxp(present, positions=positions, patch_artist=True, widths=0.6,
+                     flierprops={'marker': 'd', 'markersize': 4, 'alpha': 0.5},
+                     medianprops={'color': 'black'})
+    for patch, pos in zip(artists['boxes'], positions):
+        patch.set_facecolor(SENTIMENT_COLORS[pos])
+        patch.set_alpha(0.7)
+    ax.set_xticks(range(len(SENTIMENT_ORDER)))
+    ax.set_xticklabels(SENTIMENT_ORDER)
+    ax.set_title('PnL Distribution by Market Sentiment', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Market Sentiment', fontsize=12)
+    ax.set_ylabel('Closed PnL (USD)', fontsize=12)
+    ax.tick_params(axis='x', rotation=45)
+    ax.axhline(y=0, color='r', linestyle='--', alpha=0.5)
+
+
+def draw_avg_pnl(ax, avg_pnl):
+    """Average PnL per sentiment (a Series indexed by sentiment)."""
+    bars = ax.bar(range(len(avg_pnl)), avg_pnl.values, color=SENTIMENT_COLORS)
+    ax.set_xticks(range(len(avg_pnl)))
+    ax.set_xticklabels(avg_pnl.index, rotation=45, ha='right')
+    ax.set_title('Average PnL by Market Sentiment', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Average PnL (USD)', fontsize=12)
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+    _label_bars(ax, bars, avg_pnl.values, '${:.2f}')
+
+
+def draw_win_rate(ax, win_rates):
+    """Win rate (%) per sentiment."""
+    bars = ax.bar(range(len(win_rates)), win_rates.values, color=SENTIMENT_COLORS)
+    ax.set_xticks(range(len(win_rates)))
+    ax.set_xticklabels(win_rates.index, rotation=45, ha='right')
+    ax.set_title('Win Rate by Market Sentiment', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Win Rate (%)', fontsize=12)
+    ax.set_ylim([0, 100])
+    _label_bars(ax, bars, win_rates.values, '{:.1f}%', signed=False)
+
+
+def draw_trade_counts(ax, trade_counts):
+    """Number of trades per sentiment."""
+    bars = ax.bar(range(len(trade_counts)), trade_counts.values, color=SENTIMENT_COLORS)
+    ax.set_xticks(range(len(trade_counts)))
+    ax.set_xticklabels(trade_counts.index, rotation=45, ha='right')
+    ax.set_title('Number of Trades by Market Sentiment', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Number of Trades', fontsize=12)
+    _label_bars(ax, bars, np.nan_to_num(trade_counts.values).astype(int), '{:,}', signed=False)
+
+
+def draw_total_pnl(ax, total_pnl):
+    """Total PnL per sentiment."""
+    bars = ax.bar(range(len(total_pnl)), total_pnl.values, color=SENTIMENT_COLORS)
+    ax.set_xticks(range(len(total_pnl)))
+    ax.set_xticklabels(total_pnl.index, rotation=45, ha='right')
+    ax.set_title('Total PnL by Market Sentiment', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Total PnL (USD)', fontsize=12)
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+    _label_bars(ax, bars, total_pnl.values, '${:,.0f}')
+
+
+def draw_buy_sell(ax, buy_sell_pnl):
+    """Average PnL of BUY vs SELL trades per sentiment (sentiments x sides)."""
+    x = np.arange(len(SENTIMENT_ORDER))
+    width = 0.35
+    if 'BUY' in buy_sell_pnl.columns:
+        ax.bar(x - width/2, buy_sell_pnl['BUY'].values, width, label='BUY', color='#32CD32', alpha=0.8)
+    if 'SELL' in buy_sell_pnl.columns:
+        ax.bar(x + width/2, buy_sell_pnl['SELL'].values, width, label='SELL', color='#FF4500', alpha=0.8)
+    ax.set_xticks(x)
+    ax.set_xticklabels(SENTIMENT_ORDER, rotation=45, ha='right')
+    ax.set_title('Average PnL: BUY vs SELL by Sentiment', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Average PnL (USD)', fontsize=12)
+    ax.legend()
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+
+
+def draw_size_sentiment(ax, size_sentiment_perf):
+    """Average PnL by trade size bucket (rows) and sentiment (columns)."""
+    size_sentiment_perf.plot(kind='bar', ax=ax, color=SENTIMENT_COLORS)
+    ax.set_title('Average PnL by Trade Size and Sentiment', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Trade Size Category', fontsize=12)
+    ax.set_ylabel('Average PnL (USD)', fontsize=12)
+    ax.legend(title='Sentiment', bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.tick_params(axis='x', rotation=45)
+
+
+ROLLING_TITLES = {
+    'win_rate': ('Rolling Win Rate', 'Win Rate (%)'),
+    'avg_pnl': ('Rolling Average PnL', 'Average PnL (USD)'),
+    'std_pnl': ('Rolling PnL Standard Deviation', 'Std PnL (USD)'),
+    'sharpe': ('Rolling Sharpe-like Ratio (annualized)', 'Sharpe-like Ratio'),
+    'value_pnl_corr': ('Rolling Correlation: Fear/Greed Value vs Daily PnL', 'Correlation'),
+}
+
+
+def draw_rolling(ax, windows, metric='win_rate'):
+    """One rolling metric over time, a line per window (date x window table)."""
+    for column, color in zip(windows.columns, ['#1f77b4', '#ff7f0e', '#2ca02c']):
+        ax.plot(windows.index, windows[column].values, label=column, color=color, linewidth=1.2)
+    title, ylabel = ROLLING_TITLES.get(metric, (metric, metric))
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.legend(title='Window')
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+    ax.tick_params(axis='x', rotation=45)
+
+
+def draw_lag_profile(ax, profile):
+    """Correlation of the lagged Fear/Greed value with PnL, per lag (lags.lag_profile())."""
+    correlation = profile['Value_PnL_Corr']
+    colors = ['#32CD32' if val >= 0 else '#FF4500' for val in np.nan_to_num(correlation.values)]
+    ax.bar(correlation.index, correlation.values, color=colors, alpha=0.8)
+    ax.set_title('Fear/Greed Value vs PnL Correlation by Lag', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Lag (days; negative = reading after the trade)', fontsize=12)
+    ax.set_ylabel('Correlation', fontsize=12)
+    ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+    ax.axvline(x=0, color='gray', linestyle='--', alpha=0.5)
+
+
+def draw_lag_buckets(ax, table, metric='Avg_PnL'):
+    """A bucket metric per lag (rows) and lagged sentiment (columns)."""
+    for sentiment, color in zip(SENTIMENT_ORDER, SENTIMENT_COLORS):
+        if sentiment in table.columns:
+            ax.plot(table.index, table[sentiment].values, label=sentiment, color=color, linewidth=1.5)
+    label = 'Win Rate (%)' if metric == 'Win_Rate' else 'Average PnL (USD)'
+    ax.set_title(f'{label.split(" (")[0]} by Lagged Sentiment', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Lag (days; negative = reading after the trade)', fontsize=12)
+    ax.set_ylabel(label, fontsize=12)
+    ax.legend(title='Sentiment', bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.axvline(x=0, color='gray', linestyle='--', alpha=0.5)
+
+
+# The analysis overview figure: a 2 x 3 grid of panels
+OVERVIEW_FIGSIZE = (20, 12)
+OVERVIEW_GRID = (2, 3)
+PANEL_NAMES = ['pnl_distribution', 'avg_pnl', 'win_rate', 'trade_counts', 'total_pnl', 'buy_sell']
+
+FIGURE_FORMATS = ['png', 'svg', 'pdf']
+
+# Formats whose cost does not grow with the DPI
+VECTOR_FORMATS = ['svg', 'pdf']
+
+
+def overview_panels(metrics, box_stats):
+    """(draw, data) of each overview panel, in grid order."""
+    return [
+        (draw_pnl_boxplot, box_stats),
+        (draw_avg_pnl, metrics.avg_pnl),
+        (draw_win_rate, metrics.win_rate),
+        (draw_trade_counts, metrics.trade_counts),
+        (draw_total_pnl, metrics.total_pnl),
+        (draw_buy_sell, metrics.buy_sell_avg_pnl()),
+    ]
+
+
+def _render_panel(task):
+    """Worker: draw one panel and save it to `path`, or return its RGBA pixels."""
+    draw, data, figsize, dpi, path, style = task
+    # Worker processes may not inherit the parent's style, so it travels with the task
+    with matplotlib.rc_context(style):
+        fig = Figure(figsize=figsize, dpi=dpi)
+        try:
+            draw(fig.add_subplot(1, 1, 1), data)
+            fig.tight_layout()
+            if path is not None:
+                fig.savefig(path, dpi=dpi)
+                return path
+            canvas = FigureCanvasAgg(fig)
+            canvas.draw()
+            return np.asarray(canvas.buffer_rgba()).copy()
+        finally:
+            fig.clear()
+
+
+def _render_panels(metrics, box_stats, figsize, dpi, paths, workers):
+    """_render_panel() over every overview panel, in worker processes when workers > 1."""
+    rows, columns = OVERVIEW_GRID
+    panel_size = (figsize[0] / columns, figsize[1] / rows)
+    style = dict(matplotlib.rcParams)
+    tasks = [(draw, data, panel_size, dpi, path, style)
+             for (draw, data), path in zip(overview_panels(metrics, box_stats), paths)]
+    if workers <= 1:
+        return [_render_panel(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return list(pool.map(_render_panel, tasks))
+
+
+def save_panels(output_dir, metrics, box_stats, fmt='png', dpi=300, figsize=OVERVIEW_FIGSIZE,
+                workers=1, prefix='sentiment_trader_analysis'):
+    """Write each overview panel to its own file, <prefix>_<n>_<name>.<fmt>; returns the paths."""
+    paths = [os.path.join(output_dir, f'{prefix}_{i + 1}_{name}.{fmt}')
+             for i, name in enumerate(PANEL_NAMES)]
+    return _render_panels(metrics, box_stats, figsize, dpi, paths, workers)
+
+
+def save_overview(path, metrics, box_stats, dpi=300, figsize=OVERVIEW_FIGSIZE, workers=1):
+    """Draw the overview figure and save it to `path` (format from the extension).
+
+    With workers > 1 a raster figure is composited from panels rendered in
+    parallel; vector figures are always drawn in one pass.
+    """
+    fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if workers > 1 and fmt not in VECTOR_FORMATS:
+        pixels = _render_panels(metrics, box_stats, figsize, dpi, [None] * len(PANEL_NAMES), workers)
+        rows, columns = OVERVIEW_GRID
+        image = np.vstack([np.hstack(pixels[row * columns:(row + 1) * columns]) for row in range(rows)])
+        matplotlib.image.imsave(path, image, dpi=dpi)
+        return
+
+    fig = Figure(figsize=figsize)
+    try:
+        for i, (draw, data) in enumerate(overview_panels(metrics, box_stats)):
+            draw(fig.add_subplot(*OVERVIEW_GRID, i + 1), data)
+        fig.tight_layout()
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    finally:
+        fig.clear()
+
+
+def render_png(draw, data, figsize=(10, 6), dpi=100):
+    """Draw one chart on a standalone figure and return it as PNG bytes."""
+    fig = Figure(figsize=figsize)
+    try:
+        draw(fig.add_subplot(1, 1, 1), data)
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        # Drop the artists explicitly so the figure's memory is released at once
+        fig.clear()
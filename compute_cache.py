@@ -0,0 +1,115 @@
+"""
+Computation Cache
+=================
+Bounded, process-wide cache for tables derived from the trade dataset
+(rollups, correlation matrices, sorted daily performance, ...).
+
+Entries are keyed by (name, dataset version, parameters), so every session of
+the dashboard shares results, and a new dataset version never sees stale
+tables. The cache evicts least-recently-used entries once either the entry
+count or the estimated memory footprint exceeds its bounds.
+
+Cached values are returned as-is, without a defensive copy. They must be
+treated as read-only by callers; NumPy arrays are flagged non-writeable.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def estimate_size(value):
+    """Approximate memory footprint of a cached value in bytes."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    """Mark NumPy arrays read-only so shared results cannot be mutated in place."""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+class ComputeCache:
+    """Thread-safe LRU cache bounded by entry count and estimated bytes."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Store a value; values larger than max_bytes are returned uncached."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return value
+        _freeze(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute, *args, **kwargs):
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute(*args, **kwargs))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current occupancy, for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
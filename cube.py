@@ -0,0 +1,215 @@
+"""
+Aggregate Cube
+==============
+Pre-aggregated trade measures over date x classification x side x size
+bucket, which the dashboard renders from instead of regrouping every trade
+on each Streamlit rerun. The cell count depends on the number of trading
+days, not on the number of trades or accounts. The measures are counts and
+sums, plus the PnL sum of squared deviations from the cell mean (M2), so any
+coarser view sums the cells and merges their M2 with Chan et al.'s parallel
+formula. Means, standard deviations, win rates and the Pearson correlations
+used by the dashboard are derived from those measures. Per-account views use
+the account x day table of rolling.daily_pnl() instead.
+
+Usage:
+    python cube.py            # build the cube into the pipeline cache
+"""
+
+import numpy as np
+import pandas as pd
+from pipeline import (SENTIMENT_ORDER, SIZE_LABELS, FEAR_GREED_FILE,
+                      find_trader_file, load_merged_data, size_category)
+from data_cache import read_cache, source_fingerprints, write_cache
+
+# Bump whenever the cube's keys or measures change
+CUBE_VERSION = 3
+
+CUBE_KEYS = ['date', 'classification', 'Side', 'Trade_Size_Category']
+
+# `value` and `sentiment_score` depend only on the date, so carrying them as
+# keys adds no cells but lets sentiment correlations be derived from the cube
+CUBE_ATTRIBUTES = ['value', 'sentiment_score']
+
+MEASURES = ['count', 'pnl_sum', 'pnl_m2', 'wins', 'losses', 'fee_sum',
+            'size_count', 'size_sum', 'size_sumsq', 'pnl_size_sum',
+            'sized_pnl_sum', 'sized_pnl_sumsq']
+
+# Measures that combine by plain addition (all but pnl_m2)
+ADDITIVE_MEASURES = [measure for measure in MEASURES if measure != 'pnl_m2']
+
+
+def build_cube(merged_data):
+    """Materialize the aggregate cube from a merged trade frame."""
+    pnl = merged_data['Closed PnL'].astype('float64')
+    size = merged_data['Size USD'].astype('float64')
+    sized = size.notna()
+    fee = merged_data['Fee'].astype('float64') if 'Fee' in merged_data.columns else 0.0
+
+    frame = pd.DataFrame({
+        'date': merged_data['date'],
+        'classification': merged_data['classification'],
+        'Side': merged_data['Side'],
+        'Trade_Size_Category': size_category(size),
+        'value': merged_data['value'],
+        'sentiment_score': merged_data['sentiment_score'],
+        'count': np.ones(len(merged_data), dtype='int64'),
+        'pnl_sum': pnl,
+        'wins': (pnl > 0).astype('int64'),
+        'losses': (pnl < 0).astype('int64'),
+        'fee_sum': pd.Series(fee, index=merged_data.index).fillna(0.0),
+        'size_count': sized.astype('int64'),
+        'size_sum': size.fillna(0.0),
+        'size_sumsq': (size * size).fillna(0.0),
+        'pnl_size_sum': (pnl * size).fillna(0.0),
+        'sized_pnl_sum': pnl.where(sized, 0.0),
+        'sized_pnl_sumsq': (pnl * pnl).where(sized, 0.0),
+    })
+    # dropna=False keeps trades whose size bucket is undefined in the totals
+    grouped = frame.groupby(CUBE_KEYS + CUBE_ATTRIBUTES, observed=True, dropna=False, sort=False)
+    cube = grouped[ADDITIVE_MEASURES].sum()
+    cube['pnl_m2'] = grouped['pnl_sum'].var(ddof=0) * cube['count']
+    return cube[MEASURES].reset_index()
+
+
+def restore_key_dtypes(cube):
+    """Give the cube's key columns their categorical dtypes back.
+
+    Concatenating cubes built from different batches loses the categories,
+    so they are rebuilt here.
+    """
+    cube['classification'] = pd.Categorical(cube['classification'], categories=SENTIMENT_ORDER)
+    # Ordered, as size_category() builds it
+    cube['Trade_Size_Category'] = pd.Categorical(cube['Trade_Size_Category'], categories=SIZE_LABELS,
+                                                 ordered=True)
+    cube['Side'] = cube['Side'].astype('category')
+    return cube
+
+
+def combine_cubes(*cubes):
+    """Add cubes together cell by cell (e.g. a stored cube and a new batch)."""
+    combined = pd.concat([cube for cube in cubes if cube is not None], ignore_index=True)
+    for key in ['classification', 'Trade_Size_Category', 'Side']:
+        combined[key] = combined[key].astype(object)
+    combined = sum_cells(combined, CUBE_KEYS + CUBE_ATTRIBUTES, dropna=False, sort=False)
+    return restore_key_dtypes(combined.reset_index())
+
+
+def sum_cells(cells, keys, **groupby):
+    """Measures of `cells` summed by `keys`, with their PnL M2 merged.
+
+    The merged M2 of a group is the cells' M2 plus each cell's count times
+    its squared mean deviation from the group mean (Chan et al.), so no
+    sum of squares is ever differenced.
+    """
+    grouped = cells.groupby(keys, observed=True, **groupby)
+    table = grouped[ADDITIVE_MEASURES].sum()
+    count = cells['count'].to_numpy(dtype='float64')
+    group_mean = grouped['pnl_sum'].transform('sum') / grouped['count'].transform('sum')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        deviation = (cells['pnl_sum'] / count - group_mean).fillna(0.0)
+    between = cells['pnl_m2'] + count * deviation * deviation
+    table['pnl_m2'] = between.groupby([cells[key] for key in keys], observed=True, **groupby).sum()
+    return table[MEASURES]
+
+
+def summarize(table):
+    """Add Avg_PnL, Std_PnL, Win_Rate and Avg_Trade_Size to summed measures."""
+    table = table.copy()
+    count = table['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['Avg_PnL'] = table['pnl_sum'] / count
+        table['Std_PnL'] = np.sqrt(table['pnl_m2'] / (count - 1)).where(count > 1)
+        table['Win_Rate'] = table['wins'] / count * 100
+        table['Avg_Trade_Size'] = table['size_sum'] / table['size_count']
+    return table
+
+
+def rollup(cube, keys):
+    """Sum the cube over every key not in `keys` and derive the averages."""
+    if not keys:
+        totals = sum_cells(cube.assign(total=0), ['total']).reset_index(drop=True)
+        if totals.empty:
+            totals = pd.DataFrame(0.0, index=[0], columns=MEASURES)
+        return summarize(totals).iloc[0]
+    table = sum_cells(cube, keys)
+    return summarize(table[table['count'] > 0])
+
+
+def _pearson(n, sx, sy, sxx, syy, sxy):
+    cov = n * sxy - sx * sy
+    var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+    return cov / np.sqrt(var) if var > 0 else np.nan
+
+
+def correlation(cube):
+    """Correlation of Closed PnL, value, sentiment_score and Size USD.
+
+    Matches merged_data[...].corr(): pairs involving Size USD only use trades
+    with a size, all other pairs use every trade.
+    """
+    count = cube['count'].to_numpy(dtype='float64')
+    sized = cube['size_count'].to_numpy(dtype='float64')
+    value = cube['value'].to_numpy(dtype='float64')
+    score = cube['sentiment_score'].to_numpy(dtype='float64')
+    pnl_sum = cube['pnl_sum'].to_numpy()
+    sized_pnl_sum = cube['sized_pnl_sum'].to_numpy()
+
+    n = count.sum()
+    ns = sized.sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pnl_sumsq = np.nan_to_num(cube['pnl_m2'].to_numpy() + pnl_sum * pnl_sum / count)
+    # (n, sum, sum of squares) of each column over all trades, and over sized trades
+    stats = {
+        'Closed PnL': (pnl_sum.sum(), pnl_sumsq.sum()),
+        'value': ((count * value).sum(), (count * value * value).sum()),
+        'sentiment_score': ((count * score).sum(), (count * score * score).sum()),
+    }
+    sized_stats = {
+        'Closed PnL': (sized_pnl_sum.sum(), cube['sized_pnl_sumsq'].sum()),
+        'value': ((sized * value).sum(), (sized * value * value).sum()),
+        'sentiment_score': ((sized * score).sum(), (sized * score * score).sum()),
+    }
+    cross = {
+        ('Closed PnL', 'value'): (pnl_sum * value).sum(),
+        ('Closed PnL', 'sentiment_score'): (pnl_sum * score).sum(),
+        ('value', 'sentiment_score'): (count * value * score).sum(),
+    }
+    size_cross = {
+        'Closed PnL': cube['pnl_size_sum'].sum(),
+        'value': (cube['size_sum'] * value).sum(),
+        'sentiment_score': (cube['size_sum'] * score).sum(),
+    }
+    size_sum, size_sumsq = cube['size_sum'].sum(), cube['size_sumsq'].sum()
+
+    columns = ['Closed PnL', 'value', 'sentiment_score', 'Size USD']
+    corr = pd.DataFrame(np.eye(len(columns)), index=columns, columns=columns)
+    for (a, b), sab in cross.items():
+        corr.loc[a, b] = corr.loc[b, a] = _pearson(n, stats[a][0], stats[b][0],
+                                                   stats[a][1], stats[b][1], sab)
+    for a, sab in size_cross.items():
+        corr.loc[a, 'Size USD'] = corr.loc['Size USD', a] = _pearson(
+            ns, sized_stats[a][0], size_sum, sized_stats[a][1], size_sumsq, sab)
+    return corr
+
+
+def load_cube(trader_path=None, fear_greed_path=FEAR_GREED_FILE, merged_data=None):
+    """Load the cube from the pipeline cache, building it if stale or missing."""
+    if trader_path is None:
+        trader_path = find_trader_file()
+    sources = [trader_path, fear_greed_path]
+
+    cube = read_cache(sources, name='cube', version=CUBE_VERSION)
+    if cube is not None:
+        return cube
+
+    fingerprints = source_fingerprints(sources)
+    if merged_data is None:
+        merged_data, _ = load_merged_data(trader_path, fear_greed_path)
+    cube = build_cube(merged_data)
+    write_cache(cube, sources, name='cube', version=CUBE_VERSION, fingerprints=fingerprints)
+    return cube
+
+
+if __name__ == '__main__':
+    cube = load_cube()
+    print(f"[OK] Aggregate cube: {len(cube):,} cells covering {int(cube['count'].sum()):,} trades")
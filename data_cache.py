@@ -0,0 +1,174 @@
+"""
+Dataset Cache
+=============
+Columnar (Parquet) on-disk cache of the cleaned, merged trade dataset and of
+the tables derived from it (e.g. the aggregate cube).
+
+Each cache entry stores a manifest with the pipeline version and a fingerprint
+(size, mtime, SHA-256) of every source file. An entry is reused only while
+the version matches and every source is unchanged, so editing or replacing
+historical_data.csv or fear_greed_index.csv rebuilds the cache automatically.
+
+Callers fingerprint the sources before loading them and hand those
+fingerprints to write_cache(), so a file replaced while it was being read
+leaves an entry that the next run sees as stale.
+"""
+
+import hashlib
+import json
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (required by pandas for Parquet I/O)
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CACHE_DIR = '.pipeline_cache'
+
+# Bump whenever the cleaning/merge logic changes the shape or content of
+# merged_data so that old cache entries are never served.
+PIPELINE_VERSION = 4
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    """Size, mtime and content hash of a source file."""
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_hash(path),
+    }
+
+
+def source_fingerprints(sources):
+    """Fingerprint of every source by absolute path, as stored in a manifest."""
+    return {os.path.abspath(path): file_fingerprint(path) for path in sources}
+
+
+def _current_fingerprint(path, fingerprint):
+    """The source's fingerprint if it still matches `fingerprint`, else None.
+
+    Size and mtime are compared first; the file is only rehashed when the
+    mtime moved but the size did not (e.g. the file was touched or copied).
+    A matching hash returns the fingerprint with the new mtime, so the next
+    check is cheap again.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if stat.st_size != fingerprint['size']:
+        return None
+    if stat.st_mtime_ns == fingerprint['mtime_ns']:
+        return fingerprint
+    if file_hash(path) != fingerprint['sha256']:
+        return None
+    return {**fingerprint, 'mtime_ns': stat.st_mtime_ns}
+
+
+def dataset_version(sources):
+    """Short identifier of the current sources (path, size, mtime) and pipeline version.
+
+    Cheap enough to compute on every dashboard rerun; used to key in-memory
+    caches of the loaded dataset and its derived tables.
+    """
+    parts = [str(PIPELINE_VERSION)]
+    for path in sources:
+        stat = os.stat(path)
+        parts.append(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}')
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def cache_paths(sources, name='merged', cache_dir=CACHE_DIR):
+    """Return (data_path, manifest_path) of the named cache entry for these sources."""
+    key = hashlib.sha1(
+        '|'.join(os.path.abspath(path) for path in sources).encode('utf-8')
+    ).hexdigest()[:16]
+    base = os.path.join(cache_dir, f'{name}_{key}')
+    return base + '.parquet', base + '.json'
+
+
+def read_cache(sources, columns=None, name='merged', version=0, cache_dir=CACHE_DIR):
+    """Load a cached table, or return None if missing or stale.
+
+    `columns` restricts the read to the listed columns. `name` selects the
+    table ('merged' is the cleaned trade dataset) and `version` is the
+    table's own schema version, checked alongside PIPELINE_VERSION.
+    """
+    if not HAS_PYARROW:
+        return None
+
+    data_path, manifest_path = cache_paths(sources, name, cache_dir)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('version') != [PIPELINE_VERSION, version]:
+        return None
+    fingerprints = manifest.get('sources', {})
+    current = {}
+    for path in sources:
+        key = os.path.abspath(path)
+        if key not in fingerprints:
+            return None
+        current[key] = _current_fingerprint(path, fingerprints[key])
+        if current[key] is None:
+            return None
+
+    try:
+        table = pd.read_parquet(data_path, columns=columns)
+    except (OSError, ValueError):
+        return None
+
+    # Record the new mtime of sources that were touched but not changed
+    if current != fingerprints:
+        try:
+            with open(manifest_path + '.tmp', 'w') as f:
+                json.dump({**manifest, 'sources': current}, f, indent=2)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        except OSError:
+            pass
+    return table
+
+
+def write_cache(table, sources, name='merged', version=0, cache_dir=CACHE_DIR, fingerprints=None):
+    """Store a table (by default the merged dataset) with a fresh manifest.
+
+    `fingerprints` (from source_fingerprints()) should be taken before the
+    sources were read; without them the sources are fingerprinted now.
+    Returns True on success. Failures (read-only filesystem, missing pyarrow)
+    are not fatal: the caller simply keeps working from the CSV sources.
+    """
+    if not HAS_PYARROW:
+        return False
+
+    data_path, manifest_path = cache_paths(sources, name, cache_dir)
+    manifest = {
+        'version': [PIPELINE_VERSION, version],
+        'sources': fingerprints if fingerprints is not None else source_fingerprints(sources),
+        'rows': len(table),
+    }
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to temporary files first so readers never see a partial entry
+        table.to_parquet(data_path + '.tmp', index=False)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(data_path + '.tmp', data_path)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    except (OSError, ValueError):
+        return False
+    return True
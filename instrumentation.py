@@ -0,0 +1,246 @@
+"""
+Stage Instrumentation
+=====================
+Lightweight per-stage timing and memory records for the analysis script and
+the dashboard.
+
+Each stage records wall time, CPU time, rows in/out and the change in
+resident memory. Stages opened inside another stage on the same thread record
+it as their parent, so their time is part of the parent's rather than in
+addition to it, and summary() indents them under it. Instrumentation is off unless enabled with the
+PIPELINE_PROFILE=1 environment variable or a --profile flag; when off, stages
+cost a couple of attribute lookups.
+
+Records are written as one JSON object per line to the 'pipeline.stages'
+logger (stderr by default), can be dumped as a JSON list, and can be served
+in Prometheus text format on a small HTTP endpoint (PIPELINE_METRICS_PORT).
+"""
+
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENV_FLAG = 'PIPELINE_PROFILE'
+ENV_METRICS_PORT = 'PIPELINE_METRICS_PORT'
+CLI_FLAG = '--profile'
+
+MAX_RECORDS = 1000
+
+logger = logging.getLogger('pipeline.stages')
+
+
+def profiling_requested(argv=None):
+    """True if the env var is set to a truthy value or --profile is on the command line."""
+    argv = sys.argv if argv is None else argv
+    flag = os.environ.get(ENV_FLAG, '').strip().lower()
+    return flag in ('1', 'true', 'yes', 'on') or CLI_FLAG in argv
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), or NaN where unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return float('nan')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+class StageRecord:
+    """Measurements of one stage; set `rows_out` before the stage ends."""
+
+    def __init__(self, name, rows_in=None, parent=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.rows_out = None
+        self.seconds = None
+        self.cpu_seconds = None
+        self.memory_delta_mb = None
+        self.rss_mb = None
+        self._start = time.perf_counter()
+        self._cpu = time.process_time()
+        self._rss = rss_mb()
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self._start, 4)
+        # process_time() covers every thread, so concurrent stages overlap
+        self.cpu_seconds = round(time.process_time() - self._cpu, 4)
+        self.rss_mb = round(rss_mb(), 1)
+        self.memory_delta_mb = round(self.rss_mb - self._rss, 1)
+        return self
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'parent': None if self.parent is None else self.parent.name,
+            'depth': self.depth,
+            'seconds': self.seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'memory_delta_mb': self.memory_delta_mb,
+            'rss_mb': self.rss_mb,
+        }
+
+
+class StageProfiler:
+    """Collects StageRecords; a disabled profiler records nothing.
+
+    Stages are blocks (`with profiler.stage('merge', rows) as rec:`), which
+    record even when the block raises.
+    """
+
+    def __init__(self, enabled=None, log=True, max_records=MAX_RECORDS):
+        self.enabled = profiling_requested() if enabled is None else enabled
+        self.log = log
+        self.records = deque(maxlen=max_records)
+        # Per-stage run counts and total seconds, kept beyond the last max_records
+        self.totals = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._server = None
+
+    def _add(self, record):
+        record.finish()
+        with self._lock:
+            self.records.append(record)
+            entry = self.totals.setdefault(record.name, {'runs': 0, 'seconds': 0.0})
+            entry['runs'] += 1
+            entry['seconds'] = round(entry['seconds'] + record.seconds, 4)
+            entry['last'] = record.as_dict()
+        if self.log:
+            logger.info(json.dumps(record.as_dict()))
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        if not self.enabled:
+            yield _NULL_RECORD
+            return
+        # Open stages of this thread, innermost last
+        if not hasattr(self._local, 'open'):
+            self._local.open = []
+        record = StageRecord(name, rows_in, self._local.open[-1] if self._local.open else None)
+        self._local.open.append(record)
+        try:
+            yield record
+        finally:
+            self._local.open.pop()
+            self._add(record)
+
+    def as_dicts(self):
+        with self._lock:
+            return [record.as_dict() for record in self.records]
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dicts(), f, indent=2)
+
+    def summary(self):
+        """Text table of the recorded stages in start order, nested stages indented under their parent."""
+        with self._lock:
+            records = sorted(self.records, key=lambda record: record._start)
+        lines = [f"{'Stage':32s} {'Wall (s)':>9s} {'CPU (s)':>9s} {'Rows in':>12s} "
+                 f"{'Rows out':>12s} {'Mem (MB)':>9s}"]
+        for rec in (record.as_dict() for record in records):
+            rows_in = '' if rec['rows_in'] is None else f"{rec['rows_in']:,}"
+            rows_out = '' if rec['rows_out'] is None else f"{rec['rows_out']:,}"
+            name = '  ' * rec['depth'] + rec['stage']
+            lines.append(f"{name[:32]:32s} {rec['seconds']:9.3f} {rec['cpu_seconds']:9.3f} "
+                         f"{rows_in:>12s} {rows_out:>12s} {rec['memory_delta_mb']:+9.1f}")
+        lines.append(f"Peak RSS: {peak_rss_mb():.0f} MB")
+        return '\n'.join(lines)
+
+    def prometheus_text(self):
+        """Per-stage totals and latest values in Prometheus exposition format."""
+        with self._lock:
+            totals = {stage: dict(entry) for stage, entry in self.totals.items()}
+
+        lines = []
+        metrics = [
+            ('pipeline_stage_runs_total', 'counter', lambda e: e['runs']),
+            ('pipeline_stage_seconds_total', 'counter', lambda e: e['seconds']),
+            ('pipeline_stage_last_seconds', 'gauge', lambda e: e['last']['seconds']),
+            ('pipeline_stage_last_cpu_seconds', 'gauge', lambda e: e['last']['cpu_seconds']),
+            ('pipeline_stage_last_rows_out', 'gauge', lambda e: e['last']['rows_out']),
+            ('pipeline_stage_last_memory_delta_mb', 'gauge', lambda e: e['last']['memory_delta_mb']),
+        ]
+        for metric, kind, value in metrics:
+            lines.append(f'# TYPE {metric} {kind}')
+            for stage, entry in sorted(totals.items()):
+                if value(entry) is not None:
+                    label = stage.replace('\\', '\\\\').replace('"', '\\"')
+                    lines.append(f'{metric}{{stage="{label}"}} {value(entry)}')
+        lines.append('# TYPE pipeline_peak_rss_mb gauge')
+        lines.append(f'pipeline_peak_rss_mb {peak_rss_mb():.1f}')
+        return '\n'.join(lines) + '\n'
+
+    def serve_metrics(self, port=None):
+        """Serve /metrics (Prometheus text) and /stages (JSON) on a background thread.
+
+        The port defaults to PIPELINE_METRICS_PORT; nothing is started when
+        neither is set. Returns the server, or None.
+        """
+        if self._server is not None:
+            return self._server
+        port = port or os.environ.get(ENV_METRICS_PORT)
+        if not port:
+            return None
+        profiler = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics'):
+                    body, kind = profiler.prometheus_text(), 'text/plain; version=0.0.4'
+                elif self.path.startswith('/stages'):
+                    body, kind = json.dumps(profiler.as_dicts()), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', kind)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('0.0.0.0', int(port)), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+class _NullRecord:
+    """Stand-in yielded by disabled stages; attribute writes are ignored."""
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_RECORD = _NullRecord()
+
+
+def configure_logging(stream=None):
+    """Send stage records to `stream` (stderr by default) as bare JSON lines."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
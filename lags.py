@@ -0,0 +1,125 @@
+"""
+Lagged Sentiment Analysis
+=========================
+Does yesterday's (or last week's) Fear/Greed reading predict today's PnL?
+
+For every lag from -max_lead to max_lag days, each trade is paired with the
+index reading `lag` days before its own day (negative lags pair it with a
+reading after the trade, i.e. a lead effect) and the lag profile reports
+the trade-level correlation of that value with Closed PnL, plus win rate
+and average PnL per lagged sentiment bucket.
+
+Trades are first summed per trading day. The lagged readings of every day
+for every lag are then gathered from the dense per-day SentimentLookup
+arrays as one (lags x days) index matrix, so all lags come out of a single
+set of array operations instead of one merge per lag.
+
+Usage:
+    python lags.py --max-lag 60 --max-lead 14
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pipeline import (SENTIMENT_ORDER, FEAR_GREED_FILE, SentimentLookup, find_trader_file,
+                      load_fear_greed, load_merged_data)
+from rolling import DAILY_MEASURES, daily_pnl
+
+DEFAULT_MAX_LAG = 60
+DEFAULT_MAX_LEAD = 14
+
+
+def _pearson(n, sx, sy, sxx, syy, sxy):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        return np.where(var > 0, cov / np.sqrt(np.where(var > 0, var, 1)), np.nan)
+
+
+def lag_profile(daily, lookup, max_lag=DEFAULT_MAX_LAG, max_lead=DEFAULT_MAX_LEAD):
+    """Lag profile of a daily_pnl() table against a SentimentLookup.
+
+    Returns (profile, buckets):
+        profile: indexed by lag, with the trades that have a reading at that
+            lag, the correlation of the lagged value with Closed PnL, win
+            rate and average PnL
+        buckets: indexed by (lag, classification) with trades, win rate and
+            average PnL of trades whose lagged reading falls in that bucket
+    """
+    lags = np.arange(-max_lead, max_lag + 1)
+
+    # One row per trading day: count, PnL sum, PnL sum of squares, wins
+    ordinal = lookup.day_ordinal(daily['date'])
+    days, slot = np.unique(ordinal, return_inverse=True)
+    totals = np.column_stack([np.bincount(slot, weights=daily[measure].to_numpy(dtype='float64'),
+                                          minlength=len(days))
+                              for measure in DAILY_MEASURES])
+    count, pnl, pnl_sq, wins = (np.broadcast_to(column, (len(lags), len(days)))
+                                for column in totals.T)
+
+    # Day of the paired reading for every (lag, trading day)
+    source = days[None, :] - lags[:, None]
+    inside = (source >= 0) & (source < len(lookup))
+    source = np.where(inside, source, 0)
+    code = np.where(inside, lookup.code[source], -1).astype('int64')
+    matched = code >= 0
+    value = np.where(matched, lookup.value[source], 0).astype('float64')
+
+    def by_lag(weights):
+        return np.where(matched, weights, 0.0).sum(axis=1)
+
+    n = by_lag(count)
+    correlation = _pearson(n, by_lag(count * value), by_lag(pnl), by_lag(count * value * value),
+                           by_lag(pnl_sq), by_lag(pnl * value))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profile = pd.DataFrame({
+            'Trade_Count': n.astype('int64'),
+            'Value_PnL_Corr': correlation,
+            'Win_Rate': by_lag(wins) / n * 100,
+            'Avg_PnL': by_lag(pnl) / n,
+        }, index=pd.Index(lags, name='lag'))
+
+    # Per (lag, bucket) sums with one bincount over combined codes
+    n_buckets = len(SENTIMENT_ORDER)
+    group = np.where(matched, np.arange(len(lags))[:, None] * n_buckets + code, -1).ravel()
+    keep = group >= 0
+    size = len(lags) * n_buckets
+
+    def by_bucket(weights):
+        return np.bincount(group[keep], weights=weights.ravel()[keep], minlength=size)
+
+    bucket_count = by_bucket(count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        buckets = pd.DataFrame({
+            'Trade_Count': bucket_count.astype('int64'),
+            'Win_Rate': by_bucket(wins) / bucket_count * 100,
+            'Avg_PnL': by_bucket(pnl) / bucket_count,
+        }, index=pd.MultiIndex.from_product([lags, SENTIMENT_ORDER], names=['lag', 'classification']))
+    return profile, buckets
+
+
+def bucket_table(buckets, metric='Avg_PnL'):
+    """One bucket metric as a lag x sentiment table."""
+    return buckets[metric].unstack().reindex(columns=SENTIMENT_ORDER)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lagged Fear/Greed effect on trade PnL")
+    parser.add_argument('--fear-greed', default=FEAR_GREED_FILE)
+    parser.add_argument('--max-lag', type=int, default=DEFAULT_MAX_LAG,
+                        help="largest lag in days (reading before the trade)")
+    parser.add_argument('--max-lead', type=int, default=DEFAULT_MAX_LEAD,
+                        help="largest lead in days (reading after the trade)")
+    args = parser.parse_args()
+
+    merged_data, _ = load_merged_data(find_trader_file(), args.fear_greed)
+    lookup = SentimentLookup(load_fear_greed(args.fear_greed))
+    profile, buckets = lag_profile(daily_pnl(merged_data), lookup, args.max_lag, args.max_lead)
+    print(f"[OK] Lag profile over lags {-args.max_lead} to {args.max_lag}:")
+    print(profile.round(4).to_string())
+    print("\nAverage PnL by lagged sentiment:")
+    print(bucket_table(buckets).round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
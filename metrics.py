@@ -0,0 +1,164 @@
+"""
+Sentiment Metrics Engine
+========================
+Per-sentiment (and per sentiment x side) trade metrics computed in one
+vectorized pass over integer-coded groups.
+
+Sentiments and sides are turned into small integer codes, and every metric
+is accumulated with np.bincount; medians are selected per group with
+np.partition (see quantiles.py). The resulting SentimentMetrics object is
+shared by the console report, the summary figure and the dashboard,
+replacing their repeated groupby/apply calls.
+"""
+
+import numpy as np
+import pandas as pd
+from pipeline import SENTIMENT_ORDER
+from quantiles import grouped_quantiles
+
+METRIC_COLUMNS = ['Trade_Count', 'Total_PnL', 'Avg_PnL', 'Median_PnL', 'Std_PnL',
+                  'Win_Rate', 'Wins', 'Losses', 'Avg_Trade_Size']
+
+# Columns of the Step 5.1 performance table
+PERFORMANCE_COLUMNS = ['Trade_Count', 'Total_PnL', 'Avg_PnL', 'Median_PnL', 'Std_PnL',
+                       'Avg_Trade_Size']
+
+
+def group_codes(values, categories):
+    """Integer codes of `values` against `categories`; -1 where not listed."""
+    if isinstance(values.dtype, pd.CategoricalDtype) and list(values.cat.categories) == list(categories):
+        return values.cat.codes.to_numpy().astype('int64')
+    return pd.Categorical(values, categories=categories).codes.astype('int64')
+
+
+def group_stats(codes, n_groups, pnl, size):
+    """Metrics for every group code in [0, n_groups); negative codes are skipped."""
+    valid = codes >= 0
+    if not valid.all():
+        codes, pnl, size = codes[valid], pnl[valid], size[valid]
+
+    count = np.bincount(codes, minlength=n_groups)
+    total = np.bincount(codes, weights=pnl, minlength=n_groups)
+    wins = np.bincount(codes, weights=pnl > 0, minlength=n_groups)
+    losses = np.bincount(codes, weights=pnl < 0, minlength=n_groups)
+
+    has_size = ~np.isnan(size)
+    if has_size.all():
+        size_sum, size_count = np.bincount(codes, weights=size, minlength=n_groups), count
+    else:
+        size_sum = np.bincount(codes[has_size], weights=size[has_size], minlength=n_groups)
+        size_count = np.bincount(codes[has_size], minlength=n_groups)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        # Deviations from the group mean keep the sample std numerically stable
+        deviation = pnl - mean[codes]
+        sq_dev = np.bincount(codes, weights=deviation * deviation, minlength=n_groups)
+        std = np.sqrt(sq_dev / (count - 1))
+        avg_size = size_sum / size_count
+
+    # Median by selection within each group (see quantiles.py), not a full sort
+    median = grouped_quantiles(codes, n_groups, pnl, [0.5])[:, 0]
+    present = count > 0
+
+    return pd.DataFrame({
+        'Trade_Count': count,
+        'Total_PnL': total,
+        'Avg_PnL': mean,
+        'Median_PnL': median,
+        'Std_PnL': std,
+        'Win_Rate': np.where(present, wins / np.maximum(count, 1) * 100, np.nan),
+        'Wins': wins.astype('int64'),
+        'Losses': losses.astype('int64'),
+        'Avg_Trade_Size': avg_size,
+    })
+
+
+class SentimentMetrics:
+    """Reusable result of compute_metrics().
+
+    Attributes:
+        by_sentiment: metrics indexed by SENTIMENT_ORDER
+        by_side: metrics indexed by trade side
+        by_sentiment_side: metrics indexed by (classification, Side)
+        overall: metrics over all trades (a Series)
+    """
+
+    def __init__(self, by_sentiment, by_side, by_sentiment_side, overall):
+        self.by_sentiment = by_sentiment
+        self.by_side = by_side
+        self.by_sentiment_side = by_sentiment_side
+        self.overall = overall
+
+    @property
+    def trade_count(self):
+        return int(self.overall['Trade_Count'])
+
+    @property
+    def avg_pnl(self):
+        return self.by_sentiment['Avg_PnL']
+
+    @property
+    def win_rate(self):
+        return self.by_sentiment['Win_Rate']
+
+    @property
+    def trade_counts(self):
+        return self.by_sentiment['Trade_Count']
+
+    @property
+    def total_pnl(self):
+        return self.by_sentiment['Total_PnL']
+
+    def observed(self):
+        """by_sentiment restricted to sentiments that have trades."""
+        return self.by_sentiment[self.by_sentiment['Trade_Count'] > 0]
+
+    def sentiment_counts(self):
+        """Trades per sentiment, largest first (like value_counts())."""
+        return self.observed()['Trade_Count'].sort_values(ascending=False)
+
+    def performance_table(self):
+        """The Step 5.1 table: count, total, mean, median and std PnL plus avg size."""
+        return self.by_sentiment[PERFORMANCE_COLUMNS].round(2)
+
+    def side_avg_pnl(self):
+        """Average PnL per side across all sentiments."""
+        return self.by_side['Avg_PnL']
+
+    def buy_sell_avg_pnl(self):
+        """Average PnL per sentiment (rows) and side (columns)."""
+        table = self.by_sentiment_side['Avg_PnL'].unstack()
+        return table.reindex(SENTIMENT_ORDER)
+
+
+def compute_metrics(merged_data):
+    """Compute SentimentMetrics for a merged trade frame."""
+    pnl = merged_data['Closed PnL'].to_numpy(dtype='float64')
+    size = merged_data['Size USD'].to_numpy(dtype='float64')
+
+    sentiment = group_codes(merged_data['classification'], SENTIMENT_ORDER)
+    if isinstance(merged_data['Side'].dtype, pd.CategoricalDtype):
+        sides = list(merged_data['Side'].cat.categories)
+    else:
+        sides = sorted(merged_data['Side'].dropna().unique())
+    side = group_codes(merged_data['Side'], sides)
+
+    n_sentiments, n_sides = len(SENTIMENT_ORDER), len(sides)
+
+    by_sentiment = group_stats(sentiment, n_sentiments, pnl, size)
+    by_sentiment.index = pd.Index(SENTIMENT_ORDER, name='classification')
+
+    by_side = group_stats(side, n_sides, pnl, size)
+    by_side.index = pd.Index(sides, name='Side')
+
+    combined = np.where((sentiment >= 0) & (side >= 0), sentiment * n_sides + side, -1)
+    by_sentiment_side = group_stats(combined, n_sentiments * n_sides, pnl, size)
+    by_sentiment_side.index = pd.MultiIndex.from_product(
+        [SENTIMENT_ORDER, sides], names=['classification', 'Side']
+    )
+    by_sentiment_side = by_sentiment_side[by_sentiment_side['Trade_Count'] > 0]
+
+    overall = group_stats(np.zeros(len(pnl), dtype='int64'), 1, pnl, size).iloc[0]
+
+    return SentimentMetrics(by_sentiment, by_side, by_sentiment_side, overall)
@@ -0,0 +1,193 @@
+"""
+Parallel Aggregation
+====================
+Multi-core version of the streaming analysis (streaming.py).
+
+The trader CSV is split into byte-range partitions that start on line
+boundaries. Each worker process parses its partition, cleans and
+sentiment-tags it through the shared pipeline, and reduces it to a
+StreamAggregates partial; the median passes are split the same way.
+Partials are merged in partition order, and the partitions depend only on
+the file and `partition_mb`, never on the worker count, so every worker
+count (including the in-process serial mode) produces byte-identical
+results.
+
+Partition boundaries are found by searching for newlines, so the CSV must
+not contain quoted fields with embedded line breaks (Hyperliquid exports
+do not).
+
+Only this script and streaming.py's aggregates run on the partitions;
+sentiment_trader_analysis.py still loads and analyses the whole dataset in
+one process. tests/test_parallel.py checks that the partitioned aggregates
+and medians equal streaming.stream_aggregates() on the same file.
+
+Usage:
+    python parallel.py historical_data.csv --workers 8
+    python parallel.py historical_data.csv --serial      # same partitions, one process
+    python parallel.py historical_data.csv --approx-median --sketch-output sketches.json
+"""
+
+import argparse
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pipeline import (FEAR_GREED_FILE, TRADER_COLUMNS, TRADER_DTYPES, SentimentLookup,
+                      load_fear_greed, clean_trader_data, merge_sentiment)
+from streaming import (StreamAggregates, scan_targets, stream_medians, print_report,
+                       add_median_arguments, save_sketch_outputs)
+from quantiles import DEFAULT_RELATIVE_ERROR
+
+DEFAULT_PARTITION_MB = 64
+
+
+def split_csv(path, partition_mb=DEFAULT_PARTITION_MB):
+    """Byte ranges (start, end) of a CSV's data rows, each ending on a line break."""
+    size = os.path.getsize(path)
+    step = max(int(partition_mb * 1024 * 1024), 1)
+    ranges = []
+    with open(path, 'rb') as f:
+        f.readline()  # header
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + step, size))
+            if f.tell() < size:
+                f.readline()  # run on to the end of the current line
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_partition(path, byte_range, lookup):
+    """Parse, clean and sentiment-tag one partition.
+
+    Returns (rows_read, merged_chunk).
+    """
+    start, end = byte_range
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    raw = pd.read_csv(
+        io.BytesIO(header + data),
+        usecols=lambda col: col in TRADER_COLUMNS,
+        dtype=TRADER_DTYPES
+    )
+    return len(raw), merge_sentiment(clean_trader_data(raw), lookup)
+
+
+def aggregate_partition(task):
+    """Worker: StreamAggregates partial of one partition."""
+    path, byte_range, lookup, relative_error = task
+    rows_read, chunk = read_partition(path, byte_range, lookup)
+    return StreamAggregates(relative_error).update(chunk, rows_read)
+
+
+def scan_partition(task):
+    """Worker: one median pass (see streaming.scan_targets) over one partition."""
+    path, byte_range, lookup, targets, bins = task
+    _, chunk = read_partition(path, byte_range, lookup)
+    return scan_targets([chunk], targets, bins)
+
+
+class PartitionRunner:
+    """Runs per-partition tasks in a process pool, or in-process when serial.
+
+    Results always come back in partition order.
+    """
+
+    def __init__(self, path, fear_greed, workers=None, partition_mb=DEFAULT_PARTITION_MB):
+        self.path = path
+        self.lookup = fear_greed if isinstance(fear_greed, SentimentLookup) else SentimentLookup(fear_greed)
+        self.partitions = split_csv(path, partition_mb)
+        self.workers = min(workers or os.cpu_count() or 1, max(len(self.partitions), 1))
+        self.pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    def map(self, function, *extra):
+        tasks = [(self.path, byte_range, self.lookup) + extra for byte_range in self.partitions]
+        if self.pool is None:
+            return [function(task) for task in tasks]
+        return list(self.pool.map(function, tasks))
+
+    def aggregates(self, relative_error=DEFAULT_RELATIVE_ERROR):
+        """StreamAggregates of the whole file, merged in partition order."""
+        aggregates = StreamAggregates(relative_error)
+        for partial in self.map(aggregate_partition, relative_error):
+            aggregates.combine(partial)
+        return aggregates
+
+    def scan(self, targets, bins):
+        """One median pass over every partition, for stream_medians(scan=...)."""
+        merged = None
+        for results in self.map(scan_partition, targets, bins):
+            if merged is None:
+                merged = results
+                continue
+            merged = [np.concatenate([left, right]) if target['collect'] else left + right
+                      for target, left, right in zip(targets, merged, results)]
+        return merged
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parallel_aggregates(path, fear_greed, workers=None, partition_mb=DEFAULT_PARTITION_MB,
+                        medians=True):
+    """Return (aggregates, medians) of a trader CSV using `workers` processes.
+
+    workers=1 runs the same partitions serially in this process. `medians`
+    is None when not requested.
+    """
+    with PartitionRunner(path, fear_greed, workers, partition_mb) as runner:
+        aggregates = runner.aggregates()
+        pnl_medians = stream_medians(path, fear_greed, aggregates, scan=runner.scan) if medians else None
+    return aggregates, pnl_medians
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel sentiment vs trader performance analysis")
+    parser.add_argument('trader_file', nargs='?', default='historical_data.csv')
+    parser.add_argument('--fear-greed', default=FEAR_GREED_FILE)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU core)")
+    parser.add_argument('--serial', action='store_true',
+                        help="process the partitions in this process, for debugging")
+    parser.add_argument('--partition-mb', type=float, default=DEFAULT_PARTITION_MB,
+                        help="size of each CSV partition in MB")
+    add_median_arguments(parser)
+    args = parser.parse_args()
+    workers = 1 if args.serial else args.workers
+
+    print("=" * 80)
+    print("PARALLEL SENTIMENT vs TRADER PERFORMANCE ANALYSIS")
+    print("=" * 80)
+
+    fear_greed = load_fear_greed(args.fear_greed)
+    with PartitionRunner(args.trader_file, fear_greed, workers, args.partition_mb) as runner:
+        mode = 'serially' if runner.pool is None else f'with {runner.workers} workers'
+        aggregates = runner.aggregates(args.relative_error)
+        print(f"[OK] Processed {aggregates.rows_read:,} records in "
+              f"{len(runner.partitions)} partitions {mode}")
+        print(f"[OK] Final dataset for analysis: {aggregates.trade_count:,} records")
+
+        medians = None
+        if args.approx_median:
+            medians = aggregates.sketches.medians()
+        elif not args.no_median:
+            medians = stream_medians(args.trader_file, fear_greed, aggregates, scan=runner.scan)
+
+    print_report(aggregates, medians, approximate=args.approx_median)
+    save_sketch_outputs(aggregates, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Data Pipeline
+=============
+Shared loading, cleaning and merging of the Bitcoin Fear/Greed Index and the
+Hyperliquid trader data. Both sentiment_trader_analysis.py and app.py build
+their `merged_data` frame through this module.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from data_cache import read_cache, source_fingerprints, write_cache
+from instrumentation import StageProfiler
+
+FEAR_GREED_FILE = 'fear_greed_index.csv'
+TRADER_FILES = ['historical_data.csv', 'historical_data_sample.csv']
+
+SENTIMENT_ORDER = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
+SENTIMENT_MAP = {
+    'Extreme Fear': 1,
+    'Fear': 2,
+    'Neutral': 3,
+    'Greed': 4,
+    'Extreme Greed': 5
+}
+SENTIMENT_COLORS = ['#8B0000', '#FF4500', '#FFD700', '#32CD32', '#006400']
+
+TIMESTAMP_FORMAT = '%d-%m-%Y %H:%M'
+
+# Hyperliquid exports also carry the fill time as UTC epoch milliseconds;
+# IST is UTC+05:30
+EPOCH_COLUMN = 'Timestamp'
+IST_OFFSET_NS = (5 * 3600 + 30 * 60) * 10**9
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_DAY = 86_400 * 10**9
+NAT = np.iinfo('int64').min
+
+SIZE_BINS = [0, 100, 500, 1000, 5000, float('inf')]
+SIZE_LABELS = ['< $100', '$100-$500', '$500-$1K', '$1K-$5K', '> $5K']
+
+# Only the trader columns the analysis actually reads are parsed
+TRADER_COLUMNS = ['Account', 'Side', 'Timestamp IST', 'Timestamp', 'Execution Price',
+                  'Size USD', 'Closed PnL', 'Fee']
+NUMERIC_COLUMNS = ['Execution Price', 'Size USD', 'Closed PnL', 'Fee']
+
+# Merged columns read by the analysis script and the report; the fill time,
+# execution price and fee are left out (the report adds 'Fee' for the
+# account fee totals)
+ANALYSIS_COLUMNS = ['Account', 'Side', 'Size USD', 'Closed PnL', 'date', 'value',
+                    'classification', 'sentiment_score']
+
+# Fill identifiers, read only when deduplicating incremental batches
+ID_COLUMNS = ['Transaction Hash', 'Trade ID']
+
+# Explicit dtypes so read_csv never builds object columns for repeated labels.
+# 'Closed PnL' and 'Size USD' stay float64 because they are summed and
+# reported to the cent; 'Execution Price' is only displayed and 'Fee' values
+# are small (float32 keeps ~7 significant digits), so float32 is enough.
+TRADER_DTYPES = {
+    'Account': 'category',
+    'Side': 'category',
+    'Timestamp IST': 'object',
+}
+FLOAT32_COLUMNS = ['Execution Price', 'Fee']
+
+
+def load_fear_greed(path=FEAR_GREED_FILE):
+    """Load the Fear/Greed Index with a parsed date and a 1-5 sentiment score."""
+    fear_greed = pd.read_csv(
+        path,
+        usecols=['date', 'value', 'classification'],
+        dtype={'value': 'int16'}
+    )
+    fear_greed['date'] = pd.to_datetime(fear_greed['date'])
+    fear_greed['classification'] = pd.Categorical(
+        fear_greed['classification'], categories=SENTIMENT_ORDER
+    )
+    fear_greed['sentiment_score'] = fear_greed['classification'].map(SENTIMENT_MAP).astype('int8')
+    return fear_greed.sort_values('date').reset_index(drop=True)
+
+
+def find_trader_file():
+    """Return the first available trader data file, or None."""
+    for path in TRADER_FILES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_trader_data(path, extra_columns=()):
+    """Read the raw trader CSV, keeping only the columns used downstream.
+
+    `extra_columns` are read as well when present (e.g. ID_COLUMNS).
+    """
+    columns = set(TRADER_COLUMNS) | set(extra_columns)
+    return pd.read_csv(
+        path,
+        usecols=lambda col: col in columns,
+        dtype=TRADER_DTYPES
+    )
+
+
+def parse_timestamp_text(values):
+    """Parse "DD-MM-YYYY HH:MM" strings to int64 nanoseconds (NAT if invalid).
+
+    Fixed-width strings are decoded digit by digit on a (rows x 16) code
+    array; anything else (e.g. unpadded "1-2-2024 3:04") falls back to
+    pd.to_datetime for just those rows.
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_numeric_dtype(values):
+        # An all-empty column is read as float NaN
+        values = values.astype(object)
+    ns = np.full(len(values), NAT, dtype='int64')
+    fixed = (values.str.len() == 16).to_numpy(dtype=bool, na_value=False)
+
+    codes = np.asarray(values[fixed].to_numpy(dtype=object), dtype='U16')
+    codes = codes.view(np.uint32).reshape(-1, 16).astype('int64')
+    digits = codes - ord('0')
+    digit_cols = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15]
+    ok = ((digits[:, digit_cols] >= 0) & (digits[:, digit_cols] <= 9)).all(axis=1)
+    ok &= (codes[:, 2] == ord('-')) & (codes[:, 5] == ord('-'))
+    ok &= (codes[:, 10] == ord(' ')) & (codes[:, 13] == ord(':'))
+
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    year = digits[:, 6] * 1000 + digits[:, 7] * 100 + digits[:, 8] * 10 + digits[:, 9]
+    hour = digits[:, 11] * 10 + digits[:, 12]
+    minute = digits[:, 14] * 10 + digits[:, 15]
+    ok &= (month >= 1) & (month <= 12) & (hour <= 23) & (minute <= 59) & (day >= 1)
+
+    # Days since 1970-01-01 of the first of the month, and the month's length
+    months = np.where(ok, (year - 1970) * 12 + month - 1, 0)
+    month_start = months.astype('M8[M]').astype('M8[D]').astype('int64')
+    month_end = (months + 1).astype('M8[M]').astype('M8[D]').astype('int64')
+    ok &= day <= month_end - month_start
+
+    days = month_start + day - 1
+    parsed = days * NS_PER_DAY + hour * 3600 * 10**9 + minute * NS_PER_MINUTE
+    rows = np.flatnonzero(fixed)
+    ns[rows[ok]] = parsed[ok]
+
+    # Rows the fixed-width decoder could not handle go through the slow path
+    rest = np.flatnonzero(ns == NAT)
+    rest = rest[values.iloc[rest].notna().to_numpy()]
+    if len(rest):
+        slow = pd.to_datetime(values.iloc[rest], format=TIMESTAMP_FORMAT, errors='coerce')
+        ns[rest] = slow.to_numpy(dtype='M8[ns]').astype('int64')
+    return ns
+
+
+def epoch_to_ist(epoch_ms):
+    """UTC epoch milliseconds to IST wall-clock int64 nanoseconds (NAT if missing)."""
+    epoch_ms = pd.to_numeric(epoch_ms, errors='coerce').to_numpy(dtype='float64')
+    ns = np.full(len(epoch_ms), NAT, dtype='int64')
+    present = ~np.isnan(epoch_ms)
+    ns[present] = epoch_ms[present].astype('int64') * 10**6 + IST_OFFSET_NS
+    return ns
+
+
+def normalize_timestamps(trader_data, check_rows=1000):
+    """Set 'Timestamp IST' and its day key 'date' (datetime64[ns]) in place.
+
+    Uses the numeric epoch column when the export has one and it agrees with
+    the text timestamps on the first `check_rows` rows (some exports round it,
+    e.g. to 1.73E+12), and the fixed-width text parser otherwise. The day key
+    is integer arithmetic on the nanoseconds.
+
+    Returns {'source': 'epoch' or 'text', 'failed': rows without a timestamp}.
+    """
+    text = trader_data['Timestamp IST'] if 'Timestamp IST' in trader_data.columns else None
+    ns, source = None, 'text'
+    if EPOCH_COLUMN in trader_data.columns:
+        ns, source = epoch_to_ist(trader_data[EPOCH_COLUMN]), 'epoch'
+        trader_data.drop(columns=EPOCH_COLUMN, inplace=True)
+        if text is not None:
+            check = parse_timestamp_text(text.iloc[:check_rows])
+            both = (check != NAT) & (ns[:check_rows] != NAT)
+            if not both.any() or (ns[:check_rows][both] // NS_PER_MINUTE
+                                  != check[both] // NS_PER_MINUTE).any():
+                ns, source = None, 'text'
+    if ns is None:
+        ns = parse_timestamp_text(text)
+    elif text is not None and (ns == NAT).any():
+        missing = np.flatnonzero(ns == NAT)
+        ns[missing] = parse_timestamp_text(text.iloc[missing])
+
+    valid = ns != NAT
+    day = np.where(valid, ns - ns % NS_PER_DAY, NAT)
+    trader_data['Timestamp IST'] = ns.view('M8[ns]')
+    trader_data['date'] = day.view('M8[ns]')
+    return {'source': source, 'failed': int(len(ns) - valid.sum())}
+
+
+def coerce_numeric_columns(trader_data):
+    """Convert NUMERIC_COLUMNS to numbers in place (float32 for FLOAT32_COLUMNS)."""
+    for col in NUMERIC_COLUMNS:
+        if col in trader_data.columns:
+            trader_data[col] = pd.to_numeric(trader_data[col], errors='coerce')
+            if col in FLOAT32_COLUMNS:
+                trader_data[col] = trader_data[col].astype('float32')
+
+
+def clean_trader_data(trader_data):
+    """Parse timestamps and numerics, and keep only trades with a closed PnL.
+
+    The timestamp parse summary of normalize_timestamps() is kept in the
+    result's attrs['timestamps'].
+    """
+    timestamps = normalize_timestamps(trader_data)
+    coerce_numeric_columns(trader_data)
+
+    # Focus on closed positions
+    trader_data = trader_data.dropna(subset=['date', 'Closed PnL'])
+    trader_data = trader_data[trader_data['Closed PnL'] != 0].reset_index(drop=True)
+    trader_data.attrs['timestamps'] = timestamps
+    return trader_data
+
+
+def size_category(size_usd):
+    """Bucket trade sizes (USD) into the SIZE_LABELS categories."""
+    return pd.cut(size_usd, bins=SIZE_BINS, labels=SIZE_LABELS)
+
+
+class SentimentLookup:
+    """Dense per-day sentiment table indexed by day ordinal.
+
+    The Fear/Greed Index has at most one reading per day, so instead of
+    hash-joining trades against it, each trade's day is turned into an integer
+    offset from the first index date and used to gather `value`,
+    `sentiment_score` and the classification code directly. Days without a
+    reading have code -1.
+    """
+
+    def __init__(self, fear_greed):
+        days = fear_greed['date'].to_numpy(dtype='datetime64[D]')
+        self.origin = days.min()
+        ordinal = (days - self.origin).astype('int64')
+        size = int(ordinal.max()) + 1
+
+        self.value = np.zeros(size, dtype='int16')
+        self.sentiment_score = np.zeros(size, dtype='int8')
+        self.code = np.full(size, -1, dtype='int8')
+        self.value[ordinal] = fear_greed['value'].to_numpy()
+        self.sentiment_score[ordinal] = fear_greed['sentiment_score'].to_numpy()
+        self.code[ordinal] = pd.Categorical(
+            fear_greed['classification'], categories=SENTIMENT_ORDER
+        ).codes
+
+    def __len__(self):
+        return len(self.code)
+
+    def day_ordinal(self, dates):
+        """Days since the first index date; -1 where the date is missing."""
+        days = np.asarray(dates, dtype='datetime64[D]')
+        ordinal = (days - self.origin).astype('int64')
+        ordinal[np.isnat(days)] = -1
+        return ordinal
+
+    def matches(self, ordinal):
+        """Boolean mask of ordinals that have a sentiment reading."""
+        matched = (ordinal >= 0) & (ordinal < len(self.code))
+        matched[matched] = self.code[ordinal[matched]] >= 0
+        return matched
+
+
+def merge_sentiment(trader_data, fear_greed):
+    """Attach the same-day sentiment to each trade, dropping unmatched days.
+
+    `fear_greed` may be the loaded index or a prebuilt SentimentLookup.
+    """
+    if isinstance(fear_greed, SentimentLookup):
+        lookup = fear_greed
+    else:
+        lookup = SentimentLookup(fear_greed)
+
+    ordinal = lookup.day_ordinal(trader_data['date'])
+    matched = lookup.matches(ordinal)
+    merged_data = trader_data[matched].reset_index(drop=True)
+    ordinal = ordinal[matched]
+
+    merged_data['value'] = lookup.value[ordinal]
+    merged_data['classification'] = pd.Categorical.from_codes(
+        lookup.code[ordinal], categories=SENTIMENT_ORDER
+    )
+    merged_data['sentiment_score'] = lookup.sentiment_score[ordinal]
+    return merged_data
+
+
+def bytes_per_trade(trades):
+    """In-memory footprint of a trade frame per row, including category tables."""
+    return trades.memory_usage(deep=True).sum() / max(len(trades), 1)
+
+
+def filter_dates(frame, start=None, end=None, column='date'):
+    """Rows of `frame` whose day lies in [start, end]; either bound may be None."""
+    mask = np.ones(len(frame), dtype=bool)
+    if start is not None:
+        mask &= (frame[column] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (frame[column] <= pd.Timestamp(end)).to_numpy()
+    return frame if mask.all() else frame[mask].reset_index(drop=True)
+
+
+def load_merged_data(trader_path=None, fear_greed_path=FEAR_GREED_FILE,
+                     columns=None, use_cache=True, profiler=None, progress=None):
+    """Run the full load -> clean -> merge pipeline.
+
+    When `use_cache` is set, a fresh Parquet cache of the merged dataset is
+    read instead of reparsing the CSVs, and a stale or missing one is rebuilt.
+    `columns` restricts the returned merged frame to the listed columns.
+
+    Each step runs as a stage of `profiler` (a StageProfiler), and
+    `progress(step, frame)` is called after it with the frame it produced:
+    'cached' (merged data read from the cache), 'loaded' (raw trader data),
+    'cleaned' (cleaned trader data) and 'merged' (merged data).
+
+    Returns (merged_data, fear_greed).
+    """
+    if trader_path is None:
+        trader_path = find_trader_file()
+    if trader_path is None:
+        raise FileNotFoundError(
+            "No data file found! Please ensure historical_data.csv or "
+            "historical_data_sample.csv exists."
+        )
+
+    sources = [trader_path, fear_greed_path]
+    profiler = profiler or StageProfiler(enabled=False)
+    progress = progress or (lambda step, frame: None)
+
+    if use_cache:
+        with profiler.stage('read cache') as stage:
+            merged_data = read_cache(sources, columns=columns)
+            stage.rows_out = None if merged_data is None else len(merged_data)
+        if merged_data is not None:
+            progress('cached', merged_data)
+            return merged_data, load_fear_greed(fear_greed_path)
+        # Fingerprint the sources before reading them (see data_cache.py)
+        fingerprints = source_fingerprints(sources)
+
+    fear_greed = load_fear_greed(fear_greed_path)
+    with profiler.stage('load trader data') as stage:
+        trader_data = load_trader_data(trader_path)
+        stage.rows_out = len(trader_data)
+    progress('loaded', trader_data)
+    with profiler.stage('clean', rows_in=len(trader_data)) as stage:
+        trader_data = clean_trader_data(trader_data)
+        stage.rows_out = len(trader_data)
+    progress('cleaned', trader_data)
+    with profiler.stage('merge', rows_in=len(trader_data)) as stage:
+        merged_data = merge_sentiment(trader_data, fear_greed)
+        stage.rows_out = len(merged_data)
+    if use_cache:
+        write_cache(merged_data, sources, fingerprints=fingerprints)
+    progress('merged', merged_data)
+    if columns is not None:
+        merged_data = merged_data[columns]
+    return merged_data, fear_greed
@@ -0,0 +1,344 @@
+"""
+Quantile Engine
+===============
+Exact and approximate quantiles of PnL per sentiment bucket.
+
+In memory, quantiles are exact and found by selection (np.partition places
+only the needed order statistics) instead of sorting every bucket.
+
+In streaming and partitioned mode each bucket keeps a QuantileSketch: a
+log-bucketed histogram (the DDSketch scheme) whose quantiles are within a
+configurable relative error of the exact order statistic. Sketches merge by
+adding bucket counts, so partials combine in any order to the same sketch,
+and they serialize to JSON so medians, percentile tables and boxplots can
+be served later without rescanning the trades.
+
+Usage:
+    python quantiles.py sketches.json            # percentiles from saved sketches
+"""
+
+import argparse
+import json
+import numpy as np
+import pandas as pd
+
+# Percentiles reported in the percentile tables
+PERCENTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Sketch quantiles are within this fraction of the exact value ...
+DEFAULT_RELATIVE_ERROR = 0.005
+# ... except for magnitudes below this, which all fall in the zero bucket
+DEFAULT_MIN_VALUE = 1e-4
+
+# Label of the all-trades sketch
+ALL_TRADES = 'All'
+
+
+def exact_quantiles(values, qs):
+    """Exact quantiles (linear interpolation, like np.percentile) by selection."""
+    values = np.asarray(values, dtype='float64')
+    values = values[~np.isnan(values)]
+    qs = np.asarray(qs, dtype='float64')
+    if len(values) == 0:
+        return np.full(len(qs), np.nan)
+    position = qs * (len(values) - 1)
+    lower = np.floor(position).astype('int64')
+    upper = np.ceil(position).astype('int64')
+    selected = np.partition(values, np.unique(np.concatenate([lower, upper])))
+    fraction = position - lower
+    return selected[lower] * (1 - fraction) + selected[upper] * fraction
+
+
+def grouped_quantiles(codes, n_groups, values, qs):
+    """Exact quantiles of `values` per group code in [0, n_groups), as (groups x qs).
+
+    Values are ordered by group once (radix sort for small code types), then
+    each group's slice is partitioned. Negative codes are skipped.
+    """
+    qs = np.asarray(qs, dtype='float64')
+    if n_groups == 1:
+        return exact_quantiles(values[codes >= 0], qs)[None, :]
+    valid = (codes >= 0) & ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    order = np.argsort(codes.astype(np.min_scalar_type(max(n_groups - 1, 0))), kind='stable')
+    grouped = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    ends = np.cumsum(counts)
+    result = np.full((n_groups, len(qs)), np.nan)
+    for group in np.flatnonzero(counts):
+        result[group] = exact_quantiles(grouped[ends[group] - counts[group]:ends[group]], qs)
+    return result
+
+
+class _Buckets:
+    """Dense counts of consecutive integer bucket keys starting at `offset`."""
+
+    def __init__(self, offset=0, counts=None):
+        self.offset = int(offset)
+        self.counts = np.zeros(0, dtype='int64') if counts is None else np.asarray(counts, dtype='int64')
+
+    def _cover(self, lo, hi):
+        if len(self.counts) == 0:
+            self.offset, self.counts = int(lo), np.zeros(int(hi - lo + 1), dtype='int64')
+            return
+        start, end = min(lo, self.offset), max(hi, self.offset + len(self.counts) - 1)
+        if start == self.offset and end == self.offset + len(self.counts) - 1:
+            return
+        counts = np.zeros(int(end - start + 1), dtype='int64')
+        counts[self.offset - start:self.offset - start + len(self.counts)] = self.counts
+        self.offset, self.counts = int(start), counts
+
+    def add(self, keys):
+        if len(keys) == 0:
+            return
+        self._cover(keys.min(), keys.max())
+        self.counts += np.bincount(keys - self.offset, minlength=len(self.counts))
+
+    def merge(self, other):
+        if len(other.counts) == 0:
+            return
+        self._cover(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        self.counts[start:start + len(other.counts)] += other.counts
+
+    def nonzero(self):
+        """(keys, counts) of the non-empty buckets, in ascending key order."""
+        keys = np.flatnonzero(self.counts)
+        return keys + self.offset, self.counts[keys]
+
+    def to_dict(self):
+        # Trim empty ends so the serialized form stays small
+        keys = np.flatnonzero(self.counts)
+        if len(keys) == 0:
+            return {'offset': 0, 'counts': []}
+        return {'offset': self.offset + int(keys[0]),
+                'counts': self.counts[keys[0]:keys[-1] + 1].tolist()}
+
+
+class QuantileSketch:
+    """Mergeable, serializable quantile sketch with a relative error bound.
+
+    A value x with |x| >= min_value lands in bucket ceil(log_gamma(|x|)),
+    with gamma = (1 + e) / (1 - e), and is answered with the bucket's
+    midpoint, which is within a fraction e (`relative_error`) of every value
+    in the bucket. Negative values use a mirrored set of buckets; smaller
+    magnitudes share a zero bucket. Count, sum, min and max are exact.
+    """
+
+    def __init__(self, relative_error=DEFAULT_RELATIVE_ERROR, min_value=DEFAULT_MIN_VALUE):
+        if not 0 < relative_error < 1:
+            raise ValueError("relative_error must be between 0 and 1")
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = np.log(self.gamma)
+        self.positive = _Buckets()
+        self.negative = _Buckets()
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _keys(self, magnitudes):
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype('int64')
+
+    def _value(self, keys):
+        return 2 * self.gamma ** keys.astype('float64') / (self.gamma + 1)
+
+    def update(self, values):
+        """Add an array of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        small = np.abs(values) < self.min_value
+        self.zero_count += int(small.sum())
+        self.positive.add(self._keys(values[~small & (values > 0)]))
+        self.negative.add(self._keys(-values[~small & (values < 0)]))
+        return self
+
+    def merge(self, other):
+        """Add another sketch with the same parameters into this one."""
+        if (other.relative_error, other.min_value) != (self.relative_error, self.min_value):
+            raise ValueError("Cannot merge sketches with different error bounds")
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _ordered(self):
+        """(representative values, counts) of all non-empty buckets, ascending."""
+        neg_keys, neg_counts = self.negative.nonzero()
+        pos_keys, pos_counts = self.positive.nonzero()
+        values = np.concatenate([-self._value(neg_keys[::-1]), [0.0], self._value(pos_keys)])
+        counts = np.concatenate([neg_counts[::-1], [self.zero_count], pos_counts])
+        keep = counts > 0
+        return values[keep], counts[keep]
+
+    def quantiles(self, qs):
+        """Approximate quantiles; q=0 and q=1 give the exact min and max."""
+        qs = np.asarray(qs, dtype='float64')
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        values, counts = self._ordered()
+        ranks = qs * (self.count - 1)
+        index = np.searchsorted(np.cumsum(counts), ranks, side='right')
+        result = values[np.minimum(index, len(values) - 1)]
+        result = np.clip(result, self.min, self.max)
+        result[qs <= 0] = self.min
+        result[qs >= 1] = self.max
+        return result
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def box_stats(self, label, max_fliers=200):
+        """Boxplot statistics in the format of charts.pnl_box_stats().
+
+        Whiskers are the outermost bucket values within 1.5 IQR of the box;
+        outliers are the representative values of the buckets beyond them.
+        """
+        if self.count == 0:
+            return {'label': label, 'med': np.nan, 'q1': np.nan, 'q3': np.nan,
+                    'whislo': np.nan, 'whishi': np.nan, 'fliers': np.array([])}
+        q1, med, q3 = self.quantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        values, _ = self._ordered()
+        values = np.clip(values, self.min, self.max)
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        whislo, whishi = (inside[0], inside[-1]) if len(inside) else (q1, q3)
+        fliers = values[(values < whislo) | (values > whishi)]
+        if len(fliers) > max_fliers:
+            fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(int)]
+        return {'label': label, 'med': med, 'q1': q1, 'q3': q3,
+                'whislo': whislo, 'whishi': whishi, 'fliers': fliers}
+
+    def to_dict(self):
+        return {
+            'relative_error': self.relative_error,
+            'min_value': self.min_value,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'zero_count': self.zero_count,
+            'positive': self.positive.to_dict(),
+            'negative': self.negative.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['relative_error'], state['min_value'])
+        sketch.count = state['count']
+        sketch.sum = state['sum']
+        if state['count']:
+            sketch.min, sketch.max = state['min'], state['max']
+        sketch.zero_count = state['zero_count']
+        sketch.positive = _Buckets(**state['positive'])
+        sketch.negative = _Buckets(**state['negative'])
+        return sketch
+
+
+class GroupSketches:
+    """One QuantileSketch per group label plus one over all values."""
+
+    def __init__(self, groups, relative_error=DEFAULT_RELATIVE_ERROR, min_value=DEFAULT_MIN_VALUE):
+        self.groups = list(groups)
+        self.sketches = {label: QuantileSketch(relative_error, min_value)
+                         for label in self.groups + [ALL_TRADES]}
+
+    @property
+    def relative_error(self):
+        return self.sketches[ALL_TRADES].relative_error
+
+    def update(self, values, codes):
+        """Add values whose group is self.groups[code]; negative codes only count in All."""
+        values = np.asarray(values, dtype='float64')
+        self.sketches[ALL_TRADES].update(values)
+        for code, label in enumerate(self.groups):
+            self.sketches[label].update(values[codes == code])
+        return self
+
+    def merge(self, other):
+        for label, sketch in other.sketches.items():
+            self.sketches[label].merge(sketch)
+        return self
+
+    def medians(self):
+        """Approximate median per group (and All), like streaming.stream_medians()."""
+        return pd.Series({label: sketch.quantile(0.5) for label, sketch in self.sketches.items()
+                          if sketch.count}, dtype='float64')
+
+    def percentile_table(self, qs=PERCENTILES):
+        """Approximate percentiles, one row per group with values."""
+        rows = {label: sketch.quantiles(qs) for label, sketch in self.sketches.items() if sketch.count}
+        return percentile_frame(rows, qs)
+
+    def box_stats(self):
+        """Boxplot statistics per group (not All), in group order."""
+        return [self.sketches[label].box_stats(label) for label in self.groups]
+
+    def to_json(self):
+        return json.dumps({'groups': self.groups,
+                           'sketches': {label: sketch.to_dict()
+                                        for label, sketch in self.sketches.items()}})
+
+    @classmethod
+    def from_json(cls, text):
+        state = json.loads(text)
+        group_sketches = cls(state['groups'])
+        group_sketches.sketches = {label: QuantileSketch.from_dict(sketch)
+                                   for label, sketch in state['sketches'].items()}
+        return group_sketches
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_json(f.read())
+
+
+def percentile_frame(rows, qs=PERCENTILES):
+    """Percentile table from {label: quantile values}, columns like 'P5', 'P50'."""
+    columns = [f'P{q * 100:g}' for q in qs]
+    return pd.DataFrame.from_dict(rows, orient='index', columns=columns)
+
+
+def exact_percentile_table(values, codes, groups, qs=PERCENTILES):
+    """Exact percentiles per group and over all values, shaped like
+    GroupSketches.percentile_table()."""
+    values = np.asarray(values, dtype='float64')
+    table = grouped_quantiles(codes, len(groups), values, qs)
+    rows = {label: row for label, row in zip(groups, table) if not np.isnan(row).all()}
+    rows[ALL_TRADES] = exact_quantiles(values, qs)
+    return percentile_frame(rows, qs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PnL percentiles from saved quantile sketches")
+    parser.add_argument('sketches', help="JSON file written with --sketch-output")
+    args = parser.parse_args()
+
+    sketches = GroupSketches.load(args.sketches)
+    print(f"[OK] Loaded sketches for {len(sketches.groups)} groups "
+          f"(±{sketches.relative_error:.2%} relative error)")
+    print("\nMedian PnL:")
+    print(sketches.medians().round(2).to_string())
+    print("\nPnL percentiles:")
+    print(sketches.percentile_table().round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+Dataset Refresh
+===============
+Background worker that keeps the dashboard's dataset current without making
+any request pay for a reload.
+
+The worker polls the version of the data sources (the trade store manifest,
+or the trader and Fear/Greed files' size and mtime) every few seconds. When
+it changes and then stays unchanged for one more poll (so a file still being
+copied in is not read half-written), the worker builds the next Dataset --
+cleaned trades, aggregate cube, account x day table, per-sentiment metrics,
+PnL box statistics and the filter indexes -- on its own thread, and only then swaps it in by
+replacing a single reference. Until the swap every session keeps serving the
+previous version; a failed build is recorded and the previous version stays.
+
+The first dataset is built on the worker thread too, so starting the
+refresher never blocks; until it is ready `current` is None. Running
+`python refresh.py` before starting the dashboard writes the snapshot ahead
+of time, and the first dataset then maps within milliseconds.
+
+The last KEEP_VERSIONS datasets stay reachable by version, so a rerun that
+started on the old version finishes on it.
+
+Each version is also written once as a memory-mapped snapshot (see
+snapshot.py). Every dashboard process on the machine then maps that snapshot
+instead of building its own copy. Only the first process to see a version
+builds it; the others map it within milliseconds.
+
+Usage:
+    python refresh.py                 # build (and snapshot) once and print the version
+    python refresh.py --watch -i 5    # poll every 5 seconds, print each new version
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from pipeline import FEAR_GREED_FILE, find_trader_file, load_merged_data, load_fear_greed
+from data_cache import dataset_version
+from trade_store import TradeStore
+from metrics import compute_metrics
+from cube import load_cube
+from trade_index import FrameIndex
+from charts import pnl_box_stats
+from rolling import daily_pnl
+from snapshot import SNAPSHOT_DIR, snapshot_path, read_snapshot, write_snapshot, prune_snapshots
+from instrumentation import StageProfiler
+
+ENV_INTERVAL = 'REFRESH_INTERVAL'
+DEFAULT_INTERVAL = 10.0
+KEEP_VERSIONS = 2
+
+logger = logging.getLogger('pipeline.refresh')
+
+
+class Dataset:
+    """One immutable dataset version with its aggregates, indexes and build timing.
+
+    The trades and cube are the date-sorted frames of their filter indexes;
+    `account_days` is the daily_pnl() table behind the per-account pages.
+    `mapped` datasets read them from a shared snapshot (see snapshot.py),
+    opened in `load_seconds`.
+    """
+
+    def __init__(self, version, trade_index, cube_index, account_days, fear_greed, metrics, box_stats,
+                 built_at=None, build_seconds=None, mapped=False):
+        self.version = version
+        self.trade_index = trade_index
+        self.cube_index = cube_index
+        self.merged_data = trade_index.frame
+        self.cube = cube_index.frame
+        self.account_days = account_days
+        self.fear_greed = fear_greed
+        self.metrics = metrics
+        self.box_stats = box_stats
+        self.first_day = self.merged_data['date'].min()
+        self.last_day = self.merged_data['date'].max()
+        self.built_at = pd.Timestamp.now() if built_at is None else built_at
+        self.build_seconds = build_seconds
+        self.load_seconds = None
+        self.mapped = mapped
+
+    @classmethod
+    def build(cls, version, merged_data, fear_greed, cube, profiler=None):
+        """Compute the aggregates and indexes of freshly loaded trades and cube."""
+        profiler = profiler or StageProfiler(enabled=False)
+        with profiler.stage('refresh aggregates', rows_in=len(merged_data)):
+            metrics = compute_metrics(merged_data)
+            box_stats = pnl_box_stats(merged_data)
+            account_days = daily_pnl(merged_data)
+        with profiler.stage('refresh indexes', rows_in=len(merged_data)):
+            trade_index = FrameIndex(merged_data)
+            cube_index = FrameIndex(cube)
+        return cls(version, trade_index, cube_index, account_days, fear_greed, metrics, box_stats)
+
+    def __len__(self):
+        return len(self.merged_data)
+
+
+def source_version(store, fear_greed_file=FEAR_GREED_FILE):
+    """Version of the current sources, or None while there is no trader data."""
+    if store.exists():
+        return store.version()
+    trader_path = find_trader_file()
+    if trader_path is None:
+        return None
+    return dataset_version([trader_path, fear_greed_file])
+
+
+def map_dataset(version, snapshot_dir=SNAPSHOT_DIR):
+    """The Dataset of a version from its snapshot, or None if there is none."""
+    started = time.perf_counter()
+    parts = read_snapshot(version, snapshot_dir)
+    if parts is None:
+        return None
+    dataset = Dataset(version, mapped=True, **parts)
+    dataset.load_seconds = round(time.perf_counter() - started, 3)
+    return dataset
+
+
+def build_dataset(version, store, fear_greed_file=FEAR_GREED_FILE, profiler=None,
+                  snapshot_dir=SNAPSHOT_DIR):
+    """Dataset of the current sources: mapped from its snapshot, else built (and snapshotted).
+
+    With `snapshot_dir` None the dataset is always built and kept in this
+    process's memory.
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+    if snapshot_dir is not None:
+        with profiler.stage('refresh map'):
+            dataset = map_dataset(version, snapshot_dir)
+        if dataset is not None:
+            return dataset
+
+    started = time.perf_counter()
+    with profiler.stage('refresh load') as stage:
+        if store.exists():
+            merged_data, fear_greed = store.load_trades(), load_fear_greed(fear_greed_file)
+            cube = store.load_cube()
+        else:
+            trader_path = find_trader_file()
+            merged_data, fear_greed = load_merged_data(trader_path, fear_greed_file)
+            cube = load_cube(trader_path, fear_greed_file, merged_data=merged_data)
+        stage.rows_out = len(merged_data)
+    dataset = Dataset.build(version, merged_data, fear_greed, cube, profiler)
+    dataset.build_seconds = round(time.perf_counter() - started, 2)
+    del merged_data, cube
+    if snapshot_dir is None:
+        return dataset
+
+    # Serve from the snapshot too, so this process shares its pages with the others
+    with profiler.stage('refresh snapshot', rows_in=len(dataset)):
+        if write_snapshot(dataset, snapshot_dir) is None:
+            return dataset
+        prune_snapshots(snapshot_dir=snapshot_dir)
+        return map_dataset(version, snapshot_dir) or dataset
+
+
+class DatasetRefresher:
+    """Holds the current Dataset and replaces it from a background thread."""
+
+    def __init__(self, store=None, fear_greed_file=FEAR_GREED_FILE, interval=None, profiler=None,
+                 snapshot_dir=SNAPSHOT_DIR):
+        self.store = store or TradeStore()
+        self.fear_greed_file = fear_greed_file
+        self.snapshot_dir = snapshot_dir
+        if interval is None:
+            interval = float(os.environ.get(ENV_INTERVAL, DEFAULT_INTERVAL))
+        self.interval = interval
+        self.profiler = profiler or StageProfiler(enabled=False)
+        self.current = None
+        self.building = None
+        self.last_check = None
+        self.last_error = None
+        self._pending = None
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checked = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self):
+        return None if self.current is None else self.current.version
+
+    def get(self, version):
+        """The dataset of `version`, or the current one once it has been dropped."""
+        with self._lock:
+            return self._datasets.get(version, self.current)
+
+    def wait(self, timeout=None):
+        """Wait up to `timeout` seconds for the first check; True once it has finished."""
+        return self._checked.wait(timeout)
+
+    @property
+    def checked(self):
+        """True once the first check has finished, whether or not it found data."""
+        return self._checked.is_set()
+
+    def check(self, settle=True):
+        """Build and swap in a new dataset if the sources changed; True if swapped.
+
+        With `settle`, a changed version is only built once the next check
+        sees it unchanged. The first dataset is always built right away.
+        """
+        with self._check_lock:
+            self.last_check = pd.Timestamp.now()
+            version = source_version(self.store, self.fear_greed_file)
+            if version is None or version == self.version:
+                self._pending = None
+                return False
+            if settle and self.current is not None and version != self._pending:
+                self._pending = version
+                return False
+
+            self.building = version
+            try:
+                dataset = build_dataset(version, self.store, self.fear_greed_file, self.profiler,
+                                        self.snapshot_dir)
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+                raise
+            finally:
+                self.building = None
+                self._pending = None
+
+            with self._lock:
+                self._datasets[version] = dataset
+                while len(self._datasets) > KEEP_VERSIONS:
+                    self._datasets.popitem(last=False)
+                self.current = dataset
+            self.last_error = None
+            logger.info('dataset %s: %d trades built in %.2fs', version, len(dataset),
+                        dataset.build_seconds)
+            return True
+
+    def start(self):
+        """Start polling in the background; the first check (and build) runs at once on that thread."""
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, name='dataset-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                logger.exception('dataset refresh failed; keeping version %s', self.version)
+            finally:
+                self._checked.set()
+            if self._stop.wait(self.interval):
+                return
+
+    def status(self):
+        """Version, build timing and refresh state, for display."""
+        current = self.current
+        return {
+            'version': None if current is None else current.version,
+            'trades': 0 if current is None else len(current),
+            'built_at': None if current is None else current.built_at,
+            'build_seconds': None if current is None else current.build_seconds,
+            'mapped': current is not None and current.mapped,
+            'load_seconds': None if current is None else current.load_seconds,
+            'checked': self.checked,
+            'building': self.building,
+            'last_check': self.last_check,
+            'last_error': self.last_error,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dashboard dataset and watch its sources")
+    parser.add_argument('--watch', action='store_true', help="keep polling and rebuild on change")
+    parser.add_argument('-i', '--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between source checks")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="keep the dataset in memory instead of a shared snapshot")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    refresher = DatasetRefresher(interval=args.interval,
+                                 snapshot_dir=None if args.no_snapshot else SNAPSHOT_DIR)
+    refresher.check(settle=False)
+    if refresher.current is None:
+        print("[ERROR] No trader data found")
+        return
+    status = refresher.status()
+    print(f"[OK] Dataset {status['version']}: {status['trades']:,} trades "
+          f"built in {status['build_seconds']:.2f}s")
+    if status['mapped']:
+        print(f"[OK] Memory-mapped from {snapshot_path(status['version'])} "
+              f"in {status['load_seconds'] * 1000:.0f} ms")
+    if args.watch:
+        refresher.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            refresher.stop()
+
+
+if __name__ == '__main__':
+    main()
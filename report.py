@@ -0,0 +1,286 @@
+"""
+Batch Report Runner
+===================
+Headless, parameterized version of the analysis for scheduled jobs and for
+import from other code: choose the input files, a date range, the sections
+to compute and the output formats, and nothing else is computed or drawn.
+
+Each section is a function of a ReportContext, whose shared inputs (merged
+trades, metrics, daily table, ...) are built on first use, so a report of
+only the account tables never computes the per-sentiment box statistics,
+and no figure is drawn unless one is requested. Every table is written
+flat (index reset into columns) as <section>_<table>.<format>.
+
+Usage:
+    python report.py --output reports                       # every section, JSON + CSV
+    python report.py --sections performance accounts --formats parquet --start 2025-01-01
+    python report.py --sections summary --figure png --dpi 120
+    python report.py --sections summary --figure svg --panels --figure-workers 6
+"""
+
+import argparse
+import json
+import os
+import time
+from functools import cached_property
+import pandas as pd
+from pipeline import (SENTIMENT_ORDER, FEAR_GREED_FILE, ANALYSIS_COLUMNS, SentimentLookup, find_trader_file,
+                      load_merged_data, load_fear_greed, filter_dates, size_category)
+from trade_store import STORE_DIR, TradeStore
+from metrics import compute_metrics, group_codes
+from quantiles import exact_percentile_table
+from accounts import build_account_profiles
+from rolling import daily_pnl, rolling_metrics
+from lags import DEFAULT_MAX_LAG, DEFAULT_MAX_LEAD, lag_profile
+from significance import DEFAULT_RESAMPLES, DEFAULT_PERMUTATIONS, sentiment_significance
+from charts import FIGURE_FORMATS, pnl_box_stats, save_overview, save_panels
+from instrumentation import StageProfiler, configure_logging, CLI_FLAG
+
+TABLE_FORMATS = ['json', 'csv', 'parquet']
+DEFAULT_FORMATS = ['json', 'csv']
+DEFAULT_DPI = 150
+DEFAULT_OUTPUT_DIR = 'reports'
+
+# Trade columns the sections read; 'Fee' feeds the account fee totals
+REPORT_COLUMNS = ANALYSIS_COLUMNS + ['Fee']
+
+
+class ReportContext:
+    """Report parameters plus lazily built inputs shared by the sections."""
+
+    def __init__(self, trader_file=None, fear_greed_file=FEAR_GREED_FILE, store_dir=STORE_DIR,
+                 start=None, end=None, max_lag=DEFAULT_MAX_LAG, max_lead=DEFAULT_MAX_LEAD,
+                 resamples=DEFAULT_RESAMPLES, permutations=DEFAULT_PERMUTATIONS, workers=1):
+        self.trader_file = trader_file
+        self.fear_greed_file = fear_greed_file
+        self.store = TradeStore(store_dir)
+        self.start, self.end = start, end
+        self.max_lag, self.max_lead = max_lag, max_lead
+        self.resamples, self.permutations, self.workers = resamples, permutations, workers
+
+    @cached_property
+    def merged_data(self):
+        # An explicit trader file wins; otherwise the trade store reads only the months in range
+        if self.trader_file is None and self.store.exists():
+            return self.store.load_trades(REPORT_COLUMNS, start=self.start, end=self.end)
+        merged_data, _ = load_merged_data(self.trader_file or find_trader_file(), self.fear_greed_file,
+                                          columns=REPORT_COLUMNS)
+        return filter_dates(merged_data, self.start, self.end)
+
+    @cached_property
+    def fear_greed(self):
+        return load_fear_greed(self.fear_greed_file)
+
+    @cached_property
+    def metrics(self):
+        return compute_metrics(self.merged_data)
+
+    @cached_property
+    def box_stats(self):
+        return pnl_box_stats(self.merged_data)
+
+    @cached_property
+    def daily(self):
+        return daily_pnl(self.merged_data)
+
+
+def summary_section(context):
+    overall = context.metrics.overall.to_frame('All Trades').T
+    return {'overall': overall, 'by_sentiment': context.metrics.performance_table()}
+
+
+def performance_section(context):
+    metrics = context.metrics
+    return {'by_sentiment': metrics.by_sentiment, 'by_side': metrics.by_side,
+            'by_sentiment_side': metrics.by_sentiment_side}
+
+
+def percentiles_section(context):
+    merged_data = context.merged_data
+    table = exact_percentile_table(merged_data['Closed PnL'].to_numpy(dtype='float64'),
+                                   group_codes(merged_data['classification'], SENTIMENT_ORDER),
+                                   SENTIMENT_ORDER)
+    return {'pnl': table}
+
+
+def size_section(context):
+    merged_data = context.merged_data
+    grouped = merged_data.groupby([size_category(merged_data['Size USD']), 'classification'],
+                                  observed=True)['Closed PnL']
+    table = grouped.agg(['count', 'sum', 'mean'])
+    table.index.names = ['Trade_Size_Category', 'classification']
+    return {'by_size_sentiment': table}
+
+
+def correlation_section(context):
+    columns = ['Closed PnL', 'value', 'sentiment_score', 'Size USD']
+    return {'matrix': context.merged_data[columns].corr()}
+
+
+def daily_section(context):
+    table = context.merged_data.groupby(['date', 'classification'], observed=True)['Closed PnL'].agg(
+        ['sum', 'count', 'mean'])
+    return {'performance': table.sort_values('sum', ascending=False)}
+
+
+def accounts_section(context):
+    return {'profiles': build_account_profiles(context.merged_data).table}
+
+
+def rolling_section(context):
+    return {'global': rolling_metrics(context.daily),
+            'accounts': rolling_metrics(context.daily, by_account=True)}
+
+
+def lags_section(context):
+    profile, buckets = lag_profile(context.daily, SentimentLookup(context.fear_greed),
+                                   context.max_lag, context.max_lead)
+    return {'profile': profile, 'buckets': buckets}
+
+
+def significance_section(context):
+    intervals, tests = sentiment_significance(context.merged_data, context.resamples,
+                                              context.permutations, workers=context.workers)
+    return {'intervals': intervals, 'tests': tests}
+
+
+SECTIONS = {
+    'summary': summary_section,
+    'performance': performance_section,
+    'percentiles': percentiles_section,
+    'size': size_section,
+    'correlation': correlation_section,
+    'daily': daily_section,
+    'accounts': accounts_section,
+    'rolling': rolling_section,
+    'lags': lags_section,
+    'significance': significance_section,
+}
+
+
+def flat_table(table):
+    """Table with its index as ordinary columns and string column names."""
+    if not isinstance(table.index, pd.RangeIndex) or table.index.name is not None:
+        table = table.reset_index()
+    else:
+        table = table.copy(deep=False)
+    table.columns = [str(column) for column in table.columns]
+    return table
+
+
+def write_table(table, path_stem, formats):
+    """Write one table in each of `formats`; returns the paths written."""
+    table = flat_table(table)
+    paths = []
+    for fmt in formats:
+        path = f'{path_stem}.{fmt}'
+        if fmt == 'csv':
+            table.to_csv(path, index=False)
+        elif fmt == 'parquet':
+            table.to_parquet(path, index=False)
+        else:
+            table.to_json(path, orient='records', date_format='iso', indent=1)
+        paths.append(path)
+    return paths
+
+
+def run_report(sections=None, formats=DEFAULT_FORMATS, output_dir=DEFAULT_OUTPUT_DIR, figure=None,
+               dpi=DEFAULT_DPI, context=None, profiler=None, panels=False, figure_workers=1,
+               **options):
+    """Compute the requested sections and write them; returns {section: {table: DataFrame}}.
+
+    `sections` defaults to all of SECTIONS; `formats` may be empty to only
+    return the tables. `figure` is None or one of FIGURE_FORMATS; `panels`
+    writes each panel to its own file, and `figure_workers` renders panels
+    in that many processes. Other keyword arguments are passed to
+    ReportContext.
+    """
+    context = context or ReportContext(**options)
+    profiler = profiler or StageProfiler(enabled=False)
+    sections = list(SECTIONS) if sections is None else list(sections)
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown sections {unknown}; expected some of {list(SECTIONS)}")
+    if formats or figure:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results, written = {}, []
+    for name in sections:
+        with profiler.stage(f'report {name}') as stage:
+            results[name] = SECTIONS[name](context)
+            stage.rows_out = sum(len(table) for table in results[name].values())
+        for table_name, table in results[name].items():
+            written += write_table(table, os.path.join(output_dir, f'{name}_{table_name}'), formats)
+
+    if figure:
+        with profiler.stage('report figure'):
+            if panels:
+                written += save_panels(output_dir, context.metrics, context.box_stats, figure,
+                                       dpi=dpi, workers=figure_workers)
+            else:
+                path = os.path.join(output_dir, f'sentiment_trader_analysis.{figure}')
+                save_overview(path, context.metrics, context.box_stats, dpi=dpi,
+                              workers=figure_workers)
+                written.append(path)
+
+    if formats or figure:
+        manifest = {
+            'generated': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'start': context.start, 'end': context.end,
+            'trades': int(len(context.merged_data)),
+            'sections': sections, 'files': written,
+        }
+        with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless sentiment vs trader performance report")
+    parser.add_argument('--trader-file', help="trader CSV (default: the trade store, else the "
+                                              "first of the usual trader files)")
+    parser.add_argument('--fear-greed', default=FEAR_GREED_FILE)
+    parser.add_argument('--store', default=STORE_DIR, help="trade store directory")
+    parser.add_argument('--start', help="first trade day (YYYY-MM-DD)")
+    parser.add_argument('--end', help="last trade day (YYYY-MM-DD)")
+    parser.add_argument('--sections', nargs='+', choices=list(SECTIONS), default=list(SECTIONS))
+    parser.add_argument('--formats', nargs='*', choices=TABLE_FORMATS, default=DEFAULT_FORMATS,
+                        help="table formats (none: compute only)")
+    parser.add_argument('--figure', choices=FIGURE_FORMATS,
+                        help="also draw the overview figure in this format")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI, help="figure resolution")
+    parser.add_argument('--panels', action='store_true',
+                        help="write each figure panel to its own file")
+    parser.add_argument('--figure-workers', type=int, default=1,
+                        help="worker processes rendering the figure panels")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="output directory")
+    parser.add_argument('--max-lag', type=int, default=DEFAULT_MAX_LAG)
+    parser.add_argument('--max-lead', type=int, default=DEFAULT_MAX_LEAD)
+    parser.add_argument('--resamples', type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument('--permutations', type=int, default=DEFAULT_PERMUTATIONS)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for the significance resampling")
+    parser.add_argument(CLI_FLAG, action='store_true', help="log per-section timing and memory")
+    args = parser.parse_args()
+
+    profiler = StageProfiler()
+    if profiler.enabled:
+        configure_logging()
+    context = ReportContext(args.trader_file, args.fear_greed, args.store, args.start, args.end,
+                            args.max_lag, args.max_lead, args.resamples, args.permutations,
+                            args.workers)
+    started = time.perf_counter()
+    results = run_report(args.sections, args.formats, args.output, args.figure, args.dpi,
+                         context=context, profiler=profiler, panels=args.panels,
+                         figure_workers=args.figure_workers)
+    tables = sum(len(tables) for tables in results.values())
+    print(f"[OK] {len(results)} sections, {tables} tables from {len(context.merged_data):,} trades "
+          f"in {time.perf_counter() - started:.1f}s")
+    if args.formats or args.figure:
+        print(f"[OK] Written to {args.output}/ (see manifest.json)")
+    if profiler.enabled:
+        print(profiler.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Rolling-Window Metrics
+======================
+Trailing 7/30/90-day performance, globally and per account: win rate, PnL
+mean and standard deviation, a Sharpe-like ratio of daily PnL, and the
+correlation between the Fear/Greed `value` and daily PnL.
+
+Trades are first reduced to one row per account and day (count, PnL sum,
+PnL sum of squares, wins). The dashboard builds that table once per dataset
+version and reuses it for every date range. Every window metric is
+derived from sums over those rows, and each window sum is a running total
+minus the running total where the window starts, so a whole series costs
+one pass per window however long the window is.
+
+Windows are calendar days ending on (and including) each row's day. The
+global series has a row for every day from the first to the last trading
+day; per-account series have a row for each day the account traded.
+
+Usage:
+    python rolling.py            # latest global windows for the cached dataset
+"""
+
+import numpy as np
+import pandas as pd
+from pipeline import find_trader_file, load_merged_data
+
+WINDOWS = [7, 30, 90]
+
+DAILY_MEASURES = ['count', 'pnl_sum', 'pnl_sumsq', 'wins']
+
+# Trading days per year used to annualize the Sharpe-like ratio (crypto never closes)
+PERIODS_PER_YEAR = 365
+
+# Windows with fewer active days get no Sharpe-like ratio or correlation
+MIN_DAYS = 3
+
+ROLLING_COLUMNS = ['trades', 'days', 'total_pnl', 'win_rate', 'avg_pnl', 'std_pnl',
+                   'sharpe', 'value_pnl_corr']
+
+
+def daily_pnl(frame):
+    """Per account and day: trade count, PnL sum, PnL sum of squares and wins.
+
+    `frame` is either merged trades or an earlier daily_pnl() table, which
+    is summed again. `value` depends only on the date, so it is kept as a
+    grouping key.
+    """
+    if 'pnl_sum' not in frame.columns:
+        pnl = frame['Closed PnL'].astype('float64')
+        frame = pd.DataFrame({
+            'Account': frame['Account'],
+            'date': frame['date'],
+            'value': frame['value'],
+            'count': np.ones(len(frame), dtype='int64'),
+            'pnl_sum': pnl,
+            'pnl_sumsq': pnl * pnl,
+            'wins': (pnl > 0).astype('int64'),
+        })
+    daily = frame.groupby(['Account', 'date', 'value'], observed=True)[DAILY_MEASURES].sum()
+    return daily[daily['count'] > 0].reset_index()
+
+
+def window_sums(keys, values, window):
+    """Sum of `values` rows over the trailing `window` days ending at each row.
+
+    `keys` are sorted day numbers; offsetting each group's days keeps
+    windows from crossing groups.
+    """
+    totals = np.zeros((len(keys) + 1, values.shape[1]))
+    np.cumsum(values, axis=0, out=totals[1:])
+    start = np.searchsorted(keys, keys - (window - 1), side='left')
+    return totals[1:] - totals[start]
+
+
+def _window_metrics(sums):
+    """ROLLING_COLUMNS from the summed columns built in rolling_metrics()."""
+    (count, pnl, pnl_sq, wins, days, day_pnl_sq,
+     value, value_sq, value_pnl) = sums.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_pnl = pnl / count
+        variance = (pnl_sq - count * avg_pnl ** 2) / (count - 1)
+        day_mean = pnl / days
+        day_var = (day_pnl_sq - days * day_mean ** 2) / (days - 1)
+        day_std = np.sqrt(np.clip(day_var, 0, None))
+        sharpe = day_mean / day_std * np.sqrt(PERIODS_PER_YEAR)
+
+        cov = days * value_pnl - value * pnl
+        var = (days * value_sq - value * value) * (days * day_pnl_sq - pnl * pnl)
+        corr = cov / np.sqrt(np.where(var > 0, var, np.nan))
+
+    enough = days >= MIN_DAYS
+    return {
+        'trades': np.rint(count).astype('int64'),
+        'days': np.rint(days).astype('int64'),
+        'total_pnl': pnl,
+        'win_rate': np.where(count > 0, wins / np.maximum(count, 1) * 100, np.nan),
+        'avg_pnl': avg_pnl,
+        'std_pnl': np.where(count > 1, np.sqrt(np.clip(variance, 0, None)), np.nan),
+        'sharpe': np.where(enough & (day_std > 0), sharpe, np.nan),
+        'value_pnl_corr': np.where(enough, np.clip(corr, -1, 1), np.nan),
+    }
+
+
+def rolling_metrics(daily, windows=WINDOWS, by_account=False):
+    """Trailing-window metrics from daily_pnl() output, one row per day and window.
+
+    Returns a long frame with `date`, `window` (days), ROLLING_COLUMNS and,
+    when `by_account`, `Account`.
+    """
+    if daily.empty:
+        columns = (['Account'] if by_account else []) + ['date', 'window'] + ROLLING_COLUMNS
+        return pd.DataFrame(columns=columns)
+    day = daily['date'].to_numpy(dtype='datetime64[D]').astype('int64')
+    measures = daily[DAILY_MEASURES].to_numpy(dtype='float64')
+    value = daily['value'].to_numpy(dtype='float64')
+
+    if by_account:
+        accounts = daily['Account'].astype('category')
+        group = accounts.cat.codes.to_numpy().astype('int64')
+        order = np.lexsort((day, group))
+        group, day, measures, value = group[order], day[order], measures[order], value[order]
+        # Stride each account's days apart so no window reaches into the previous account
+        keys = group * (day.max() - day.min() + max(windows) + 1) + (day - day.min())
+    else:
+        # Dense calendar: days without trades add nothing but still move the window
+        first = day.min()
+        slot = day - first
+        size = int(slot.max()) + 1
+        measures = np.column_stack([np.bincount(slot, weights=measures[:, i], minlength=size)
+                                    for i in range(len(DAILY_MEASURES))])
+        value = np.bincount(slot, weights=value, minlength=size) / np.maximum(
+            np.bincount(slot, minlength=size), 1)
+        day = first + np.arange(size)
+        keys = day
+
+    active = (measures[:, 0] > 0).astype('float64')
+    pnl = measures[:, 1]
+    # Per-day sums: trade-level measures, then the daily-PnL and value moments
+    columns = np.column_stack([measures, active, pnl * pnl, value * active,
+                               value * value * active, value * pnl])
+
+    frames = []
+    for window in windows:
+        table = pd.DataFrame(_window_metrics(window_sums(keys, columns, window)))
+        table.insert(0, 'window', window)
+        table.insert(0, 'date', day.astype('datetime64[D]').astype('datetime64[ns]'))
+        if by_account:
+            table.insert(0, 'Account', pd.Categorical.from_codes(group, accounts.cat.categories))
+        frames.append(table)
+    return pd.concat(frames, ignore_index=True)
+
+
+def pivot_windows(rolling, metric, account=None):
+    """One metric as a date x window table (columns '7d', '30d', ...)."""
+    if account is not None:
+        rolling = rolling[rolling['Account'] == account]
+    table = rolling.pivot(index='date', columns='window', values=metric)
+    table.columns = [f'{window}d' for window in table.columns]
+    return table
+
+
+def latest(rolling, window):
+    """Each series' last row for one window (per account when present)."""
+    rows = rolling[rolling['window'] == window]
+    if 'Account' in rows.columns:
+        return rows.groupby('Account', observed=True).tail(1).set_index('Account')
+    return rows.iloc[-1]
+
+
+if __name__ == '__main__':
+    merged_data, _ = load_merged_data(find_trader_file())
+    rolling = rolling_metrics(daily_pnl(merged_data))
+    for window in WINDOWS:
+        row = latest(rolling, window)
+        print(f"[OK] {window:3d}-day window to {row['date'].date()}: {row['trades']:,} trades, "
+              f"win rate {row['win_rate']:.2f}%, avg PnL ${row['avg_pnl']:.2f}, "
+              f"Sharpe-like {row['sharpe']:.2f}, value/PnL corr {row['value_pnl_corr']:.4f}")
@@ -5,18 +5,62 @@ This script analyzes the relationship between Bitcoin Fear/Greed Index
 and Hyperliquid trader performance to uncover trading insights.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
 import warnings
+from pipeline import (FEAR_GREED_FILE, ANALYSIS_COLUMNS, load_fear_greed, load_merged_data, size_category, filter_dates,
+                      bytes_per_trade, SentimentLookup, SENTIMENT_ORDER)
+from metrics import compute_metrics, group_codes
+from quantiles import exact_percentile_table
+from trade_store import TradeStore
+from rolling import WINDOWS, daily_pnl, rolling_metrics, latest
+from accounts import build_account_profiles
+from lags import DEFAULT_MAX_LAG, DEFAULT_MAX_LEAD, lag_profile, bucket_table
+from significance import (DEFAULT_RESAMPLES, DEFAULT_PERMUTATIONS, DEFAULT_CONFIDENCE, DEFAULT_ALPHA,
+                          sentiment_significance, permutation_tests, compare)
+from instrumentation import StageProfiler, configure_logging, CLI_FLAG
+from charts import FIGURE_FORMATS, pnl_box_stats, save_overview, save_panels
 warnings.filterwarnings('ignore')
 
 # Set style for better visualizations
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (14, 8)
 
+TRADER_FILE = 'historical_data.csv'
+
+parser = argparse.ArgumentParser(description='Bitcoin market sentiment vs trader performance analysis')
+parser.add_argument('--start', help='first trade day to analyze (YYYY-MM-DD)')
+parser.add_argument('--end', help='last trade day to analyze (YYYY-MM-DD)')
+parser.add_argument('--max-lag', type=int, default=DEFAULT_MAX_LAG,
+                    help='largest sentiment lag in days for Step 7.7')
+parser.add_argument('--max-lead', type=int, default=DEFAULT_MAX_LEAD,
+                    help='largest sentiment lead in days for Step 7.7')
+parser.add_argument('--resamples', type=int, default=DEFAULT_RESAMPLES,
+                    help='bootstrap resamples per sentiment for Step 8')
+parser.add_argument('--permutations', type=int, default=DEFAULT_PERMUTATIONS,
+                    help='permutations per pairwise test for Step 8')
+parser.add_argument('--workers', type=int, default=1,
+                    help='worker processes for the Step 8 resampling')
+parser.add_argument('--figure-format', default='png', choices=FIGURE_FORMATS,
+                    help='format of the Step 6 figure (svg/pdf cost the same at any DPI)')
+parser.add_argument('--figure-workers', type=int, default=1,
+                    help='worker processes rendering the Step 6 panels')
+parser.add_argument('--separate-panels', action='store_true',
+                    help='write each Step 6 panel to its own file instead of one figure')
+parser.add_argument(CLI_FLAG, action='store_true',
+                    help='record per-step timing and memory (also PIPELINE_PROFILE=1)')
+parser.add_argument('--profile-output', help='write the per-step records to this JSON file')
+args = parser.parse_args()
+
+# Per-step wall/CPU time, rows and memory, logged as JSON lines to stderr
+profiler = StageProfiler()
+if profiler.enabled:
+    configure_logging()
+
 print("=" * 80)
 print("BITCOIN MARKET SENTIMENT vs TRADER PERFORMANCE ANALYSIS")
 print("=" * 80)
@@ -28,90 +72,90 @@ print()
 print("Step 1: Loading datasets...")
 print("-" * 80)
 
-# Load Fear/Greed Index
-fear_greed = pd.read_csv('fear_greed_index.csv')
-print(f"[OK] Fear/Greed Index: {len(fear_greed):,} records")
-print(f"  Date range: {fear_greed['date'].min()} to {fear_greed['date'].max()}")
-
-# Load Historical Trader Data
-print("\nLoading historical trader data (this may take a moment)...")
-trader_data = pd.read_csv('historical_data.csv')
-print(f"[OK] Historical Trader Data: {len(trader_data):,} records")
-
-# Display basic info
-print(f"\nTrader Data Columns: {list(trader_data.columns)}")
-print(f"\nFirst few trader records:")
-print(trader_data.head())
-
-# ============================================================================
-# 2. DATA CLEANING AND PREPARATION
-# ============================================================================
-print("\n" + "=" * 80)
-print("Step 2: Data Cleaning and Preparation")
-print("-" * 80)
-
-# Clean Fear/Greed data
-fear_greed['date'] = pd.to_datetime(fear_greed['date'])
-fear_greed = fear_greed.sort_values('date')
-
-# Create sentiment score mapping (0-100 scale, but we'll use value column)
-# Classification mapping for easier analysis
-sentiment_map = {
-    'Extreme Fear': 1,
-    'Fear': 2,
-    'Neutral': 3,
-    'Greed': 4,
-    'Extreme Greed': 5
-}
-fear_greed['sentiment_score'] = fear_greed['classification'].map(sentiment_map)
-
-# Clean Trader Data
-print("\nCleaning trader data...")
-
-# Convert timestamp to datetime
-# The timestamp appears to be in IST format "DD-MM-YYYY HH:MM"
-trader_data['Timestamp IST'] = pd.to_datetime(trader_data['Timestamp IST'], 
-                                               format='%d-%m-%Y %H:%M', 
-                                               errors='coerce')
-
-# Extract date for merging
-trader_data['date'] = trader_data['Timestamp IST'].dt.date
-trader_data['date'] = pd.to_datetime(trader_data['date'])
-
-# Clean numeric columns
-numeric_cols = ['Execution Price', 'Size USD', 'Closed PnL', 'Fee']
-for col in numeric_cols:
-    if col in trader_data.columns:
-        trader_data[col] = pd.to_numeric(trader_data[col], errors='coerce')
-
-# Filter out invalid data
-trader_data = trader_data.dropna(subset=['date', 'Closed PnL'])
-trader_data = trader_data[trader_data['Closed PnL'] != 0]  # Focus on closed positions
-
-print(f"[OK] Cleaned trader data: {len(trader_data):,} records with valid PnL")
-print(f"  Date range: {trader_data['date'].min()} to {trader_data['date'].max()}")
-
-# ============================================================================
-# 3. MERGE DATASETS
-# ============================================================================
-print("\n" + "=" * 80)
-print("Step 3: Merging Datasets")
-print("-" * 80)
-
-# Merge trader data with sentiment data
-merged_data = trader_data.merge(
-    fear_greed[['date', 'value', 'classification', 'sentiment_score']],
-    on='date',
-    how='left'
-)
-
-print(f"[OK] Merged dataset: {len(merged_data):,} records")
-print(f"  Records with sentiment data: {merged_data['classification'].notna().sum():,}")
-print(f"  Records without sentiment data: {merged_data['classification'].isna().sum():,}")
-
-# Filter to only records with sentiment data
-merged_data = merged_data.dropna(subset=['classification'])
-print(f"[OK] Final dataset for analysis: {len(merged_data):,} records")
+# Rows produced by each load_merged_data() step
+step_rows = {}
+
+
+def report_progress(step, frame):
+    """Print the outcome of a load_merged_data() step and the banner of the next one."""
+    step_rows[step] = len(frame)
+    if step == 'cached':
+        print(f"\n[OK] Loaded cleaned, merged dataset from cache: {len(frame):,} records")
+        print("  Steps 2-3 skipped: source files unchanged since the last run")
+    elif step == 'loaded':
+        print(f"[OK] Historical Trader Data: {len(frame):,} records")
+
+        # Display basic info
+        print(f"\nTrader Data Columns: {list(frame.columns)}")
+        print(f"\nFirst few trader records:")
+        print(frame.head())
+
+        # ====================================================================
+        # 2. DATA CLEANING AND PREPARATION
+        # ====================================================================
+        print("\n" + "=" * 80)
+        print("Step 2: Data Cleaning and Preparation")
+        print("-" * 80)
+        # Clean Trader Data: parse timestamps (epoch column or "DD-MM-YYYY HH:MM")
+        # and numeric columns, keeping only closed positions
+        print("\nCleaning trader data...")
+    elif step == 'cleaned':
+        timestamps = frame.attrs['timestamps']
+        print(f"[OK] Parsed timestamps from the {timestamps['source']} column: "
+              f"{timestamps['failed']:,} rows failed to parse")
+        print(f"[OK] Cleaned trader data: {len(frame):,} records with valid PnL")
+        print(f"  Date range: {frame['date'].min()} to {frame['date'].max()}")
+
+        # ====================================================================
+        # 3. MERGE DATASETS
+        # ====================================================================
+        print("\n" + "=" * 80)
+        print("Step 3: Merging Datasets")
+        print("-" * 80)
+    elif step == 'merged':
+        # Only records with sentiment are kept; the cleaned, merged dataset is
+        # cached for the next run
+        print(f"[OK] Merged dataset: {step_rows['cleaned']:,} records")
+        print(f"  Records with sentiment data: {len(frame):,}")
+        print(f"  Records without sentiment data: {step_rows['cleaned'] - len(frame):,}")
+        print(f"[OK] Final dataset for analysis: {len(frame):,} records")
+
+
+with profiler.stage('Steps 1-3: Load, clean and merge') as stage:
+    # Prefer trades ingested incrementally into the trade store (trade_store.py);
+    # otherwise load_merged_data() reuses the cleaned, merged dataset when
+    # neither source file has changed
+    store = TradeStore()
+    if store.exists():
+        fear_greed = load_fear_greed(FEAR_GREED_FILE)
+        # Only the year/month partitions overlapping the date range are read
+        merged_data = store.load_trades(ANALYSIS_COLUMNS, start=args.start, end=args.end)
+        manifest = store.manifest()
+        print(f"[OK] Loaded trade store '{store.path}': {len(merged_data):,} records "
+              f"from {len(manifest['batches'])} ingested batches")
+        if args.start or args.end:
+            print(f"  Date range: {args.start or 'the start'} to {args.end or 'the end'}")
+        print("  Steps 2-3 skipped: trades were cleaned and merged at ingest time")
+    else:
+        print("Loading historical trader data (this may take a moment)...")
+        merged_data, fear_greed = load_merged_data(TRADER_FILE, FEAR_GREED_FILE, columns=ANALYSIS_COLUMNS,
+                                                   profiler=profiler, progress=report_progress)
+    stage.rows_out = len(merged_data)
+
+print(f"\n[OK] Fear/Greed Index: {len(fear_greed):,} records")
+print(f"  Date range: {fear_greed['date'].min().date()} to {fear_greed['date'].max().date()}")
+
+if (args.start or args.end) and not store.exists():
+    with profiler.stage('Date range filter', rows_in=len(merged_data)) as stage:
+        merged_data = filter_dates(merged_data, args.start, args.end)
+        stage.rows_out = len(merged_data)
+    print(f"\n[OK] Restricted to trades from {args.start or 'the start'} to {args.end or 'the end'}: "
+          f"{len(merged_data):,} records")
+    print("  Tip: ingest the data with trade_store.py to read only the months in range")
+
+# Compact schema: categorical accounts/sides/sentiments, small ints, float32 prices and fees
+print(f"\n[OK] In-memory dataset: {merged_data.memory_usage(deep=True).sum() / 1e6:.1f} MB "
+      f"({bytes_per_trade(merged_data):.0f} bytes per trade)")
 
 # ============================================================================
 # 4. EXPLORATORY DATA ANALYSIS
@@ -120,21 +164,26 @@ print("\n" + "=" * 80)
 print("Step 4: Exploratory Data Analysis")
 print("-" * 80)
 
-# Basic statistics
-print("\n4.1 Basic Statistics:")
-print(f"  Total trades: {len(merged_data):,}")
-print(f"  Total PnL: ${merged_data['Closed PnL'].sum():,.2f}")
-print(f"  Average PnL per trade: ${merged_data['Closed PnL'].mean():,.2f}")
-print(f"  Median PnL per trade: ${merged_data['Closed PnL'].median():,.2f}")
-print(f"  Winning trades: {(merged_data['Closed PnL'] > 0).sum():,} ({(merged_data['Closed PnL'] > 0).sum() / len(merged_data) * 100:.2f}%)")
-print(f"  Losing trades: {(merged_data['Closed PnL'] < 0).sum():,} ({(merged_data['Closed PnL'] < 0).sum() / len(merged_data) * 100:.2f}%)")
-
-# Sentiment distribution
-print("\n4.2 Sentiment Distribution:")
-sentiment_counts = merged_data['classification'].value_counts()
-for sentiment, count in sentiment_counts.items():
-    pct = count / len(merged_data) * 100
-    print(f"  {sentiment:20s}: {count:6,} trades ({pct:5.2f}%)")
+with profiler.stage('Step 4: Exploratory analysis', rows_in=len(merged_data)):
+    # All per-sentiment and per-side metrics in one pass, reused by Steps 4-8
+    metrics = compute_metrics(merged_data)
+    overall = metrics.overall
+
+    # Basic statistics
+    print("\n4.1 Basic Statistics:")
+    print(f"  Total trades: {len(merged_data):,}")
+    print(f"  Total PnL: ${overall['Total_PnL']:,.2f}")
+    print(f"  Average PnL per trade: ${overall['Avg_PnL']:,.2f}")
+    print(f"  Median PnL per trade: ${overall['Median_PnL']:,.2f}")
+    print(f"  Winning trades: {overall['Wins']:,.0f} ({overall['Wins'] / len(merged_data) * 100:.2f}%)")
+    print(f"  Losing trades: {overall['Losses']:,.0f} ({overall['Losses'] / len(merged_data) * 100:.2f}%)")
+
+    # Sentiment distribution
+    print("\n4.2 Sentiment Distribution:")
+    sentiment_counts = metrics.sentiment_counts()
+    for sentiment, count in sentiment_counts.items():
+        pct = count / len(merged_data) * 100
+        print(f"  {sentiment:20s}: {count:6,} trades ({pct:5.2f}%)")
 
 # ============================================================================
 # 5. PERFORMANCE BY SENTIMENT
@@ -143,28 +192,26 @@ print("\n" + "=" * 80)
 print("Step 5: Performance Analysis by Market Sentiment")
 print("-" * 80)
 
-# Calculate performance metrics by sentiment
-performance_by_sentiment = merged_data.groupby('classification').agg({
-    'Closed PnL': ['count', 'sum', 'mean', 'median', 'std'],
-    'Size USD': 'mean'
-}).round(2)
+with profiler.stage('Step 5: Performance by sentiment', rows_in=len(merged_data)):
+    # Performance metrics by sentiment, in sentiment order
+    performance_by_sentiment = metrics.performance_table()
 
-performance_by_sentiment.columns = ['Trade_Count', 'Total_PnL', 'Avg_PnL', 'Median_PnL', 'Std_PnL', 'Avg_Trade_Size']
-# Sort by sentiment order
-sentiment_order = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
-performance_by_sentiment = performance_by_sentiment.reindex(sentiment_order)
+    print("\n5.1 Performance Metrics by Sentiment:")
+    print(performance_by_sentiment)
 
-print("\n5.1 Performance Metrics by Sentiment:")
-print(performance_by_sentiment)
+    # Win rate by sentiment
+    win_rate_by_sentiment = metrics.observed()['Win_Rate'].round(2)
 
-# Win rate by sentiment
-win_rate_by_sentiment = merged_data.groupby('classification').apply(
-    lambda x: (x['Closed PnL'] > 0).sum() / len(x) * 100
-).round(2)
+    print("\n5.2 Win Rate by Sentiment:")
+    for sentiment, win_rate in win_rate_by_sentiment.items():
+        print(f"  {sentiment:20s}: {win_rate:5.2f}%")
 
-print("\n5.2 Win Rate by Sentiment:")
-for sentiment, win_rate in win_rate_by_sentiment.items():
-    print(f"  {sentiment:20s}: {win_rate:5.2f}%")
+    # PnL percentiles, selected exactly per sentiment
+    print("\n5.3 PnL Percentiles by Sentiment:")
+    percentiles = exact_percentile_table(merged_data['Closed PnL'].to_numpy(dtype='float64'),
+                                         group_codes(merged_data['classification'], SENTIMENT_ORDER),
+                                         SENTIMENT_ORDER)
+    print(percentiles.round(2))
 
 # ============================================================================
 # 6. VISUALIZATIONS
@@ -173,105 +220,21 @@ print("\n" + "=" * 80)
 print("Step 6: Creating Visualizations")
 print("-" * 80)
 
-# Create figure with subplots
-fig = plt.figure(figsize=(20, 12))
-
-# 6.1 PnL Distribution by Sentiment
-ax1 = plt.subplot(2, 3, 1)
-sentiment_order = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
-sns.boxplot(data=merged_data, x='classification', y='Closed PnL', order=sentiment_order, ax=ax1)
-ax1.set_title('PnL Distribution by Market Sentiment', fontsize=14, fontweight='bold')
-ax1.set_xlabel('Market Sentiment', fontsize=12)
-ax1.set_ylabel('Closed PnL (USD)', fontsize=12)
-ax1.tick_params(axis='x', rotation=45)
-ax1.axhline(y=0, color='r', linestyle='--', alpha=0.5)
-
-# 6.2 Average PnL by Sentiment
-ax2 = plt.subplot(2, 3, 2)
-avg_pnl = merged_data.groupby('classification')['Closed PnL'].mean().reindex(sentiment_order)
-colors = ['#8B0000', '#FF4500', '#FFD700', '#32CD32', '#006400']
-bars = ax2.bar(range(len(avg_pnl)), avg_pnl.values, color=colors)
-ax2.set_xticks(range(len(avg_pnl)))
-ax2.set_xticklabels(avg_pnl.index, rotation=45, ha='right')
-ax2.set_title('Average PnL by Market Sentiment', fontsize=14, fontweight='bold')
-ax2.set_ylabel('Average PnL (USD)', fontsize=12)
-ax2.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-# Add value labels on bars
-for i, (bar, val) in enumerate(zip(bars, avg_pnl.values)):
-    height = bar.get_height()
-    ax2.text(bar.get_x() + bar.get_width()/2., height,
-             f'${val:.2f}',
-             ha='center', va='bottom' if height >= 0 else 'top', fontsize=10)
-
-# 6.3 Win Rate by Sentiment
-ax3 = plt.subplot(2, 3, 3)
-win_rates = merged_data.groupby('classification').apply(
-    lambda x: (x['Closed PnL'] > 0).sum() / len(x) * 100
-).reindex(sentiment_order)
-bars = ax3.bar(range(len(win_rates)), win_rates.values, color=colors)
-ax3.set_xticks(range(len(win_rates)))
-ax3.set_xticklabels(win_rates.index, rotation=45, ha='right')
-ax3.set_title('Win Rate by Market Sentiment', fontsize=14, fontweight='bold')
-ax3.set_ylabel('Win Rate (%)', fontsize=12)
-ax3.set_ylim([0, 100])
-# Add value labels
-for bar, val in zip(bars, win_rates.values):
-    height = bar.get_height()
-    ax3.text(bar.get_x() + bar.get_width()/2., height,
-             f'{val:.1f}%',
-             ha='center', va='bottom', fontsize=10)
-
-# 6.4 Trade Volume by Sentiment
-ax4 = plt.subplot(2, 3, 4)
-trade_counts = merged_data.groupby('classification').size().reindex(sentiment_order)
-bars = ax4.bar(range(len(trade_counts)), trade_counts.values, color=colors)
-ax4.set_xticks(range(len(trade_counts)))
-ax4.set_xticklabels(trade_counts.index, rotation=45, ha='right')
-ax4.set_title('Number of Trades by Market Sentiment', fontsize=14, fontweight='bold')
-ax4.set_ylabel('Number of Trades', fontsize=12)
-# Add value labels
-for bar, val in zip(bars, trade_counts.values):
-    height = bar.get_height()
-    ax4.text(bar.get_x() + bar.get_width()/2., height,
-             f'{int(val):,}',
-             ha='center', va='bottom', fontsize=10)
-
-# 6.5 Total PnL by Sentiment
-ax5 = plt.subplot(2, 3, 5)
-total_pnl = merged_data.groupby('classification')['Closed PnL'].sum().reindex(sentiment_order)
-bars = ax5.bar(range(len(total_pnl)), total_pnl.values, color=colors)
-ax5.set_xticks(range(len(total_pnl)))
-ax5.set_xticklabels(total_pnl.index, rotation=45, ha='right')
-ax5.set_title('Total PnL by Market Sentiment', fontsize=14, fontweight='bold')
-ax5.set_ylabel('Total PnL (USD)', fontsize=12)
-ax5.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-# Add value labels
-for bar, val in zip(bars, total_pnl.values):
-    height = bar.get_height()
-    ax5.text(bar.get_x() + bar.get_width()/2., height,
-             f'${val:,.0f}',
-             ha='center', va='bottom' if height >= 0 else 'top', fontsize=10)
-
-# 6.6 Buy vs Sell Performance by Sentiment
-ax6 = plt.subplot(2, 3, 6)
-buy_sell_pnl = merged_data.groupby(['classification', 'Side'])['Closed PnL'].mean().unstack()
-buy_sell_pnl = buy_sell_pnl.reindex(sentiment_order)
-x = np.arange(len(sentiment_order))
-width = 0.35
-if 'BUY' in buy_sell_pnl.columns:
-    ax6.bar(x - width/2, buy_sell_pnl['BUY'].values, width, label='BUY', color='#32CD32', alpha=0.8)
-if 'SELL' in buy_sell_pnl.columns:
-    ax6.bar(x + width/2, buy_sell_pnl['SELL'].values, width, label='SELL', color='#FF4500', alpha=0.8)
-ax6.set_xticks(x)
-ax6.set_xticklabels(sentiment_order, rotation=45, ha='right')
-ax6.set_title('Average PnL: BUY vs SELL by Sentiment', fontsize=14, fontweight='bold')
-ax6.set_ylabel('Average PnL (USD)', fontsize=12)
-ax6.legend()
-ax6.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
-
-plt.tight_layout()
-plt.savefig('sentiment_trader_analysis.png', dpi=300, bbox_inches='tight')
-print("[OK] Saved visualization: sentiment_trader_analysis.png")
+with profiler.stage('Step 6: Visualizations', rows_in=len(merged_data)):
+    # Six panels (see charts.overview_panels): PnL boxplot from per-sentiment
+    # quantiles, average PnL, win rate, trade volume, total PnL and BUY vs SELL
+    avg_pnl = metrics.avg_pnl
+    win_rates = metrics.win_rate
+    box_stats = pnl_box_stats(merged_data)
+    if args.separate_panels:
+        figure_paths = save_panels('.', metrics, box_stats, args.figure_format, dpi=300,
+                                   workers=args.figure_workers)
+        for path in figure_paths:
+            print(f"[OK] Saved panel: {path}")
+    else:
+        figure_paths = [f'sentiment_trader_analysis.{args.figure_format}']
+        save_overview(figure_paths[0], metrics, box_stats, dpi=300, workers=args.figure_workers)
+        print(f"[OK] Saved visualization: {figure_paths[0]}")
 
 # ============================================================================
 # 7. ADVANCED ANALYSIS
@@ -280,40 +243,78 @@ print("\n" + "=" * 80)
 print("Step 7: Advanced Analysis")
 print("-" * 80)
 
-# 7.1 Correlation Analysis
-print("\n7.1 Correlation Analysis:")
-correlation = merged_data[['Closed PnL', 'value', 'sentiment_score', 'Size USD']].corr()
-print("\nCorrelation Matrix:")
-print(correlation[['Closed PnL']].sort_values('Closed PnL', ascending=False))
-
-# 7.2 Performance by Trade Size and Sentiment
-print("\n7.2 Performance by Trade Size Categories:")
-merged_data['Trade_Size_Category'] = pd.cut(
-    merged_data['Size USD'],
-    bins=[0, 100, 500, 1000, 5000, float('inf')],
-    labels=['< $100', '$100-$500', '$500-$1K', '$1K-$5K', '> $5K']
-)
-
-size_sentiment_perf = merged_data.groupby(['Trade_Size_Category', 'classification'])['Closed PnL'].mean().unstack()
-print(size_sentiment_perf.round(2))
-
-# 7.3 Best and Worst Performing Sentiment Periods
-print("\n7.3 Top 10 Best Performing Days (by Total PnL):")
-daily_perf = merged_data.groupby(['date', 'classification'])['Closed PnL'].agg(['sum', 'count', 'mean']).reset_index()
-daily_perf = daily_perf.sort_values('sum', ascending=False)
-print(daily_perf.head(10).to_string(index=False))
-
-print("\n7.4 Top 10 Worst Performing Days (by Total PnL):")
-print(daily_perf.tail(10).to_string(index=False))
-
-# 7.4 Account-level Analysis
-print("\n7.5 Top 10 Accounts by Total PnL:")
-account_perf = merged_data.groupby('Account').agg({
-    'Closed PnL': ['sum', 'mean', 'count']
-}).round(2)
-account_perf.columns = ['Total_PnL', 'Avg_PnL', 'Trade_Count']
-account_perf = account_perf.sort_values('Total_PnL', ascending=False)
-print(account_perf.head(10))
+with profiler.stage('Step 7: Advanced analysis', rows_in=len(merged_data)):
+    # 7.1 Correlation Analysis
+    print("\n7.1 Correlation Analysis:")
+    correlation = merged_data[['Closed PnL', 'value', 'sentiment_score', 'Size USD']].corr()
+    print("\nCorrelation Matrix:")
+    print(correlation[['Closed PnL']].sort_values('Closed PnL', ascending=False))
+
+    # 7.2 Performance by Trade Size and Sentiment
+    print("\n7.2 Performance by Trade Size Categories:")
+    merged_data['Trade_Size_Category'] = size_category(merged_data['Size USD'])
+
+    size_sentiment_perf = merged_data.groupby(['Trade_Size_Category', 'classification'], observed=True)['Closed PnL'].mean().unstack()
+    print(size_sentiment_perf.round(2))
+
+    # 7.3 Best and Worst Performing Sentiment Periods
+    print("\n7.3 Top 10 Best Performing Days (by Total PnL):")
+    daily_perf = merged_data.groupby(['date', 'classification'], observed=True)['Closed PnL'].agg(['sum', 'count', 'mean']).reset_index()
+    daily_perf = daily_perf.sort_values('sum', ascending=False)
+    print(daily_perf.head(10).to_string(index=False))
+
+    print("\n7.4 Top 10 Worst Performing Days (by Total PnL):")
+    print(daily_perf.tail(10).to_string(index=False))
+
+    # 7.4 Account-level Analysis: one-pass profiles, ranked by partial selection
+    print("\n7.5 Top 10 Accounts by Total PnL:")
+    profiles = build_account_profiles(merged_data)
+    account_perf = profiles.top('Total_PnL', 10)[['Total_PnL', 'Avg_PnL', 'Trade_Count']].round(2)
+    print(account_perf)
+
+    print(f"\n  Bottom 5 of {len(profiles):,} accounts by Total PnL:")
+    print(profiles.bottom('Total_PnL', 5)[['Total_PnL', 'Avg_PnL', 'Trade_Count', 'Win_Rate',
+                                           'Buy_Share']].round(2).to_string())
+
+    # 7.6 Rolling-window performance, from one account x day table
+    print("\n7.6 Rolling 7/30/90-Day Performance (latest window):")
+    with profiler.stage('Step 7.6: Rolling windows', rows_in=len(merged_data)) as stage:
+        daily = daily_pnl(merged_data)
+        rolling = rolling_metrics(daily)
+        rolling_by_account = rolling_metrics(daily, by_account=True)
+        stage.rows_out = len(rolling) + len(rolling_by_account)
+
+    latest_windows = pd.DataFrame([latest(rolling, window) for window in WINDOWS],
+                                  index=[f'{window}d' for window in WINDOWS]).infer_objects()
+    latest_windows['date'] = latest_windows['date'].dt.date
+    print(latest_windows[['date', 'trades', 'win_rate', 'avg_pnl', 'std_pnl', 'sharpe',
+                          'value_pnl_corr']].round(4).to_string())
+
+    rolling_corr = rolling[rolling['window'] == 30]['value_pnl_corr'].dropna()
+    if len(rolling_corr):
+        print(f"\n  30-day value vs daily PnL correlation: median {rolling_corr.median():.4f}, "
+              f"range {rolling_corr.min():.4f} to {rolling_corr.max():.4f}")
+
+    print("\n  Top 5 accounts by latest 30-day Sharpe-like ratio:")
+    account_windows = latest(rolling_by_account, 30).sort_values('sharpe', ascending=False)
+    print(account_windows[['date', 'trades', 'win_rate', 'avg_pnl', 'sharpe']].head(5).round(2).to_string())
+
+    # 7.7 Lagged sentiment: every lag from one gather over the day-indexed index arrays
+    print(f"\n7.7 Lagged Sentiment Effect (lags -{args.max_lead} to {args.max_lag} days):")
+    with profiler.stage('Step 7.7: Lagged sentiment', rows_in=len(daily)) as stage:
+        lag_summary, lag_buckets = lag_profile(daily, SentimentLookup(fear_greed), args.max_lag,
+                                               args.max_lead)
+        stage.rows_out = len(lag_summary) + len(lag_buckets)
+
+    shown_lags = [lag for lag in [-7, -1, 0, 1, 2, 3, 7, 14, 30, 60] if lag in lag_summary.index]
+    print(lag_summary.loc[shown_lags].round(4).to_string())
+    if lag_summary['Value_PnL_Corr'].notna().any():
+        strongest = lag_summary['Value_PnL_Corr'].abs().idxmax()
+        print(f"\n  Strongest lag: {strongest} days "
+              f"(correlation {lag_summary.loc[strongest, 'Value_PnL_Corr']:.4f} vs "
+              f"{lag_summary.loc[0, 'Value_PnL_Corr']:.4f} same-day)")
+    print("\n  Average PnL by lagged sentiment:")
+    print(bucket_table(lag_buckets).loc[shown_lags].round(2).to_string())
 
 # ============================================================================
 # 8. KEY INSIGHTS
@@ -322,65 +323,109 @@ print("\n" + "=" * 80)
 print("Step 8: Key Insights and Recommendations")
 print("-" * 80)
 
-print("\nKEY FINDINGS:")
-print("-" * 80)
-
-# Calculate key metrics
-best_sentiment = avg_pnl.idxmax()
-worst_sentiment = avg_pnl.idxmin()
-best_win_rate = win_rates.idxmax()
-worst_win_rate = win_rates.idxmin()
-
-print(f"\n1. BEST PERFORMING SENTIMENT:")
-print(f"   • {best_sentiment}: Average PnL = ${avg_pnl[best_sentiment]:.2f}")
-print(f"   • Win Rate = {win_rates[best_sentiment]:.2f}%")
-
-print(f"\n2. WORST PERFORMING SENTIMENT:")
-print(f"   • {worst_sentiment}: Average PnL = ${avg_pnl[worst_sentiment]:.2f}")
-print(f"   • Win Rate = {win_rates[worst_sentiment]:.2f}%")
-
-print(f"\n3. HIGHEST WIN RATE:")
-print(f"   • {best_win_rate}: {win_rates[best_win_rate]:.2f}% win rate")
-
-print(f"\n4. CORRELATION INSIGHTS:")
-corr_value = correlation.loc['Closed PnL', 'value']
-corr_sentiment = correlation.loc['Closed PnL', 'sentiment_score']
-print(f"   • Fear/Greed Value vs PnL: {corr_value:.4f}")
-print(f"   • Sentiment Score vs PnL: {corr_sentiment:.4f}")
-
-# Trading recommendations
-print(f"\nTRADING RECOMMENDATIONS:")
-print("-" * 80)
+with profiler.stage('Step 8: Key insights', rows_in=len(merged_data)):
+    print("\nKEY FINDINGS:")
+    print("-" * 80)
+
+    # Calculate key metrics
+    best_sentiment = avg_pnl.idxmax()
+    worst_sentiment = avg_pnl.idxmin()
+    best_win_rate = win_rates.idxmax()
+    worst_win_rate = win_rates.idxmin()
+
+    print(f"\n1. BEST PERFORMING SENTIMENT:")
+    print(f"   • {best_sentiment}: Average PnL = ${avg_pnl[best_sentiment]:.2f}")
+    print(f"   • Win Rate = {win_rates[best_sentiment]:.2f}%")
+
+    print(f"\n2. WORST PERFORMING SENTIMENT:")
+    print(f"   • {worst_sentiment}: Average PnL = ${avg_pnl[worst_sentiment]:.2f}")
+    print(f"   • Win Rate = {win_rates[worst_sentiment]:.2f}%")
+
+    print(f"\n3. HIGHEST WIN RATE:")
+    print(f"   • {best_win_rate}: {win_rates[best_win_rate]:.2f}% win rate")
+
+    print(f"\n4. CORRELATION INSIGHTS:")
+    corr_value = correlation.loc['Closed PnL', 'value']
+    corr_sentiment = correlation.loc['Closed PnL', 'sentiment_score']
+    print(f"   • Fear/Greed Value vs PnL: {corr_value:.4f}")
+    print(f"   • Sentiment Score vs PnL: {corr_sentiment:.4f}")
+
+    # Recommendations only follow differences that survive resampling
+    intervals, tests = sentiment_significance(merged_data, args.resamples, args.permutations,
+                                              workers=args.workers)
+    print(f"\n5. SIGNIFICANCE ({DEFAULT_CONFIDENCE:.0%} bootstrap intervals, Holm-adjusted permutation tests):")
+    for sentiment, row in intervals.dropna(subset=['Avg_PnL']).iterrows():
+        print(f"   • {sentiment:13s}: Avg PnL ${row['Avg_PnL']:7.2f} [{row['Avg_PnL_Low']:7.2f}, "
+              f"{row['Avg_PnL_High']:7.2f}]  Win Rate {row['Win_Rate']:5.2f}% "
+              f"[{row['Win_Rate_Low']:5.2f}, {row['Win_Rate_High']:5.2f}]")
+    significant = tests[tests['Significant']]
+    print(f"   • {len(significant)} of {len(tests)} pairwise differences significant at {DEFAULT_ALPHA}")
+    for (group_a, group_b, metric), row in significant.iterrows():
+        print(f"     - {group_a} vs {group_b} {metric}: {row['Difference']:+.2f} "
+              f"(adjusted p = {row['P_Adjusted']:.4f})")
+
+    # Trading recommendations
+    print(f"\nTRADING RECOMMENDATIONS:")
+    print("-" * 80)
+
+    pnl_test = compare(tests, 'Extreme Fear', 'Extreme Greed', 'Avg_PnL')
+    if not pnl_test['Significant']:
+        print(f"   • No significant PnL difference between Extreme Fear and Extreme Greed "
+              f"(adjusted p = {pnl_test['P_Adjusted']:.3f})")
+    elif pnl_test['Difference'] > 0:
+        print("   • Consider contrarian strategy: Extreme Fear periods show better returns")
+    else:
+        print("   • Momentum strategy may work: Extreme Greed periods show better returns")
+
+    win_test = compare(tests, 'Extreme Fear', 'Extreme Greed', 'Win_Rate')
+    if not win_test['Significant']:
+        print(f"   • No significant win rate difference between Extreme Fear and Extreme Greed "
+              f"(adjusted p = {win_test['P_Adjusted']:.3f})")
+    elif win_test['Difference'] > 0:
+        print("   • Higher win rate during Extreme Fear - may indicate buying opportunities")
+    else:
+        print("   • Higher win rate during Extreme Greed - trend following may be effective")
+
+    if corr_value > 0.1:
+        print("   • Positive correlation detected: Higher sentiment → Better performance")
+    elif corr_value < -0.1:
+        print("   • Negative correlation detected: Lower sentiment → Better performance (contrarian)")
+    else:
+        print("   • Weak correlation: Sentiment may not be a strong predictor")
+
+    # Side analysis
+    side_avg = metrics.side_avg_pnl()
+    buy_avg = side_avg.get('BUY', np.nan)
+    sell_avg = side_avg.get('SELL', np.nan)
+    print(f"\n   • BUY trades average: ${buy_avg:.2f}")
+    print(f"   • SELL trades average: ${sell_avg:.2f}")
+
+    side_tests = permutation_tests(merged_data['Closed PnL'].to_numpy(dtype='float64'),
+                                   group_codes(merged_data['Side'], ['BUY', 'SELL']), ['BUY', 'SELL'],
+                                   n_permutations=args.permutations, workers=args.workers)
+    side_test = side_tests.loc[('BUY', 'SELL', 'Avg_PnL')]
+    if not side_test['Significant']:
+        print(f"   • No significant difference between BUY and SELL average PnL "
+              f"(adjusted p = {side_test['P_Adjusted']:.3f})")
+    elif buy_avg > sell_avg:
+        print("   • BUY trades outperform SELL trades on average")
+    else:
+        print("   • SELL trades outperform BUY trades on average")
 
-if avg_pnl['Extreme Fear'] > avg_pnl['Extreme Greed']:
-    print("   • Consider contrarian strategy: Extreme Fear periods show better returns")
-elif avg_pnl['Extreme Greed'] > avg_pnl['Extreme Fear']:
-    print("   • Momentum strategy may work: Extreme Greed periods show better returns")
-
-if win_rates['Extreme Fear'] > win_rates['Extreme Greed']:
-    print("   • Higher win rate during Extreme Fear - may indicate buying opportunities")
-elif win_rates['Extreme Greed'] > win_rates['Extreme Fear']:
-    print("   • Higher win rate during Extreme Greed - trend following may be effective")
-
-if corr_value > 0.1:
-    print("   • Positive correlation detected: Higher sentiment → Better performance")
-elif corr_value < -0.1:
-    print("   • Negative correlation detected: Lower sentiment → Better performance (contrarian)")
-else:
-    print("   • Weak correlation: Sentiment may not be a strong predictor")
-
-# Side analysis
-buy_avg = merged_data[merged_data['Side'] == 'BUY']['Closed PnL'].mean()
-sell_avg = merged_data[merged_data['Side'] == 'SELL']['Closed PnL'].mean()
-print(f"\n   • BUY trades average: ${buy_avg:.2f}")
-print(f"   • SELL trades average: ${sell_avg:.2f}")
-
-if buy_avg > sell_avg:
-    print("   • BUY trades outperform SELL trades on average")
-else:
-    print("   • SELL trades outperform BUY trades on average")
 
 print("\n" + "=" * 80)
-print("Analysis Complete! Check 'sentiment_trader_analysis.png' for visualizations.")
+if len(figure_paths) == 1:
+    print(f"Analysis Complete! Check '{figure_paths[0]}' for visualizations.")
+else:
+    print("Analysis Complete! Visualizations:")
+    for path in figure_paths:
+        print(f"   • {path}")
 print("=" * 80)
 
+if profiler.enabled:
+    print("\nStep timings:")
+    print(profiler.summary())
+    if args.profile_output:
+        profiler.write_json(args.profile_output)
+        print(f"[OK] Step records written to {args.profile_output}")
+
@@ -0,0 +1,302 @@
+"""
+Significance Testing
+====================
+Are the differences between sentiment buckets real or noise?
+
+- Bootstrap percentile confidence intervals for the mean PnL and win rate
+  of each sentiment bucket (trades resampled with replacement within the
+  bucket).
+- Two-sided permutation tests of the difference in mean PnL and in win
+  rate between every pair of buckets.
+- Holm (default), Bonferroni or Benjamini-Hochberg adjustment of the
+  p-values of the whole family of tests.
+
+Resamples are drawn as (resamples x trades) index matrices, so a batch of
+bootstrap replicates is one random draw, one gather and one row sum. For
+the permutation tests, a random relabelling of a pair of buckets gives
+bucket A a hypergeometric number h of its own trades plus n_A - h of B's,
+each a uniformly random subset. A block draws every h at once and, per
+bucket, one (replicates x trades / 2) matrix of random half-shuffles in a
+single array operation; prefix sums along its rows give the subset sums
+for every pair.
+
+Replicates are generated in fixed blocks, each with its own child seed, so
+results depend only on the seed and never on the number of worker
+processes.
+
+Usage:
+    python significance.py                         # full cached dataset
+    python significance.py --resamples 2000 --workers 4
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from pipeline import SENTIMENT_ORDER, find_trader_file, load_merged_data
+from metrics import group_codes
+from quantiles import exact_quantiles
+
+DEFAULT_RESAMPLES = 1000
+DEFAULT_PERMUTATIONS = 1000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_ALPHA = 0.05
+DEFAULT_SEED = 42
+
+ADJUSTMENTS = ['holm', 'bonferroni', 'fdr_bh']
+
+# Replicates per block (the unit of work handed to a worker process)
+BLOCK_SIZE = 100
+
+# Resampled trade indices held in memory at once by one worker
+MAX_BATCH = 4_000_000
+
+TEST_METRICS = ['Avg_PnL', 'Win_Rate']
+
+
+def split_groups(values, codes, n_groups):
+    """Values of each group code 0..n_groups-1 as a list of arrays (code -1 dropped)."""
+    values = np.asarray(values, dtype='float64')
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    return [values[order[bounds[g]:bounds[g + 1]]] for g in range(n_groups)]
+
+
+def _group_means(groups):
+    """(groups, 2) observed mean PnL and win rate (NaN for empty groups)."""
+    sizes = np.array([len(values) for values in groups], dtype='float64')
+    sums = np.array([[values.sum(), np.count_nonzero(values > 0) * 100] for values in groups],
+                    dtype='float64').reshape(len(groups), 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / sizes[:, None]
+
+
+def _blocks(n_replicates, seed):
+    """(replicate count, seed) of each block of a run."""
+    counts = [BLOCK_SIZE] * (n_replicates // BLOCK_SIZE)
+    if n_replicates % BLOCK_SIZE:
+        counts.append(n_replicates % BLOCK_SIZE)
+    return list(zip(counts, np.random.SeedSequence(seed).spawn(len(counts))))
+
+
+def _run_blocks(function, tasks, workers):
+    """Results of `function` over `tasks`, in task order."""
+    workers = min(workers or 1, len(tasks))
+    if workers <= 1:
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, tasks))
+
+
+def _bootstrap_block(task):
+    """Worker: (count, groups, 2) resampled mean PnL and win rate."""
+    groups, count, seed = task
+    rng = np.random.default_rng(seed)
+    result = np.full((count, len(groups), 2), np.nan)
+    for g, values in enumerate(groups):
+        n = len(values)
+        if n == 0:
+            continue
+        rows = max(1, MAX_BATCH // n)
+        for start in range(0, count, rows):
+            stop = min(start + rows, count)
+            sample = values[rng.integers(0, n, size=(stop - start, n))]
+            result[start:stop, g, 0] = sample.sum(axis=1) / n
+            result[start:stop, g, 1] = np.count_nonzero(sample > 0, axis=1) / n * 100
+    return result
+
+
+def _subset_sums(values, sizes, rng):
+    """(rows, k, 2) PnL sum and win count of random subsets of `values`, of sizes (rows, k).
+
+    Each row is a random ordering of half of the values; a j-subset is its
+    first j values, or the complement of the first n - j past half.
+    """
+    n, half = len(values), len(values) // 2
+    totals = np.array([values.sum(), np.count_nonzero(values > 0)], dtype='float64')
+    result = np.empty(sizes.shape + (2,))
+    rows = max(1, MAX_BATCH // max(n, 1))
+    for start in range(0, len(sizes), rows):
+        stop = min(start + rows, len(sizes))
+        # The smallest half of random keys is a uniform half-subset per row;
+        # argpartition leaves it in no particular order, so it is shuffled too
+        order = np.argpartition(rng.random((stop - start, n)), half, axis=1)[:, :half]
+        order = rng.permuted(order, axis=1)
+        sample = values[order]
+        prefix = np.zeros((stop - start, half + 1, 2))
+        np.cumsum(sample, axis=1, out=prefix[:, 1:, 0])
+        np.cumsum(sample > 0, axis=1, out=prefix[:, 1:, 1])
+        j = sizes[start:stop]
+        low = j <= half
+        picked = np.take_along_axis(prefix, np.where(low, j, n - j)[:, :, None], axis=1)
+        result[start:stop] = np.where(low[:, :, None], picked, totals - picked)
+    return result
+
+
+def _permutation_block(task):
+    """Worker: (count, pairs, 2) permuted differences in mean PnL and win rate."""
+    groups, pairs, count, seed = task
+    rng = np.random.default_rng(seed)
+    sizes = np.array([len(values) for values in groups])
+    totals = np.array([[values.sum(), np.count_nonzero(values > 0)] for values in groups], dtype='float64')
+    tested = [p for p, (a, b) in enumerate(pairs) if sizes[a] and sizes[b]]
+
+    # Trades of A that keep label A when the pair is relabelled at random,
+    # for every replicate and pair at once
+    kept = np.zeros((count, len(pairs)), dtype='int64')
+    for p in tested:
+        a, b = pairs[p]
+        kept[:, p] = rng.hypergeometric(sizes[a], sizes[b], sizes[a], size=count)
+
+    # A's relabelled sum is a kept-subset of A plus an (n_A - kept)-subset of B;
+    # each group draws all the subset sizes it takes part in in one batch
+    sum_a = np.zeros((count, len(pairs), 2))
+    for g, values in enumerate(groups):
+        uses = [(p, kept[:, p]) for p in tested if pairs[p][0] == g]
+        uses += [(p, sizes[pairs[p][0]] - kept[:, p]) for p in tested if pairs[p][1] == g]
+        if not uses:
+            continue
+        subset = _subset_sums(values, np.stack([j for _, j in uses], axis=1), rng)
+        for k, (p, _) in enumerate(uses):
+            sum_a[:, p] += subset[:, k]
+
+    result = np.full((count, len(pairs), 2), np.nan)
+    for p in tested:
+        a, b = pairs[p]
+        sum_b = totals[a] + totals[b] - sum_a[:, p]
+        result[:, p] = sum_a[:, p] / sizes[a] - sum_b / sizes[b]
+    result[:, :, 1] *= 100
+    return result
+
+
+def adjust_pvalues(pvalues, method='holm'):
+    """Multiple-comparison adjusted p-values; NaNs are left out of the family."""
+    if method not in ADJUSTMENTS:
+        raise ValueError(f"Unknown adjustment {method!r}; expected one of {ADJUSTMENTS}")
+    pvalues = np.asarray(pvalues, dtype='float64')
+    adjusted = np.full(len(pvalues), np.nan)
+    present = np.flatnonzero(~np.isnan(pvalues))
+    m = len(present)
+    if m == 0:
+        return adjusted
+    order = present[np.argsort(pvalues[present], kind='stable')]
+    ranked = pvalues[order]
+    if method == 'bonferroni':
+        values = ranked * m
+    elif method == 'holm':
+        values = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    else:
+        values = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    adjusted[order] = np.minimum(values, 1.0)
+    return adjusted
+
+
+def bootstrap_intervals(values, codes, labels, n_resamples=DEFAULT_RESAMPLES,
+                        confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED, workers=1):
+    """Bootstrap percentile intervals of mean PnL and win rate per group.
+
+    `codes` index into `labels` (-1 for trades in no group). Returns a frame
+    indexed by label with Trade_Count, Avg_PnL, Avg_PnL_Low, Avg_PnL_High,
+    Win_Rate, Win_Rate_Low and Win_Rate_High.
+    """
+    groups = split_groups(values, codes, len(labels))
+    tasks = [(groups, count, block_seed) for count, block_seed in _blocks(n_resamples, seed)]
+    replicates = np.concatenate(_run_blocks(_bootstrap_block, tasks, workers))
+
+    tail = (1 - confidence) / 2
+    observed = _group_means(groups)
+    table = pd.DataFrame({'Trade_Count': [len(values) for values in groups]}, index=pd.Index(labels))
+    for i, metric in enumerate(TEST_METRICS):
+        bounds = np.array([exact_quantiles(replicates[:, g, i], [tail, 1 - tail])
+                           if len(values) > 1 else [np.nan, np.nan]
+                           for g, values in enumerate(groups)])
+        table[metric] = observed[:, i]
+        table[f'{metric}_Low'] = bounds[:, 0]
+        table[f'{metric}_High'] = bounds[:, 1]
+    return table
+
+
+def permutation_tests(values, codes, labels, pairs=None, n_permutations=DEFAULT_PERMUTATIONS,
+                      method='holm', alpha=DEFAULT_ALPHA, seed=DEFAULT_SEED, workers=1):
+    """Two-sided permutation tests of mean PnL and win rate between pairs of groups.
+
+    `pairs` are (label_a, label_b) tuples, every pair in label order by
+    default. Returns a frame indexed by (Group_A, Group_B, Metric) with the
+    observed Difference (A - B), P_Value, P_Adjusted (over all rows) and
+    Significant (P_Adjusted < alpha).
+    """
+    if pairs is None:
+        pairs = list(combinations(labels, 2))
+    groups = split_groups(values, codes, len(labels))
+    index = {label: i for i, label in enumerate(labels)}
+    coded = [(index[a], index[b]) for a, b in pairs]
+
+    means = _group_means(groups)
+    observed = np.array([means[a] - means[b] for a, b in coded]).reshape(len(coded), 2)
+
+    tasks = [(groups, coded, count, block_seed) for count, block_seed in _blocks(n_permutations, seed)]
+    replicates = np.concatenate(_run_blocks(_permutation_block, tasks, workers))
+    # Relative tolerance so permutations equal to the observed split count as extreme
+    extreme = np.abs(replicates) >= np.abs(observed)[None] * (1 - 1e-9)
+    pvalues = (1 + extreme.sum(axis=0)) / (1 + n_permutations)
+    pvalues = np.where(np.isnan(observed), np.nan, pvalues)
+
+    rows = pd.MultiIndex.from_tuples([(a, b, metric) for a, b in pairs for metric in TEST_METRICS],
+                                     names=['Group_A', 'Group_B', 'Metric'])
+    table = pd.DataFrame({'Difference': observed.ravel(), 'P_Value': pvalues.ravel()}, index=rows)
+    table['P_Adjusted'] = adjust_pvalues(table['P_Value'], method)
+    table['Significant'] = table['P_Adjusted'] < alpha
+    return table
+
+
+def compare(tests, a, b, metric='Avg_PnL'):
+    """Row of `tests` for a vs b, with the difference flipped if stored as b vs a."""
+    if (a, b, metric) in tests.index:
+        return tests.loc[(a, b, metric)]
+    row = tests.loc[(b, a, metric)].copy()
+    row['Difference'] = -row['Difference']
+    return row
+
+
+def sentiment_significance(merged_data, n_resamples=DEFAULT_RESAMPLES,
+                           n_permutations=DEFAULT_PERMUTATIONS, method='holm', seed=DEFAULT_SEED,
+                           workers=1):
+    """(intervals, tests) of mean PnL and win rate across SENTIMENT_ORDER buckets."""
+    pnl = merged_data['Closed PnL'].to_numpy(dtype='float64')
+    codes = group_codes(merged_data['classification'], SENTIMENT_ORDER)
+    intervals = bootstrap_intervals(pnl, codes, SENTIMENT_ORDER, n_resamples, seed=seed,
+                                    workers=workers)
+    tests = permutation_tests(pnl, codes, SENTIMENT_ORDER, n_permutations=n_permutations,
+                              method=method, seed=seed, workers=workers)
+    return intervals, tests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap intervals and permutation tests by sentiment")
+    parser.add_argument('--resamples', type=int, default=DEFAULT_RESAMPLES,
+                        help="bootstrap resamples per sentiment")
+    parser.add_argument('--permutations', type=int, default=DEFAULT_PERMUTATIONS,
+                        help="random relabellings per pairwise test")
+    parser.add_argument('--adjust', default='holm', choices=ADJUSTMENTS,
+                        help="multiple-comparison adjustment")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes (0: one per CPU core)")
+    args = parser.parse_args()
+
+    merged_data, _ = load_merged_data(find_trader_file())
+    workers = args.workers or os.cpu_count()
+    intervals, tests = sentiment_significance(merged_data, args.resamples, args.permutations,
+                                              args.adjust, args.seed, workers)
+    print(f"[OK] {args.resamples:,} bootstrap resamples, {args.permutations:,} permutations per test")
+    print(f"\n{DEFAULT_CONFIDENCE:.0%} bootstrap intervals by sentiment:")
+    print(intervals.round(2).to_string())
+    print(f"\nPairwise permutation tests ({args.adjust}-adjusted):")
+    print(tests.round(4).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Dataset Snapshots
+=================
+Read-only, memory-mapped snapshots of a dashboard dataset version, shared by
+every dashboard process on the machine.
+
+A snapshot is a directory holding the date-sorted trades, the aggregate cube,
+the account x day table and the Fear/Greed table as uncompressed Arrow IPC
+files, the filter index arrays of the trades and the cube as .npy files,
+the per-sentiment metrics as small Arrow files and the box statistics as
+JSON. Nothing is pickled, so
+a damaged or foreign file in the shared cache fails to read instead of
+running code. A snapshot is written once per version, to a temporary
+directory that is then renamed into place, so readers never see a partial
+snapshot.
+
+Reading maps the files instead of loading them. The frames' columns and the
+index arrays point straight into the mapping (categoricals are rebuilt
+around their mapped codes), so opening a snapshot costs milliseconds
+whatever its size. The pages come from the OS page cache, which
+every process mapping the same files shares. Memory therefore no longer grows
+with the number of dashboard workers. Mapped arrays are read-only.
+
+Without pyarrow no snapshot is written or read, and callers build the dataset
+in memory instead.
+
+Usage:
+    python snapshot.py                # list snapshots
+    python snapshot.py --prune 1      # keep only the newest snapshot
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from data_cache import CACHE_DIR
+from metrics import SentimentMetrics
+from trade_index import BITMAP_COLUMNS, FrameIndex
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+
+# Bump whenever the snapshot layout changes
+SNAPSHOT_VERSION = 5
+
+KEEP_SNAPSHOTS = 2
+
+# Indexed frames (Dataset attribute by file name), each stored as
+# <name>.arrow plus <name>_<array>.npy files
+INDEXED_FRAMES = {'trades': 'trade_index', 'cube': 'cube_index'}
+INDEX_ARRAYS = ['days'] + list(BITMAP_COLUMNS)
+
+# SentimentMetrics frames, each stored as metrics_<name>.arrow with its index
+# as leading columns
+METRIC_FRAMES = ['by_sentiment', 'by_side', 'by_sentiment_side']
+
+
+def snapshot_path(version, snapshot_dir=SNAPSHOT_DIR):
+    """Directory of the snapshot of a dataset version."""
+    return os.path.join(snapshot_dir, f'{version}-v{SNAPSHOT_VERSION}')
+
+
+def write_frame(frame, path):
+    """Write a frame as one uncompressed Arrow IPC record batch that maps without copies.
+
+    Arrow turns NaN and NaT into nulls and categoricals into dictionaries,
+    and reading either back builds a private copy. Floats are therefore
+    written with their NaNs, datetimes as their int64 ticks and categoricals
+    as their integer codes; the categories and datetime dtypes go into the
+    schema metadata for map_frame().
+    """
+    arrays, categories, datetimes = {}, {}, {}
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[column] = pa.array(values.cat.codes.to_numpy())
+            categories[column] = [values.cat.categories.tolist(), bool(values.cat.ordered)]
+        elif values.dtype.kind == 'M':
+            arrays[column] = pa.array(values.to_numpy().view('int64'))
+            datetimes[column] = str(values.dtype)
+        elif values.dtype.kind == 'f':
+            arrays[column] = pa.array(values.to_numpy(), from_pandas=False)
+        else:
+            arrays[column] = pa.array(values)
+    metadata = {'categories': json.dumps(categories), 'datetimes': json.dumps(datetimes)}
+    table = pa.table(arrays, metadata=metadata)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=max(len(frame), 1))
+
+
+def map_frame(path):
+    """Frame whose columns are zero-copy views of a memory-mapped Arrow IPC file."""
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    metadata = table.schema.metadata or {}
+    categories = json.loads(metadata.get(b'categories', b'{}'))
+    datetimes = json.loads(metadata.get(b'datetimes', b'{}'))
+    frame = table.to_pandas(split_blocks=True)
+    columns = {}
+    for column in frame.columns:
+        if column in categories:
+            labels, ordered = categories[column]
+            columns[column] = pd.Categorical.from_codes(frame[column].to_numpy(), labels, ordered=ordered)
+        elif column in datetimes:
+            columns[column] = frame[column].to_numpy().view(datetimes[column])
+        else:
+            columns[column] = frame[column]
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+def write_metrics(metrics, path):
+    """Write SentimentMetrics as Arrow files in directory `path`; returns their index names."""
+    index_names = {}
+    for name in METRIC_FRAMES:
+        frame = getattr(metrics, name)
+        index_names[name] = list(frame.index.names)
+        write_frame(frame.reset_index(), os.path.join(path, f'metrics_{name}.arrow'))
+    write_frame(metrics.overall.to_frame().T, os.path.join(path, 'metrics_overall.arrow'))
+    return index_names
+
+
+def read_metrics(path, index_names):
+    """SentimentMetrics from the Arrow files written by write_metrics()."""
+    frames = {name: map_frame(os.path.join(path, f'metrics_{name}.arrow')).set_index(index_names[name])
+              for name in METRIC_FRAMES}
+    overall = map_frame(os.path.join(path, 'metrics_overall.arrow')).iloc[0]
+    return SentimentMetrics(overall=overall, **frames)
+
+
+def write_box_stats(box_stats, path):
+    """Write pnl_box_stats() output as JSON (NaN for empty sentiments)."""
+    stats = [{**box, 'fliers': np.asarray(box['fliers'], dtype='float64').tolist()} for box in box_stats]
+    with open(path, 'w') as f:
+        json.dump(stats, f)
+
+
+def read_box_stats(path):
+    """Box statistics written by write_box_stats()."""
+    with open(path) as f:
+        stats = json.load(f)
+    return [{**box, 'fliers': np.array(box['fliers'], dtype='float64')} for box in stats]
+
+
+def write_snapshot(dataset, snapshot_dir=SNAPSHOT_DIR):
+    """Write a snapshot of `dataset` (a refresh.Dataset); returns its path or None.
+
+    An existing snapshot of the same version is kept as it is. Failures
+    (read-only filesystem, missing pyarrow) are not fatal.
+    """
+    if not HAS_PYARROW:
+        return None
+    path = snapshot_path(dataset.version, snapshot_dir)
+    if os.path.exists(path):
+        return path
+
+    temp = f'{path}.tmp-{os.getpid()}'
+    try:
+        os.makedirs(temp, exist_ok=True)
+        for name, attribute in INDEXED_FRAMES.items():
+            index = getattr(dataset, attribute)
+            write_frame(index.frame, os.path.join(temp, f'{name}.arrow'))
+            for array_name, array in index.arrays().items():
+                np.save(os.path.join(temp, f'{name}_{array_name}.npy'), array)
+        write_frame(dataset.account_days, os.path.join(temp, 'account_days.arrow'))
+        write_frame(dataset.fear_greed, os.path.join(temp, 'fear_greed.arrow'))
+        metric_index = write_metrics(dataset.metrics, temp)
+        write_box_stats(dataset.box_stats, os.path.join(temp, 'box_stats.json'))
+        meta = {
+            'version': dataset.version,
+            'snapshot_version': SNAPSHOT_VERSION,
+            'trades': len(dataset.trade_index),
+            'cube_cells': len(dataset.cube_index),
+            'built_at': dataset.built_at.isoformat(timespec='seconds'),
+            'build_seconds': dataset.build_seconds,
+            'metric_index': metric_index,
+        }
+        with open(os.path.join(temp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.rename(temp, path)
+    except OSError:
+        # Either another process renamed its copy into place first, or the
+        # directory is not writable
+        shutil.rmtree(temp, ignore_errors=True)
+        return path if os.path.exists(path) else None
+    return path
+
+
+def read_snapshot(version, snapshot_dir=SNAPSHOT_DIR):
+    """Memory-map the snapshot of a version as a dict of Dataset parts, or None if missing."""
+    path = snapshot_path(version, snapshot_dir)
+    if not HAS_PYARROW or not os.path.exists(path):
+        return None
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        parts = {}
+        for name, attribute in INDEXED_FRAMES.items():
+            frame = map_frame(os.path.join(path, f'{name}.arrow'))
+            arrays = {array_name: np.load(os.path.join(path, f'{name}_{array_name}.npy'), mmap_mode='r')
+                      for array_name in INDEX_ARRAYS}
+            parts[attribute] = FrameIndex.from_arrays(frame, arrays)
+        parts['account_days'] = map_frame(os.path.join(path, 'account_days.arrow'))
+        parts['fear_greed'] = map_frame(os.path.join(path, 'fear_greed.arrow'))
+        parts['metrics'] = read_metrics(path, meta['metric_index'])
+        parts['box_stats'] = read_box_stats(os.path.join(path, 'box_stats.json'))
+    except (OSError, ValueError, KeyError):
+        return None
+    parts['built_at'] = pd.Timestamp(meta['built_at'])
+    parts['build_seconds'] = meta['build_seconds']
+    return parts
+
+
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    """Complete snapshots as (path, meta), newest first."""
+    if not os.path.isdir(snapshot_dir):
+        return []
+    snapshots = []
+    for name in os.listdir(snapshot_dir):
+        meta_path = os.path.join(snapshot_dir, name, 'meta.json')
+        if '.tmp-' in name or not os.path.exists(meta_path):
+            continue
+        with open(meta_path) as f:
+            snapshots.append((os.path.join(snapshot_dir, name), json.load(f)))
+    return sorted(snapshots, key=lambda item: os.path.getmtime(item[0]), reverse=True)
+
+
+def prune_snapshots(keep=KEEP_SNAPSHOTS, snapshot_dir=SNAPSHOT_DIR):
+    """Delete all but the `keep` newest snapshots; returns the paths removed.
+
+    Processes that still map a removed snapshot keep reading it: the files
+    are only freed once the last mapping is closed.
+    """
+    removed = []
+    for path, _ in list_snapshots(snapshot_dir)[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+    return removed
+
+
+def directory_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or prune memory-mapped dataset snapshots")
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument('--prune', type=int, metavar='KEEP',
+                        help="delete all but the KEEP newest snapshots")
+    args = parser.parse_args()
+
+    if args.prune is not None:
+        for path in prune_snapshots(args.prune, args.dir):
+            print(f"[OK] Removed {path}")
+    snapshots = list_snapshots(args.dir)
+    if not snapshots:
+        print(f"[OK] No snapshots in {args.dir}/ (python refresh.py writes one)")
+    for path, meta in snapshots:
+        started = time.perf_counter()
+        read_snapshot(meta['version'], args.dir)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"[OK] {meta['version']}: {meta['trades']:,} trades, {meta['cube_cells']:,} cube cells, "
+              f"{directory_size(path) / 1024 ** 2:.1f} MB, built {meta['built_at']}, mapped in {elapsed:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,518 @@
+"""
+Streaming Aggregation
+=====================
+Bounded-memory analysis of trade files larger than RAM.
+
+The trader CSV is read in chunks; each chunk is cleaned and joined with the
+sentiment index through the shared pipeline, then reduced to mergeable partial
+aggregates (counts, sums, wins, cross-products and the PnL sum of squared
+deviations from the group mean, M2). Partials combine by addition, with M2
+merged by Chan et al.'s parallel formula, so the Step 5 and Step 7 tables of
+sentiment_trader_analysis.py can be rebuilt without holding the trades.
+
+Exact medians need the order statistics of the raw values, so they are found
+with extra passes over the file that narrow a histogram around the target
+ranks until the remaining candidates fit in memory. Each sentiment also keeps
+a mergeable quantile sketch (see quantiles.py), which gives percentiles,
+boxplot statistics and, with --approx-median, medians within a relative
+error bound without any extra pass; --sketch-output saves the sketches.
+
+Usage:
+    python streaming.py historical_data.csv --chunksize 500000
+    python streaming.py historical_data.csv --approx-median --sketch-output sketches.json
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+from pipeline import (SENTIMENT_ORDER, SIZE_LABELS, FEAR_GREED_FILE, TRADER_COLUMNS,
+                      TRADER_DTYPES, SentimentLookup, load_fear_greed,
+                      clean_trader_data, merge_sentiment, size_category)
+from metrics import group_codes
+from quantiles import ALL_TRADES, DEFAULT_RELATIVE_ERROR, GroupSketches
+
+DEFAULT_CHUNKSIZE = 500_000
+
+CORR_COLUMNS = ['Closed PnL', 'value', 'sentiment_score', 'Size USD']
+
+# Grouping keys of each additive partial table
+TABLE_KEYS = {
+    'sentiment': ['classification'],
+    'sentiment_side': ['classification', 'Side'],
+    'size_sentiment': ['Trade_Size_Category', 'classification'],
+    'day': ['date', 'classification'],
+    'account': ['Account'],
+}
+
+# Measures kept for every group (all additive except pnl_m2)
+MEASURES = ['count', 'pnl_sum', 'pnl_m2', 'wins', 'losses', 'size_sum', 'size_count']
+
+
+def iter_merged_chunks(path, fear_greed, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield cleaned, sentiment-tagged chunks of the trader CSV.
+
+    Yields (rows_read, merged_chunk) so callers can report raw row counts.
+    """
+    reader = pd.read_csv(
+        path,
+        usecols=lambda col: col in TRADER_COLUMNS,
+        dtype=TRADER_DTYPES,
+        chunksize=chunksize
+    )
+    lookup = SentimentLookup(fear_greed)
+    for raw in reader:
+        rows_read = len(raw)
+        yield rows_read, merge_sentiment(clean_trader_data(raw), lookup)
+
+
+def _plain_keys(chunk, keys):
+    """Key columns as plain values.
+
+    Chunks read separately get chunk-local categories, so categorical keys are
+    decoded before grouping to keep partial indexes aligned across chunks.
+    """
+    columns = {}
+    for key in keys:
+        values = chunk[key]
+        if isinstance(values.dtype, CategoricalDtype):
+            values = values.astype(object)
+        columns[key] = values
+    return columns
+
+
+def measure_frame(chunk):
+    """Per-trade measures of a merged chunk (M2 is zero for a single trade)."""
+    pnl = chunk['Closed PnL'].astype('float64')
+    size = chunk['Size USD'].astype('float64')
+    return pd.DataFrame({
+        'count': np.ones(len(chunk), dtype='int64'),
+        'pnl_sum': pnl,
+        'pnl_m2': np.zeros(len(chunk)),
+        'wins': (pnl > 0).astype('int64'),
+        'losses': (pnl < 0).astype('int64'),
+        'size_sum': size.fillna(0.0),
+        'size_count': size.notna().astype('int64'),
+    }, index=chunk.index)
+
+
+def grouped_measures(chunk, keys, measures=None):
+    """Sum the measures of a chunk by the given keys, with the M2 of each group."""
+    if measures is None:
+        measures = measure_frame(chunk)
+    grouped = measures.assign(**_plain_keys(chunk, keys)).groupby(keys)
+    table = grouped.sum()
+    table['pnl_m2'] = grouped['pnl_sum'].var(ddof=0) * table['count']
+    return table
+
+
+def combine_tables(left, right):
+    """Add two partial tables, aligning on their group keys.
+
+    M2 is merged with Chan et al.'s parallel formula: the two M2s plus
+    delta^2 * n_left * n_right / n, delta being the difference of the means.
+    """
+    if left is None:
+        return right
+    if right is None:
+        return left
+    combined = left.add(right, fill_value=0)
+    # Groups missing on one side get a zero count there, so they add no M2
+    n_left = left['count'].reindex(combined.index, fill_value=0)
+    n_right = right['count'].reindex(combined.index, fill_value=0)
+    mean_left = (left['pnl_sum'] / left['count']).reindex(combined.index, fill_value=0.0)
+    mean_right = (right['pnl_sum'] / right['count']).reindex(combined.index, fill_value=0.0)
+    delta = mean_right - mean_left
+    combined['pnl_m2'] += delta * delta * n_left * n_right / combined['count']
+    int_columns = [col for col in ('count', 'wins', 'losses', 'size_count')
+                   if col in combined.columns]
+    combined[int_columns] = combined[int_columns].astype('int64')
+    return combined
+
+
+class CorrelationMoments:
+    """Mergeable pairwise moments for a Pearson correlation matrix.
+
+    Each entry (i, j) only counts rows where both columns are present, which
+    matches DataFrame.corr()'s pairwise-complete handling of missing values.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def update(self, chunk):
+        values = chunk[self.columns].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        mask = valid.astype('float64')
+        filled = np.where(valid, values, 0.0)
+        self.n += mask.T @ mask
+        self.sx += filled.T @ mask
+        self.sxx += (filled * filled).T @ mask
+        self.sxy += filled.T @ filled
+
+    def combine(self, other):
+        self.n += other.n
+        self.sx += other.sx
+        self.sxx += other.sxx
+        self.sxy += other.sxy
+        return self
+
+    def correlation(self):
+        """Return the correlation matrix as a DataFrame."""
+        cov = self.n * self.sxy - self.sx * self.sx.T
+        var = self.n * self.sxx - self.sx * self.sx
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cov / np.sqrt(var * var.T)
+        np.fill_diagonal(corr, 1.0)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class StreamAggregates:
+    """Mergeable partial aggregates of a stream of merged trade chunks."""
+
+    def __init__(self, relative_error=DEFAULT_RELATIVE_ERROR):
+        self.tables = {name: None for name in TABLE_KEYS}
+        self.moments = CorrelationMoments(CORR_COLUMNS)
+        self.sketches = GroupSketches(SENTIMENT_ORDER, relative_error)
+        self.pnl_min = pd.Series(dtype='float64')
+        self.pnl_max = pd.Series(dtype='float64')
+        self.rows_read = 0
+
+    def update(self, chunk, rows_read=None):
+        """Fold one merged chunk into the running aggregates."""
+        self.rows_read += len(chunk) if rows_read is None else rows_read
+        if len(chunk) == 0:
+            return self
+
+        chunk = chunk.assign(Trade_Size_Category=size_category(chunk['Size USD']))
+        measures = measure_frame(chunk)
+        for name, keys in TABLE_KEYS.items():
+            self.tables[name] = combine_tables(
+                self.tables[name], grouped_measures(chunk, keys, measures)
+            )
+        self.moments.update(chunk)
+        self.sketches.update(chunk['Closed PnL'].to_numpy(dtype='float64'),
+                             group_codes(chunk['classification'], SENTIMENT_ORDER))
+
+        pnl = chunk['Closed PnL'].groupby(_plain_keys(chunk, ['classification'])['classification'])
+        self.pnl_min = pd.concat([self.pnl_min, pnl.min()], axis=1).min(axis=1)
+        self.pnl_max = pd.concat([self.pnl_max, pnl.max()], axis=1).max(axis=1)
+        return self
+
+    def combine(self, other):
+        """Merge another StreamAggregates into this one."""
+        for name in TABLE_KEYS:
+            self.tables[name] = combine_tables(self.tables[name], other.tables[name])
+        self.moments.combine(other.moments)
+        self.sketches.merge(other.sketches)
+        self.pnl_min = pd.concat([self.pnl_min, other.pnl_min], axis=1).min(axis=1)
+        self.pnl_max = pd.concat([self.pnl_max, other.pnl_max], axis=1).max(axis=1)
+        self.rows_read += other.rows_read
+        return self
+
+    # ------------------------------------------------------------------
+    # Finalized tables (same shapes as the in-memory analysis)
+    # ------------------------------------------------------------------
+    def _table(self, name):
+        table = self.tables[name]
+        if table is None:
+            return pd.DataFrame(columns=MEASURES)
+        return table
+
+    @property
+    def trade_count(self):
+        return int(self._table('sentiment')['count'].sum())
+
+    def totals(self):
+        """Overall measures summed across sentiments."""
+        return self._table('sentiment').sum()
+
+    def sentiment_counts(self):
+        """Trades per sentiment, largest first (like value_counts())."""
+        return self._table('sentiment')['count'].sort_values(ascending=False)
+
+    def performance_by_sentiment(self, medians=None):
+        """Step 5.1 table; pass `medians` from stream_medians() to fill Median_PnL."""
+        table = self._table('sentiment').reindex(SENTIMENT_ORDER)
+        count = table['count']
+        mean = table['pnl_sum'] / count
+        std = np.sqrt(table['pnl_m2'] / (count - 1))
+        if medians is None:
+            median = pd.Series(np.nan, index=table.index)
+        else:
+            median = medians.reindex(table.index)
+        performance = pd.DataFrame({
+            'Trade_Count': count,
+            'Total_PnL': table['pnl_sum'],
+            'Avg_PnL': mean,
+            'Median_PnL': median,
+            'Std_PnL': std,
+            'Avg_Trade_Size': table['size_sum'] / table['size_count'],
+        }).round(2)
+        performance.index.name = 'classification'
+        return performance
+
+    def win_rate_by_sentiment(self):
+        table = self._table('sentiment').reindex(SENTIMENT_ORDER)
+        return (table['wins'] / table['count'] * 100).round(2)
+
+    def side_averages(self):
+        """Average PnL per side across all sentiments."""
+        side = self._table('sentiment_side').groupby(level='Side').sum()
+        return side['pnl_sum'] / side['count']
+
+    def buy_sell_by_sentiment(self):
+        table = self._table('sentiment_side')
+        return (table['pnl_sum'] / table['count']).unstack().reindex(SENTIMENT_ORDER)
+
+    def correlation(self):
+        return self.moments.correlation()
+
+    def size_sentiment_performance(self):
+        table = self._table('size_sentiment')
+        avg = (table['pnl_sum'] / table['count']).unstack()
+        return avg.reindex(index=SIZE_LABELS, columns=SENTIMENT_ORDER).dropna(how='all')
+
+    def daily_performance(self):
+        """Step 7.3 table, sorted by total PnL (best first)."""
+        table = self._table('day')
+        daily = pd.DataFrame({
+            'sum': table['pnl_sum'],
+            'count': table['count'],
+            'mean': table['pnl_sum'] / table['count'],
+        }).reset_index()
+        return daily.sort_values('sum', ascending=False)
+
+    def account_performance(self):
+        """Step 7.5 table, sorted by total PnL (best first)."""
+        table = self._table('account')
+        account = pd.DataFrame({
+            'Total_PnL': table['pnl_sum'],
+            'Avg_PnL': table['pnl_sum'] / table['count'],
+            'Trade_Count': table['count'],
+        }).round(2)
+        return account.sort_values('Total_PnL', ascending=False)
+
+
+def stream_aggregates(path, fear_greed, chunksize=DEFAULT_CHUNKSIZE,
+                      relative_error=DEFAULT_RELATIVE_ERROR):
+    """Single pass over the trader CSV, returning StreamAggregates."""
+    aggregates = StreamAggregates(relative_error)
+    for rows_read, chunk in iter_merged_chunks(path, fear_greed, chunksize):
+        aggregates.update(chunk, rows_read)
+    return aggregates
+
+
+def scan_targets(chunks, targets, bins):
+    """One median pass over merged chunks.
+
+    Returns, for each target, the histogram of its in-range values (int64
+    counts over target['edges']) or, for targets marked 'collect', the array
+    of in-range values. Results of separate scans merge by adding histograms
+    and concatenating values.
+    """
+    hists = [None if target['collect'] else np.zeros(bins, dtype='int64') for target in targets]
+    collected = [[] for _ in targets]
+    for chunk in chunks:
+        pnl = chunk['Closed PnL'].to_numpy(dtype='float64')
+        labels = chunk['classification'].astype(object).to_numpy()
+        for i, target in enumerate(targets):
+            values = pnl if target['group'] == ALL_TRADES else pnl[labels == target['group']]
+            values = values[(values >= target['lo']) & (values < target['hi'])]
+            if target['collect']:
+                collected[i].append(values)
+            else:
+                idx = np.searchsorted(target['edges'], values, side='right') - 1
+                hists[i] += np.bincount(np.clip(idx, 0, bins - 1), minlength=bins)
+    return [hist if hist is not None else np.concatenate(values or [np.array([])])
+            for hist, values in zip(hists, collected)]
+
+
+def stream_medians(path, fear_greed, aggregates, chunksize=DEFAULT_CHUNKSIZE,
+                   bins=4096, collect_limit=1_000_000, scan=None):
+    """Exact median PnL per sentiment (and for all trades) in extra passes.
+
+    Every pass histograms the values inside each target's current range and
+    narrows the range to the bin holding the target rank. Once a range holds
+    at most `collect_limit` values, the next pass collects them and selects
+    the exact order statistic. Memory stays bounded by bins and collect_limit.
+
+    `scan(targets, bins)` runs one pass and returns scan_targets() results;
+    by default it reads the whole file in chunks (see parallel.py for a
+    partitioned version).
+    """
+    if scan is None:
+        def scan(targets, bins):
+            chunks = (chunk for _, chunk in iter_merged_chunks(path, fear_greed, chunksize))
+            return scan_targets(chunks, targets, bins)
+
+    counts = aggregates._table('sentiment')['count']
+    groups = {label: int(count) for label, count in counts.items()}
+    groups[ALL_TRADES] = int(counts.sum())
+
+    # One target per required order statistic (two for even counts)
+    targets = []
+    for group, n in groups.items():
+        if n == 0:
+            continue
+        if group == ALL_TRADES:
+            lo, hi = aggregates.pnl_min.min(), aggregates.pnl_max.max()
+        else:
+            lo, hi = aggregates.pnl_min[group], aggregates.pnl_max[group]
+        for rank in sorted({(n - 1) // 2, n // 2}):
+            targets.append({
+                'group': group,
+                'rank': rank,          # rank within the current range
+                'lo': float(lo),
+                'hi': float(np.nextafter(hi, np.inf)),
+                'in_range': n,
+                'value': None,
+            })
+
+    while any(target['value'] is None for target in targets):
+        active = [target for target in targets if target['value'] is None]
+        for target in active:
+            target['collect'] = target['in_range'] <= collect_limit
+            if not target['collect']:
+                target['edges'] = np.linspace(target['lo'], target['hi'], bins + 1)
+
+        for target, result in zip(active, scan(active, bins)):
+            if target['collect']:
+                target['value'] = float(np.partition(result, target['rank'])[target['rank']])
+                continue
+            hist = result
+            edges = target.pop('edges')
+            cumulative = np.cumsum(hist)
+            b = int(np.searchsorted(cumulative, target['rank'], side='right'))
+            below = int(cumulative[b - 1]) if b > 0 else 0
+            lo, hi = float(edges[b]), float(edges[b + 1])
+            target['rank'] -= below
+            target['in_range'] = int(hist[b])
+            if np.nextafter(lo, np.inf) >= hi:
+                # Range cannot be split any further: every candidate equals lo
+                target['value'] = lo
+            target['lo'], target['hi'] = lo, hi
+
+    medians = {}
+    for group in groups:
+        values = [target['value'] for target in targets if target['group'] == group]
+        if values:
+            medians[group] = float(np.mean(values))
+    return pd.Series(medians, dtype='float64')
+
+
+def print_report(aggregates, medians=None, approximate=False):
+    """Print the Step 4, 5, 7 and 8 tables from streamed aggregates.
+
+    `approximate` marks `medians` as coming from the quantile sketches.
+    """
+    totals = aggregates.totals()
+    n = aggregates.trade_count
+
+    print("\n4.1 Basic Statistics:")
+    print(f"  Total trades: {n:,}")
+    print(f"  Total PnL: ${totals['pnl_sum']:,.2f}")
+    print(f"  Average PnL per trade: ${totals['pnl_sum'] / n:,.2f}")
+    if medians is not None:
+        approx = f" (±{aggregates.sketches.relative_error:.1%})" if approximate else ""
+        print(f"  Median PnL per trade: ${medians[ALL_TRADES]:,.2f}{approx}")
+    print(f"  Winning trades: {int(totals['wins']):,} ({totals['wins'] / n * 100:.2f}%)")
+    print(f"  Losing trades: {int(totals['losses']):,} ({totals['losses'] / n * 100:.2f}%)")
+
+    print("\n4.2 Sentiment Distribution:")
+    for sentiment, count in aggregates.sentiment_counts().items():
+        print(f"  {sentiment:20s}: {count:6,} trades ({count / n * 100:5.2f}%)")
+
+    print("\n5.1 Performance Metrics by Sentiment:")
+    print(aggregates.performance_by_sentiment(medians))
+
+    print("\n5.2 Win Rate by Sentiment:")
+    for sentiment, win_rate in aggregates.win_rate_by_sentiment().dropna().items():
+        print(f"  {sentiment:20s}: {win_rate:5.2f}%")
+
+    print(f"\n5.3 PnL Percentiles by Sentiment "
+          f"(sketch, ±{aggregates.sketches.relative_error:.1%}):")
+    print(aggregates.sketches.percentile_table().round(2))
+
+    print("\n7.1 Correlation Analysis:")
+    correlation = aggregates.correlation()
+    print("\nCorrelation Matrix:")
+    print(correlation[['Closed PnL']].sort_values('Closed PnL', ascending=False))
+
+    print("\n7.2 Performance by Trade Size Categories:")
+    print(aggregates.size_sentiment_performance().round(2))
+
+    daily_perf = aggregates.daily_performance()
+    print("\n7.3 Top 10 Best Performing Days (by Total PnL):")
+    print(daily_perf.head(10).to_string(index=False))
+    print("\n7.4 Top 10 Worst Performing Days (by Total PnL):")
+    print(daily_perf.tail(10).to_string(index=False))
+
+    print("\n7.5 Top 10 Accounts by Total PnL:")
+    print(aggregates.account_performance().head(10))
+
+    side_avg = aggregates.side_averages()
+    print(f"\n   • BUY trades average: ${side_avg.get('BUY', np.nan):.2f}")
+    print(f"   • SELL trades average: ${side_avg.get('SELL', np.nan):.2f}")
+
+
+def add_median_arguments(parser):
+    """Median and quantile sketch options shared with parallel.py."""
+    parser.add_argument('--no-median', action='store_true',
+                        help="skip the extra passes needed for exact medians")
+    parser.add_argument('--approx-median', action='store_true',
+                        help="take medians from the quantile sketches (no extra passes)")
+    parser.add_argument('--relative-error', type=float, default=DEFAULT_RELATIVE_ERROR,
+                        help="relative error bound of the quantile sketches")
+    parser.add_argument('--sketch-output', help="save the quantile sketches to this JSON file")
+    parser.add_argument('--boxplot', help="render the PnL boxplot from the sketches to this PNG")
+
+
+def save_sketch_outputs(aggregates, args):
+    """Write the sketch file and boxplot requested on the command line."""
+    if args.sketch_output:
+        aggregates.sketches.save(args.sketch_output)
+        print(f"\n[OK] Saved quantile sketches: {args.sketch_output}")
+    if args.boxplot:
+        # Only the boxplot needs matplotlib, so charts is imported here
+        from charts import render_png, draw_pnl_boxplot
+        with open(args.boxplot, 'wb') as f:
+            f.write(render_png(draw_pnl_boxplot, aggregates.sketches.box_stats(), figsize=(14, 6)))
+        print(f"[OK] Saved PnL boxplot from sketches: {args.boxplot}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming sentiment vs trader performance analysis")
+    parser.add_argument('trader_file', nargs='?', default='historical_data.csv')
+    parser.add_argument('--fear-greed', default=FEAR_GREED_FILE)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    add_median_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("STREAMING SENTIMENT vs TRADER PERFORMANCE ANALYSIS")
+    print("=" * 80)
+
+    fear_greed = load_fear_greed(args.fear_greed)
+    aggregates = stream_aggregates(args.trader_file, fear_greed, args.chunksize,
+                                   args.relative_error)
+    print(f"[OK] Streamed {aggregates.rows_read:,} records in chunks of {args.chunksize:,}")
+    print(f"[OK] Final dataset for analysis: {aggregates.trade_count:,} records")
+
+    medians = None
+    if args.approx_median:
+        medians = aggregates.sketches.medians()
+    elif not args.no_median:
+        medians = stream_medians(args.trader_file, fear_greed, aggregates, args.chunksize)
+
+    print_report(aggregates, medians, approximate=args.approx_median)
+    save_sketch_outputs(aggregates, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Shared fixtures: a small synthetic trade file and its merged frame."""
+
+import os
+import pytest
+from benchmark import generate_trades
+from pipeline import load_fear_greed, load_merged_data
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEAR_GREED_PATH = os.path.join(ROOT, 'fear_greed_index.csv')
+
+TRADE_ROWS = 6000
+
+
+@pytest.fixture(scope='session')
+def fear_greed_path():
+    return FEAR_GREED_PATH
+
+
+@pytest.fixture(scope='session')
+def fear_greed():
+    return load_fear_greed(FEAR_GREED_PATH)
+
+
+@pytest.fixture(scope='session')
+def trades_csv(tmp_path_factory):
+    """Synthetic Hyperliquid-shaped CSV with an exact epoch column."""
+    path = str(tmp_path_factory.mktemp('trades') / 'trades.csv')
+    generate_trades(path, TRADE_ROWS, FEAR_GREED_PATH, epoch='exact', seed=3)
+    return path
+
+
+@pytest.fixture(scope='session')
+def merged(trades_csv):
+    merged_data, _ = load_merged_data(trades_csv, FEAR_GREED_PATH, use_cache=False)
+    return merged_data
@@ -0,0 +1,67 @@
+"""Aggregate-cube rollups, merges and correlations against pandas groupbys."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from cube import build_cube, combine_cubes, correlation, rollup
+from pipeline import size_category
+
+KEY_SETS = [['classification'], ['Side'], ['Trade_Size_Category'], ['date'],
+            ['classification', 'Side', 'Trade_Size_Category']]
+
+
+@pytest.fixture(scope='module')
+def cube(merged):
+    return build_cube(merged)
+
+
+def grouped_reference(merged, keys):
+    """Count, Avg/Std PnL, win rate and average size per group, with plain pandas."""
+    frame = merged.assign(Trade_Size_Category=size_category(merged['Size USD']))
+    grouped = frame.groupby(keys, observed=True)
+    pnl = grouped['Closed PnL']
+    return pd.DataFrame({
+        'count': pnl.size(),
+        'pnl_sum': pnl.sum(),
+        'Avg_PnL': pnl.mean(),
+        'Std_PnL': pnl.std(),
+        'Win_Rate': (frame['Closed PnL'] > 0).groupby([frame[key] for key in keys], observed=True).mean() * 100,
+        'Avg_Trade_Size': grouped['Size USD'].mean(),
+    })
+
+
+@pytest.mark.parametrize('keys', KEY_SETS)
+def test_rollup_matches_groupby(merged, cube, keys):
+    expected = grouped_reference(merged, keys)
+    table = rollup(cube, keys)[expected.columns]
+    pd.testing.assert_frame_equal(table, expected, check_dtype=False, rtol=1e-9,
+                                  check_categorical=False, check_index_type=False)
+
+
+def test_total_rollup(merged, cube):
+    totals = rollup(cube, [])
+    pnl = merged['Closed PnL']
+    assert totals['count'] == len(merged)
+    assert totals['Avg_PnL'] == pytest.approx(pnl.mean())
+    assert totals['Std_PnL'] == pytest.approx(pnl.std())
+    assert totals['Win_Rate'] == pytest.approx((pnl > 0).mean() * 100)
+
+
+def test_combined_halves_equal_the_whole(merged, cube):
+    half = len(merged) // 2
+    combined = combine_cubes(build_cube(merged.iloc[:half]), None, build_cube(merged.iloc[half:]))
+    assert combined['count'].sum() == len(merged)
+    for keys in KEY_SETS:
+        pd.testing.assert_frame_equal(rollup(combined, keys), rollup(cube, keys), rtol=1e-9)
+
+
+def test_std_survives_a_large_offset(merged):
+    shifted = merged.assign(**{'Closed PnL': merged['Closed PnL'] + 1e7})
+    expected = shifted.groupby('classification', observed=True)['Closed PnL'].std()
+    std = rollup(build_cube(shifted), ['classification'])['Std_PnL']
+    np.testing.assert_allclose(std.loc[expected.index], expected, rtol=1e-6)
+
+
+def test_correlation_matches_pandas(merged, cube):
+    expected = merged[['Closed PnL', 'value', 'sentiment_score', 'Size USD']].corr()
+    pd.testing.assert_frame_equal(correlation(cube), expected, rtol=1e-9)
@@ -0,0 +1,53 @@
+"""Lag gathers against one pandas merge per lag."""
+
+import pandas as pd
+import pytest
+from lags import lag_profile
+from pipeline import SENTIMENT_ORDER, SentimentLookup
+from rolling import daily_pnl
+
+LAGS = [-14, -3, -1, 0, 1, 7, 60]
+
+
+@pytest.fixture(scope='module')
+def profiles(merged, fear_greed):
+    return lag_profile(daily_pnl(merged), SentimentLookup(fear_greed), max_lag=60, max_lead=14)
+
+
+def lagged(merged, fear_greed, lag):
+    """Trades paired with the reading `lag` days before their own day."""
+    trades = merged[['date', 'Closed PnL']].assign(source=merged['date'] - pd.Timedelta(days=lag))
+    readings = fear_greed[['date', 'value', 'classification']].rename(columns={'date': 'source'})
+    return trades.merge(readings, on='source', how='inner')
+
+
+@pytest.mark.parametrize('lag', LAGS)
+def test_profile_matches_merge(merged, fear_greed, profiles, lag):
+    profile, buckets = profiles
+    paired = lagged(merged, fear_greed, lag)
+    pnl = paired['Closed PnL']
+    row = profile.loc[lag]
+    assert row['Trade_Count'] == len(paired)
+    assert row['Value_PnL_Corr'] == pytest.approx(paired['value'].corr(pnl), rel=1e-7)
+    assert row['Win_Rate'] == pytest.approx((pnl > 0).mean() * 100)
+    assert row['Avg_PnL'] == pytest.approx(pnl.mean())
+
+    grouped = paired.groupby(paired['classification'].astype(object))['Closed PnL']
+    table = buckets.loc[lag]
+    for sentiment in SENTIMENT_ORDER:
+        if sentiment not in grouped.groups:
+            assert table.loc[sentiment, 'Trade_Count'] == 0
+            continue
+        bucket = grouped.get_group(sentiment)
+        assert table.loc[sentiment, 'Trade_Count'] == len(bucket)
+        assert table.loc[sentiment, 'Win_Rate'] == pytest.approx((bucket > 0).mean() * 100)
+        assert table.loc[sentiment, 'Avg_PnL'] == pytest.approx(bucket.mean())
+
+
+def test_readings_outside_the_index_are_unpaired(merged, fear_greed):
+    # Trades whose lagged day falls before the first reading stay unpaired
+    later = fear_greed[fear_greed['date'] >= merged['date'].median()]
+    profile, _ = lag_profile(daily_pnl(merged), SentimentLookup(later), max_lag=3, max_lead=3)
+    for lag in profile.index:
+        source = merged['date'] - pd.Timedelta(days=lag)
+        assert profile.loc[lag, 'Trade_Count'] == source.isin(later['date']).sum()
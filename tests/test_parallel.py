@@ -0,0 +1,48 @@
+"""Partitioned aggregates against the single-process stream of the same file."""
+
+import pandas as pd
+import pytest
+import parallel
+import streaming
+
+PARTITION_MB = 0.2
+
+
+@pytest.fixture(scope='module')
+def streamed(trades_csv, fear_greed):
+    aggregates = streaming.stream_aggregates(trades_csv, fear_greed, chunksize=1000)
+    medians = streaming.stream_medians(trades_csv, fear_greed, aggregates, chunksize=1000,
+                                       bins=16, collect_limit=100)
+    return aggregates, medians
+
+
+def assert_same_aggregates(left, right):
+    assert left.rows_read == right.rows_read
+    for name in streaming.TABLE_KEYS:
+        pd.testing.assert_frame_equal(left.tables[name].sort_index(), right.tables[name].sort_index(),
+                                      check_exact=False, rtol=1e-9, atol=1e-6)
+    pd.testing.assert_frame_equal(left.correlation(), right.correlation(), check_exact=False, rtol=1e-9)
+    pd.testing.assert_series_equal(left.pnl_min.sort_index(), right.pnl_min.sort_index())
+    pd.testing.assert_series_equal(left.pnl_max.sort_index(), right.pnl_max.sort_index())
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parallel_matches_stream_aggregates(trades_csv, fear_greed, streamed, workers):
+    with parallel.PartitionRunner(trades_csv, fear_greed, workers, PARTITION_MB) as runner:
+        assert len(runner.partitions) > 1
+        aggregates = runner.aggregates()
+        medians = streaming.stream_medians(trades_csv, fear_greed, aggregates, bins=16,
+                                           collect_limit=100, scan=runner.scan)
+    expected_aggregates, expected_medians = streamed
+    assert_same_aggregates(aggregates, expected_aggregates)
+    pd.testing.assert_series_equal(medians.sort_index(), expected_medians.sort_index())
+
+
+def test_partitions_cover_every_row(trades_csv):
+    ranges = parallel.split_csv(trades_csv, PARTITION_MB)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    with open(trades_csv, 'rb') as f:
+        header = len(f.readline())
+        size = len(f.read()) + header
+    assert ranges[0][0] == header and ranges[-1][1] == size
+
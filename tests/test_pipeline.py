@@ -0,0 +1,77 @@
+"""Timestamp parsing, the epoch fast path and SentimentLookup against plain pandas."""
+
+import numpy as np
+import pandas as pd
+import pipeline
+from pipeline import NAT, TIMESTAMP_FORMAT
+
+
+def reference_ns(text):
+    """pd.to_datetime of "DD-MM-YYYY HH:MM" text as int64 nanoseconds (NAT if invalid)."""
+    parsed = pd.to_datetime(pd.Series(text, dtype=object), format=TIMESTAMP_FORMAT, errors='coerce')
+    return parsed.to_numpy(dtype='M8[ns]').astype('int64')
+
+
+def test_parse_timestamp_text_matches_to_datetime():
+    rng = np.random.default_rng(0)
+    stamps = pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 4 * 10 ** 6, 2000), unit='min')
+    text = list(stamps.strftime(TIMESTAMP_FORMAT))
+    # Unpadded, impossible and malformed values, which the slow path handles
+    text += ['1-2-2024 3:04', '29-02-2024 23:59', '29-02-2023 10:00', '31-04-2024 10:00',
+             '00-01-2024 10:00', '01-13-2024 10:00', '01-01-2024 24:00', '01/01/2024 10:00',
+             'not a timestamp', None, np.nan]
+    np.testing.assert_array_equal(pipeline.parse_timestamp_text(text), reference_ns(text))
+
+
+def test_parse_timestamp_text_of_empty_column():
+    assert (pipeline.parse_timestamp_text(pd.Series([np.nan, np.nan])) == NAT).all()
+
+
+def test_epoch_fast_path_matches_text(trades_csv):
+    raw = pipeline.load_trader_data(trades_csv)
+    expected = reference_ns(raw['Timestamp IST'])
+    summary = pipeline.normalize_timestamps(raw)
+    assert summary == {'source': 'epoch', 'failed': 0}
+    ns = raw['Timestamp IST'].to_numpy().astype('int64')
+    # The epoch carries seconds the text drops
+    np.testing.assert_array_equal(ns // pipeline.NS_PER_MINUTE, expected // pipeline.NS_PER_MINUTE)
+    np.testing.assert_array_equal(raw['date'].to_numpy(), raw['Timestamp IST'].dt.normalize().to_numpy())
+
+
+def test_rounded_epoch_falls_back_to_text():
+    text = ['01-03-2024 10:15', '02-03-2024 11:45', '03-03-2024 09:00']
+    ist = reference_ns(text)
+    epoch_ms = (ist - pipeline.IST_OFFSET_NS) // 10 ** 6
+    frame = pd.DataFrame({'Timestamp IST': text, 'Timestamp': np.round(epoch_ms, -10).astype('float64')})
+    assert pipeline.normalize_timestamps(frame)['source'] == 'text'
+    np.testing.assert_array_equal(frame['Timestamp IST'].to_numpy().astype('int64'), ist)
+
+
+def test_missing_epochs_are_filled_from_text():
+    text = ['01-03-2024 10:15', '02-03-2024 11:45', '03-03-2024 09:00', 'bad']
+    ist = reference_ns(text)
+    epoch_ms = np.where(ist == NAT, 0, (ist - pipeline.IST_OFFSET_NS) // 10 ** 6).astype('float64')
+    epoch_ms[[1, 3]] = np.nan
+    frame = pd.DataFrame({'Timestamp IST': text, 'Timestamp': epoch_ms})
+    summary = pipeline.normalize_timestamps(frame)
+    assert summary == {'source': 'epoch', 'failed': 1}
+    np.testing.assert_array_equal(frame['Timestamp IST'].to_numpy().astype('int64'), ist)
+
+
+def test_merge_sentiment_matches_pandas_merge(trades_csv, fear_greed, merged):
+    trades = pipeline.clean_trader_data(pipeline.load_trader_data(trades_csv))
+    expected = trades.merge(fear_greed[['date', 'value', 'classification', 'sentiment_score']],
+                            on='date', how='inner', sort=False)
+    assert len(merged) == len(expected)
+    columns = ['Timestamp IST', 'Closed PnL', 'value', 'sentiment_score']
+    pd.testing.assert_frame_equal(merged[columns], expected[columns], check_dtype=False)
+    assert (merged['classification'].astype(object) == expected['classification'].astype(object)).all()
+
+
+def test_sentiment_lookup_outside_the_index(fear_greed):
+    lookup = pipeline.SentimentLookup(fear_greed)
+    first, last = fear_greed['date'].min(), fear_greed['date'].max()
+    dates = pd.Series([first - pd.Timedelta(days=1), first, last, last + pd.Timedelta(days=1), pd.NaT])
+    ordinal = lookup.day_ordinal(dates)
+    np.testing.assert_array_equal(lookup.matches(ordinal), [False, True, True, False, False])
+    assert lookup.value[ordinal[1]] == fear_greed['value'].iloc[0]
@@ -0,0 +1,79 @@
+"""Running-total window metrics against trades re-selected window by window."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from rolling import MIN_DAYS, PERIODS_PER_YEAR, WINDOWS, daily_pnl, rolling_metrics
+
+
+def naive_window(trades, day, window):
+    """ROLLING_COLUMNS of the trades in the `window` days ending on `day`."""
+    inside = trades[(trades['date'] > day - pd.Timedelta(days=window)) & (trades['date'] <= day)]
+    pnl = inside['Closed PnL']
+    per_day = inside.groupby('date').agg(pnl=('Closed PnL', 'sum'), value=('value', 'first'))
+    days = len(per_day)
+    day_std = per_day['pnl'].std()
+    enough = days >= MIN_DAYS
+    # A window over which the index never moves has no correlation
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = per_day['value'].corr(per_day['pnl']) if enough else np.nan
+    return {
+        'trades': len(inside),
+        'days': days,
+        'total_pnl': pnl.sum(),
+        'win_rate': (pnl > 0).mean() * 100 if len(pnl) else np.nan,
+        'avg_pnl': pnl.mean(),
+        'std_pnl': pnl.std(),
+        'sharpe': per_day['pnl'].mean() / day_std * np.sqrt(PERIODS_PER_YEAR)
+                  if enough and day_std > 0 else np.nan,
+        'value_pnl_corr': corr,
+    }
+
+
+def assert_row_matches(row, expected):
+    for column, value in expected.items():
+        assert row[column] == pytest.approx(value, rel=1e-7, abs=1e-6, nan_ok=True), column
+
+
+@pytest.fixture(scope='module')
+def daily(merged):
+    return daily_pnl(merged)
+
+
+def test_daily_pnl_matches_groupby(merged, daily):
+    grouped = merged.groupby(['Account', 'date'], observed=True)['Closed PnL']
+    expected = pd.DataFrame({'count': grouped.size(), 'pnl_sum': grouped.sum(),
+                             'wins': grouped.apply(lambda pnl: (pnl > 0).sum())})
+    table = daily.set_index(['Account', 'date'])[expected.columns]
+    pd.testing.assert_frame_equal(table.sort_index(), expected.sort_index(), check_dtype=False,
+                                  check_index_type=False, check_categorical=False)
+    # Summing a daily table again leaves it unchanged
+    pd.testing.assert_frame_equal(daily_pnl(daily), daily)
+
+
+def test_global_windows_match_naive(merged, daily):
+    rolling = rolling_metrics(daily)
+    dates = pd.date_range(merged['date'].min(), merged['date'].max())
+    assert len(rolling) == len(dates) * len(WINDOWS)
+    rng = np.random.default_rng(1)
+    sample = list(dates[:2]) + list(dates[rng.choice(len(dates), 25, replace=False)]) + [dates[-1]]
+    indexed = rolling.set_index(['date', 'window'])
+    for window in WINDOWS:
+        for day in sample:
+            assert_row_matches(indexed.loc[(day, window)], naive_window(merged, day, window))
+
+
+def test_account_windows_match_naive(merged, daily):
+    rolling = rolling_metrics(daily, windows=[7, 30], by_account=True)
+    accounts = merged['Account'].value_counts().index[[0, 5, -1]]
+    for account in accounts:
+        trades = merged[merged['Account'] == account]
+        rows = rolling[rolling['Account'] == account]
+        assert set(rows['date']) == set(trades['date'])
+        for row in rows.iloc[::max(1, len(rows) // 20)].itertuples(index=False):
+            assert_row_matches(row._asdict(), naive_window(trades, row.date, row.window))
+
+
+def test_empty_daily_table():
+    rolling = rolling_metrics(daily_pnl(pd.DataFrame(columns=['Account', 'date', 'value', 'Closed PnL'])))
+    assert rolling.empty
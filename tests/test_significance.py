@@ -0,0 +1,72 @@
+"""Permutation tests against a naive label-shuffle reference."""
+
+import numpy as np
+import significance
+
+LABELS = ['Low', 'Mid', 'High']
+
+
+def sample_trades(seed=7):
+    rng = np.random.default_rng(seed)
+    sizes, shifts = [60, 45, 80], [0.0, 0.4, 1.2]
+    values = np.concatenate([rng.normal(shift, 2.0, size) for size, shift in zip(sizes, shifts)])
+    codes = np.repeat(np.arange(len(sizes)), sizes)
+    return values, codes
+
+
+def naive_pvalues(values, codes, a, b, n_permutations, seed):
+    """Two-sided p-values of mean and win-rate differences by shuffling pooled labels."""
+    rng = np.random.default_rng(seed)
+    pool = np.concatenate([values[codes == a], values[codes == b]])
+    is_a = np.arange(len(pool)) < np.count_nonzero(codes == a)
+
+    def differences(labels):
+        return np.array([pool[labels].mean() - pool[~labels].mean(),
+                         ((pool[labels] > 0).mean() - (pool[~labels] > 0).mean()) * 100])
+
+    observed = np.abs(differences(is_a))
+    extreme = np.zeros(2)
+    for _ in range(n_permutations):
+        extreme += np.abs(differences(rng.permutation(is_a))) >= observed * (1 - 1e-9)
+    return (1 + extreme) / (1 + n_permutations)
+
+
+def test_permutation_pvalues_match_label_shuffle():
+    values, codes = sample_trades()
+    n_permutations = 2000
+    table = significance.permutation_tests(values, codes, LABELS, n_permutations=n_permutations, seed=1)
+    pvalues = table['P_Value'].unstack('Metric')[significance.TEST_METRICS]
+    for a, b in [(0, 1), (0, 2), (1, 2)]:
+        expected = naive_pvalues(values, codes, a, b, n_permutations, seed=2)
+        got = pvalues.loc[(LABELS[a], LABELS[b])].to_numpy()
+        # Both are Monte Carlo estimates; their standard error is below 0.012
+        np.testing.assert_allclose(got, expected, atol=0.05)
+
+
+def test_permutation_observed_differences():
+    values, codes = sample_trades()
+    table = significance.permutation_tests(values, codes, LABELS, n_permutations=100, seed=1)
+    low, high = values[codes == 0], values[codes == 2]
+    assert np.isclose(table.loc[('Low', 'High', 'Avg_PnL'), 'Difference'], low.mean() - high.mean())
+
+
+def test_subset_sums_are_uniform():
+    # Powers of two identify the subset from its sum
+    values = np.array([1.0, 2.0, 4.0, 8.0, 16.0])
+    rng = np.random.default_rng(3)
+    sizes = rng.integers(0, 6, (60000, 2))
+    sums = significance._subset_sums(values, sizes, rng)
+    for j, subsets in [(1, 5), (2, 10), (3, 10), (4, 5)]:
+        picked = sums[sizes[:, 0] == j, 0, 0]
+        counts = np.unique(picked, return_counts=True)[1]
+        assert len(counts) == subsets
+        expected = len(picked) / subsets
+        assert np.all(np.abs(counts - expected) < 5 * np.sqrt(expected))
+        assert np.array_equal(sums[sizes[:, 0] == j, 0, 1], np.full(len(picked), j))
+
+
+def test_empty_group_gives_nan():
+    values, codes = sample_trades()
+    table = significance.permutation_tests(values, codes, LABELS + ['Empty'], n_permutations=50, seed=1)
+    pvalues = table['P_Value'].unstack('Metric')
+    assert pvalues.loc[('Low', 'Empty')].isna().all()
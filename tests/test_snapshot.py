@@ -0,0 +1,65 @@
+"""Memory-mapped snapshot frames: contents and zero-copy column buffers."""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import snapshot
+
+pytestmark = pytest.mark.skipif(not snapshot.HAS_PYARROW, reason="snapshots need pyarrow")
+
+
+def sample_frame(rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    size = rng.lognormal(6, 1, rows)
+    size[::7] = np.nan
+    stamps = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 10 ** 6, rows), unit='min'))
+    stamps[::11] = pd.NaT
+    return pd.DataFrame({
+        'Account': pd.Categorical(rng.choice(['0xaa', '0xbb', '0xcc'], rows)),
+        'Side': pd.Categorical(rng.choice(['BUY', 'SELL'], rows)),
+        'Size USD': size,
+        'Fee': rng.normal(0, 1, rows).astype('float32'),
+        'Timestamp IST': stamps.to_numpy(),
+        'date': stamps.dt.normalize().fillna(pd.Timestamp('2024-01-01')).to_numpy(),
+        'value': rng.integers(0, 100, rows).astype('int16'),
+    })
+
+
+def mapped_ranges(path):
+    """Address ranges of this process's mappings of `path`."""
+    ranges = []
+    with open('/proc/self/maps') as f:
+        for line in f:
+            if line.rstrip().endswith(os.path.realpath(path)):
+                lo, hi = (int(address, 16) for address in line.split()[0].split('-'))
+                ranges.append((lo, hi))
+    return ranges
+
+
+def column_buffers(series):
+    """(address, bytes) of the arrays holding a column's values."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        arrays = [series.array.codes]
+    else:
+        arrays = [series.to_numpy()]
+    return [(array.__array_interface__['data'][0], array.nbytes) for array in arrays if array.nbytes]
+
+
+def test_map_frame_round_trip(tmp_path):
+    frame = sample_frame()
+    path = str(tmp_path / 'frame.arrow')
+    snapshot.write_frame(frame, path)
+    pd.testing.assert_frame_equal(snapshot.map_frame(path), frame)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason="needs /proc/self/maps")
+def test_mapped_columns_lie_inside_the_file(tmp_path):
+    path = str(tmp_path / 'frame.arrow')
+    snapshot.write_frame(sample_frame(), path)
+    mapped = snapshot.map_frame(path)
+    ranges = mapped_ranges(path)
+    assert ranges
+    for column in mapped.columns:
+        for address, size in column_buffers(mapped[column]):
+            assert any(lo <= address and address + size <= hi for lo, hi in ranges), column
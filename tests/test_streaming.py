@@ -0,0 +1,103 @@
+"""Streamed aggregates, histogram-narrowing medians and quantile sketches against pandas."""
+
+import numpy as np
+import pandas as pd
+import pytest
+import streaming
+from pipeline import SENTIMENT_ORDER
+from quantiles import ALL_TRADES, GroupSketches, QuantileSketch, exact_percentile_table
+from metrics import group_codes
+
+
+@pytest.fixture(scope='module')
+def aggregates(trades_csv, fear_greed):
+    return streaming.stream_aggregates(trades_csv, fear_greed, chunksize=700)
+
+
+def test_performance_by_sentiment_matches_pandas(merged, aggregates):
+    grouped = merged.groupby('classification', observed=True)
+    pnl = grouped['Closed PnL']
+    expected = pd.DataFrame({
+        'Trade_Count': pnl.size(),
+        'Total_PnL': pnl.sum(),
+        'Avg_PnL': pnl.mean(),
+        'Std_PnL': pnl.std(),
+        'Avg_Trade_Size': grouped['Size USD'].mean(),
+    }).round(2)
+    table = aggregates.performance_by_sentiment().loc[expected.index]
+    pd.testing.assert_frame_equal(table[expected.columns], expected, check_dtype=False,
+                                  check_index_type=False, check_categorical=False)
+    win_rate = ((merged['Closed PnL'] > 0).groupby(merged['classification'], observed=True).mean() * 100).round(2)
+    pd.testing.assert_series_equal(aggregates.win_rate_by_sentiment().loc[win_rate.index], win_rate,
+                                   check_names=False, check_index_type=False, check_categorical=False)
+
+
+def test_tables_match_pandas(merged, aggregates):
+    daily = merged.groupby(['date', 'classification'], observed=True)['Closed PnL'].agg(['sum', 'count', 'mean'])
+    daily = daily.reset_index().astype({'classification': str}).sort_values(['date', 'classification'])
+    streamed = aggregates.daily_performance().astype({'classification': str})
+    streamed = streamed.sort_values(['date', 'classification'])
+    pd.testing.assert_frame_equal(streamed.reset_index(drop=True), daily.reset_index(drop=True),
+                                  check_dtype=False)
+
+    sides = merged.groupby('Side', observed=True)['Closed PnL'].mean()
+    for side, mean in sides.items():
+        assert aggregates.side_averages()[side] == pytest.approx(mean)
+
+    accounts = merged.groupby('Account', observed=True)['Closed PnL'].sum().round(2)
+    streamed = aggregates.account_performance()['Total_PnL']
+    assert streamed.sort_index().to_dict() == pytest.approx(accounts.sort_index().to_dict())
+
+    pd.testing.assert_frame_equal(aggregates.correlation(), merged[streaming.CORR_COLUMNS].corr(),
+                                  check_exact=False, rtol=1e-9)
+
+
+def test_variance_merge_survives_a_large_offset(merged):
+    shifted = merged.assign(**{'Closed PnL': merged['Closed PnL'] + 1e8})
+    aggregates = streaming.StreamAggregates()
+    for start in range(0, len(shifted), 500):
+        aggregates.update(shifted.iloc[start:start + 500])
+    std = aggregates.performance_by_sentiment()['Std_PnL'].dropna()
+    expected = shifted.groupby('classification', observed=True)['Closed PnL'].std().round(2)
+    np.testing.assert_allclose(std.loc[expected.index], expected, atol=0.01)
+
+
+@pytest.mark.parametrize('bins, collect_limit', [(4096, 1_000_000), (8, 50), (2, 1)])
+def test_stream_medians_are_exact(trades_csv, fear_greed, merged, aggregates, bins, collect_limit):
+    medians = streaming.stream_medians(trades_csv, fear_greed, aggregates, chunksize=700,
+                                       bins=bins, collect_limit=collect_limit)
+    expected = merged.groupby('classification', observed=True)['Closed PnL'].median()
+    for sentiment, median in expected.items():
+        assert medians[sentiment] == median
+    assert medians[ALL_TRADES] == merged['Closed PnL'].median()
+
+
+def test_sketch_quantiles_within_relative_error():
+    rng = np.random.default_rng(5)
+    values = np.concatenate([rng.standard_t(3, 5000) * 150, [0.0, 1e-6, -2.5e4, 3e5]])
+    sketch = QuantileSketch(relative_error=0.01).update(values)
+    qs = np.linspace(0, 1, 41)
+    ordered = np.sort(values)
+    expected = ordered[np.floor(qs * (len(values) - 1)).astype(int)]
+    approx = sketch.quantiles(qs)
+    small = np.abs(expected) < sketch.min_value
+    np.testing.assert_allclose(approx[~small], expected[~small], rtol=0.01 + 1e-12)
+    assert (np.abs(approx[small]) < sketch.min_value).all()
+    assert sketch.quantile(0) == values.min() and sketch.quantile(1) == values.max()
+
+
+def test_sketches_merge_and_serialize(merged):
+    pnl = merged['Closed PnL'].to_numpy(dtype='float64')
+    codes = group_codes(merged['classification'], SENTIMENT_ORDER)
+    whole = GroupSketches(SENTIMENT_ORDER).update(pnl, codes)
+    half = len(pnl) // 2
+    parts = GroupSketches(SENTIMENT_ORDER).update(pnl[half:], codes[half:])
+    parts.merge(GroupSketches(SENTIMENT_ORDER).update(pnl[:half], codes[:half]))
+    pd.testing.assert_frame_equal(parts.percentile_table(), whole.percentile_table())
+
+    restored = GroupSketches.from_json(whole.to_json())
+    pd.testing.assert_frame_equal(restored.percentile_table(), whole.percentile_table())
+
+    exact = exact_percentile_table(pnl, codes, SENTIMENT_ORDER)
+    approx = whole.percentile_table().loc[exact.index]
+    assert (np.abs(approx - exact) <= np.abs(exact) * 0.02 + 1.0).all().all()
@@ -0,0 +1,84 @@
+"""Bitmap index slices against plain pandas boolean masks."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from cube import build_cube
+from pipeline import size_category
+from trade_index import FrameIndex, make_filters
+
+
+@pytest.fixture(scope='module')
+def index(merged):
+    return FrameIndex(merged)
+
+
+def reference(frame, start, end, selections):
+    """Rows of `frame` on the days in [start, end] matching `selections`, in date order."""
+    frame = frame.sort_values('date', kind='stable')
+    keep = pd.Series(True, index=frame.index)
+    if start is not None:
+        keep &= frame['date'] >= pd.Timestamp(start).normalize()
+    if end is not None:
+        keep &= frame['date'] <= pd.Timestamp(end).normalize()
+    for column, labels in selections.items():
+        if not labels:
+            continue
+        if column == 'Trade_Size_Category' and column not in frame.columns:
+            values = size_category(frame['Size USD'])
+        else:
+            values = frame[column]
+        keep &= values.astype(object).isin(labels)
+    return frame[keep].reset_index(drop=True)
+
+
+def selections_for(frame):
+    accounts = list(frame['Account'].astype(object).unique()[:3]) if 'Account' in frame.columns else []
+    return [
+        {},
+        {'classification': ['Fear']},
+        {'classification': ['Extreme Fear', 'Greed'], 'Side': ['SELL']},
+        {'Side': ['BUY', 'SELL'], 'Trade_Size_Category': ['< $100', '$1K-$5K']},
+        {'Account': accounts},
+        {'Account': accounts[:1] + ['no such account'], 'Side': ['BUY']},
+    ]
+
+
+def date_ranges(frame):
+    days = np.sort(frame['date'].unique())
+    return [(None, None), (days[1], None), (None, days[-3]),
+            (days[len(days) // 3], days[len(days) // 3]),
+            (days[5] + np.timedelta64(12, 'h'), days[40]),
+            (days[-1] + np.timedelta64(1, 'D'), None)]
+
+
+def test_select_matches_boolean_masks(merged, index):
+    for start, end in date_ranges(merged):
+        for selections in selections_for(merged):
+            selected = index.select(start, end, make_filters(**selections))
+            expected = reference(merged, start, end, selections)
+            assert len(selected) == len(expected), (start, end, selections)
+            pd.testing.assert_frame_equal(selected, expected, check_categorical=False)
+
+
+def test_cube_cells_use_the_same_index(merged):
+    cube = build_cube(merged)
+    cube_index = FrameIndex(cube)
+    for start, end in date_ranges(cube):
+        for selections in selections_for(cube)[:4]:
+            selected = cube_index.select(start, end, make_filters(**selections))
+            expected = reference(cube, start, end, selections)
+            pd.testing.assert_frame_equal(selected, expected, check_categorical=False)
+
+
+def test_from_arrays_round_trip(merged, index):
+    restored = FrameIndex.from_arrays(index.frame, index.arrays())
+    filters = make_filters(classification=['Greed', 'Neutral'], Side=['BUY'])
+    start, end = date_ranges(merged)[4]
+    pd.testing.assert_frame_equal(restored.select(start, end, filters), index.select(start, end, filters))
+    pd.testing.assert_series_equal(restored.account_counts(), index.account_counts())
+    assert index.account_counts().sum() == len(merged)
+
+
+def test_everything_selected_is_no_filter():
+    assert make_filters(Side=['SELL', 'BUY'], classification=[], Account=None) == ()
@@ -0,0 +1,86 @@
+"""Trade-store dedup, pending trades and reads against the one-shot pipeline."""
+
+import pandas as pd
+import pytest
+from cube import build_cube, rollup
+from pipeline import filter_dates
+from trade_store import TradeStore
+
+SORT_KEYS = ['Timestamp IST', 'Account', 'Closed PnL', 'Size USD']
+
+
+def write_batch(path, lines, header):
+    path.write_text(header + ''.join(lines))
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def batches(trades_csv, tmp_path_factory):
+    """Two overlapping batches of the synthetic export, and their overlap size."""
+    with open(trades_csv) as f:
+        header, *lines = f.readlines()
+    folder = tmp_path_factory.mktemp('batches')
+    split, overlap = len(lines) * 2 // 3, len(lines) // 6
+    first = write_batch(folder / 'first.csv', lines[:split], header)
+    second = write_batch(folder / 'second.csv', lines[split - overlap:], header)
+    return first, second, overlap
+
+
+def in_order(trades):
+    return trades.sort_values(SORT_KEYS, kind='stable').reset_index(drop=True)
+
+
+def assert_same_trades(stored, expected):
+    pd.testing.assert_frame_equal(in_order(stored), in_order(expected[stored.columns]),
+                                  check_dtype=False, check_categorical=False)
+
+
+def test_overlapping_batches_are_deduplicated(tmp_path, batches, fear_greed, merged):
+    first, second, overlap = batches
+    store = TradeStore(str(tmp_path / 'store'))
+    one = store.ingest(first, fear_greed)
+    two = store.ingest(second, fear_greed)
+    assert one['duplicates'] == 0
+    assert two['duplicates'] == overlap
+    assert one['new_fills'] + two['new_fills'] == one['rows_read'] + two['rows_read'] - overlap
+    assert one['stored'] + two['stored'] == len(merged)
+
+    again = store.ingest(second, fear_greed)
+    assert again['new_fills'] == 0 and again['stored'] == 0
+    assert again['duplicates'] == again['rows_read']
+    assert store.manifest()['rows'] == len(merged)
+    assert_same_trades(store.load_trades(), merged)
+
+
+def test_pending_trades_are_tagged_once_the_index_covers_them(tmp_path, trades_csv, fear_greed, merged):
+    cutoff = merged['date'].quantile(0.7).normalize()
+    store = TradeStore(str(tmp_path / 'store'))
+    early = store.ingest(trades_csv, fear_greed[fear_greed['date'] <= cutoff])
+    waiting = int((merged['date'] > cutoff).sum())
+    assert waiting > 0
+    assert early['pending'] == waiting
+    assert early['stored'] == len(merged) - waiting
+    assert store.date_range()[1] <= cutoff
+
+    # Re-ingesting the same export adds no fills but tags the pending ones
+    later = store.ingest(trades_csv, fear_greed)
+    assert later['new_fills'] == 0
+    assert later['pending'] == 0 and later['stored'] == waiting
+    assert_same_trades(store.load_trades(), merged)
+
+
+def test_reads_match_the_pipeline(tmp_path, trades_csv, fear_greed, merged):
+    store = TradeStore(str(tmp_path / 'store'))
+    store.ingest(trades_csv, fear_greed)
+    days = merged['date'].sort_values().unique()
+    columns = ['Account', 'Timestamp IST', 'Closed PnL', 'Size USD', 'date', 'classification']
+    for start, end in [(days[10], days[-10]), (days[0], days[0]), (None, days[len(days) // 2]),
+                       (days[-1] + pd.Timedelta(days=1), None)]:
+        trades = store.load_trades(columns, start, end)
+        assert_same_trades(trades, filter_dates(merged, start, end))
+
+    stored, built = store.load_cube(), build_cube(merged)
+    pd.testing.assert_series_equal(rollup(stored, []), rollup(built, []), rtol=1e-9)
+    for keys in [['classification'], ['date', 'Side']]:
+        pd.testing.assert_frame_equal(rollup(stored, keys), rollup(built, keys), rtol=1e-9,
+                                      check_categorical=False)
@@ -0,0 +1,189 @@
+"""
+Trade Index
+===========
+Precomputed indexes behind the dashboard's sidebar filters (date range,
+sentiment, side, size bucket and accounts), so a filter change selects rows
+without masking a whole DataFrame column by column.
+
+Rows are sorted by day once, so a date range is two binary searches giving
+a contiguous slice. Each low-cardinality column (sentiment, side, size
+bucket) keeps one packed bitmap per category; a selection ORs the bitmaps
+of the chosen categories, ANDs across columns and only touches the bytes
+covering the date slice. Accounts are too many for a bitmap each and are
+matched through a lookup table over integer account codes.
+
+Aggregate-cube cells carry the same sentiment, side and size columns as
+trades, so the same index serves both; the cube has no accounts, and an
+account filter only applies to trades.
+
+Usage:
+    python trade_index.py --sentiment "Extreme Fear" --side BUY --start 2024-01-01
+"""
+
+import argparse
+import time
+from functools import reduce
+import numpy as np
+import pandas as pd
+from pipeline import SENTIMENT_ORDER, SIZE_LABELS, find_trader_file, load_merged_data, size_category
+from metrics import compute_metrics, group_codes
+
+SIDES = ['BUY', 'SELL']
+
+# Bitmap-indexed columns and their categories
+BITMAP_COLUMNS = {
+    'classification': SENTIMENT_ORDER,
+    'Side': SIDES,
+    'Trade_Size_Category': SIZE_LABELS,
+}
+
+ACCOUNT_COLUMN = 'Account'
+
+
+def day_number(day):
+    """Days since the epoch of a date or timestamp."""
+    return int(pd.Timestamp(day).to_datetime64().astype('datetime64[D]').astype('int64'))
+
+
+def make_filters(**selections):
+    """Hashable filter spec: sorted (column, labels) pairs.
+
+    Columns whose selection is empty or None, or lists every category, are
+    left out, so "everything selected" and "nothing selected" both mean no
+    filter and the spec is empty.
+    """
+    filters = []
+    for column, labels in selections.items():
+        if not labels:
+            continue
+        if column in BITMAP_COLUMNS and set(labels) >= set(BITMAP_COLUMNS[column]):
+            continue
+        filters.append((column, tuple(sorted(labels))))
+    return tuple(sorted(filters))
+
+
+class FrameIndex:
+    """Date-sorted rows of a trade or cube frame with filter bitmaps."""
+
+    def __init__(self, frame, date_column='date'):
+        days = frame[date_column].to_numpy(dtype='datetime64[D]').astype('int64')
+        if len(days) and (np.diff(days) < 0).any():
+            order = np.argsort(days, kind='stable')
+            frame, days = frame.take(order), days[order]
+        self.frame = frame.reset_index(drop=True)
+        self.days = days
+
+        self.bitmaps = {}
+        for column, labels in BITMAP_COLUMNS.items():
+            if column in self.frame.columns:
+                values = self.frame[column]
+            else:
+                values = size_category(self.frame['Size USD'])
+            codes = group_codes(values, labels)
+            self.bitmaps[column] = {label: np.packbits(codes == i) for i, label in enumerate(labels)}
+        self._index_accounts()
+
+    @classmethod
+    def from_arrays(cls, frame, arrays):
+        """Index over a `frame` already sorted by day, from the arrays() of its index.
+
+        Nothing is rebuilt or copied, so the arrays may be read-only memory maps.
+        """
+        index = cls.__new__(cls)
+        index.frame = frame
+        index.days = arrays['days']
+        index.bitmaps = {column: dict(zip(labels, arrays[column]))
+                         for column, labels in BITMAP_COLUMNS.items()}
+        index._index_accounts()
+        return index
+
+    def arrays(self):
+        """Day numbers and one (labels x bytes) bitmap array per column, by name."""
+        arrays = {'days': self.days}
+        for column, bitmaps in self.bitmaps.items():
+            arrays[column] = np.stack(list(bitmaps.values()))
+        return arrays
+
+    def _index_accounts(self):
+        if ACCOUNT_COLUMN not in self.frame.columns:
+            self.accounts = pd.Index([])
+            self.account_codes = np.full(len(self.frame), -1, dtype='int8')
+            return
+        # A categorical Account column (as in merged_data) is used without copying its codes
+        accounts = self.frame[ACCOUNT_COLUMN].astype('category')
+        self.accounts = accounts.cat.categories
+        self.account_codes = accounts.cat.codes.to_numpy()
+
+    def __len__(self):
+        return len(self.days)
+
+    def bounds(self, start=None, end=None):
+        """Row range [lo, hi) of the days in [start, end]; either bound may be None."""
+        lo = 0 if start is None else int(np.searchsorted(self.days, day_number(start), 'left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, day_number(end), 'right'))
+        return lo, max(lo, hi)
+
+    def mask(self, lo, hi, filters):
+        """Boolean mask over rows [lo, hi) of the rows matching every filter."""
+        first, last = lo // 8, -(-hi // 8)
+        bits = None
+        accounts = None
+        for column, labels in filters:
+            if column == ACCOUNT_COLUMN:
+                accounts = labels
+                continue
+            bitmaps = self.bitmaps[column]
+            chosen = reduce(np.bitwise_or, [bitmaps[label][first:last] for label in labels])
+            bits = chosen if bits is None else bits & chosen
+
+        if bits is None:
+            mask = np.ones(hi - lo, dtype=bool)
+        else:
+            mask = np.unpackbits(bits)[lo - first * 8:hi - first * 8].view(bool)
+        if accounts is not None:
+            # One slot per account plus a trailing False slot that code -1 (no account) lands on
+            lookup = np.zeros(len(self.accounts) + 1, dtype=bool)
+            positions = self.accounts.get_indexer(list(accounts))
+            lookup[positions[positions >= 0]] = True
+            mask &= lookup[self.account_codes[lo:hi]]
+        return mask
+
+    def select(self, start=None, end=None, filters=()):
+        """Rows with days in [start, end] matching `filters` (see make_filters())."""
+        lo, hi = self.bounds(start, end)
+        if not filters:
+            return self.frame.iloc[lo:hi].reset_index(drop=True)
+        rows = lo + np.flatnonzero(self.mask(lo, hi, filters))
+        return self.frame.take(rows).reset_index(drop=True)
+
+    def account_counts(self):
+        """Rows per account, most active first."""
+        counts = np.bincount(self.account_codes[self.account_codes >= 0], minlength=len(self.accounts))
+        return pd.Series(counts, index=self.accounts).sort_values(ascending=False, kind='stable')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter trades through the date/bitmap index")
+    parser.add_argument('--start', help="first trade day (YYYY-MM-DD)")
+    parser.add_argument('--end', help="last trade day (YYYY-MM-DD)")
+    parser.add_argument('--sentiment', action='append', choices=SENTIMENT_ORDER)
+    parser.add_argument('--side', action='append', choices=SIDES)
+    parser.add_argument('--size', action='append', choices=SIZE_LABELS)
+    parser.add_argument('--account', action='append')
+    args = parser.parse_args()
+
+    merged_data, _ = load_merged_data(find_trader_file())
+    index = FrameIndex(merged_data)
+    filters = make_filters(classification=args.sentiment, Side=args.side,
+                           Trade_Size_Category=args.size, Account=args.account)
+    start = time.perf_counter()
+    trades = index.select(args.start, args.end, filters)
+    metrics = compute_metrics(trades)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"[OK] {len(trades):,} of {len(index):,} trades selected; metrics in {elapsed:.1f} ms")
+    table = metrics.performance_table()
+    print(table[table['Trade_Count'] > 0].round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
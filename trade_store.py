@@ -0,0 +1,320 @@
+"""
+Incremental Trade Store
+=======================
+Append-only store of cleaned, sentiment-tagged trades for workflows where new
+Hyperliquid exports arrive as batches instead of one ever-growing CSV.
+
+Ingesting a batch:
+  1. reads the batch with its fill identifiers (Transaction Hash, Trade ID),
+  2. drops fills already in the store or repeated within the batch,
+  3. cleans and tags only the new rows (see pipeline.py),
+  4. appends them as new Parquet parts, one per year/month partition, and
+  5. adds their aggregate cube (see cube.py) onto the stored cube.
+
+Existing trades are never re-read, re-cleaned or re-aggregated. New trades
+dated after the last Fear/Greed reading are parked in a pending file and
+tagged on a later ingest, once the index covers their day; trades on days
+the index skips or predates are dropped, as merge_sentiment() does.
+
+Every file an ingest writes carries its batch number, and the manifest,
+replaced last, names the current cube, pending and id files and counts the
+committed batches. An interrupted ingest therefore changes nothing readers
+or the next ingest see, and the next ingest deletes its leftovers first.
+
+Reads for a date range only open the partitions overlapping it, and only
+the requested columns; row groups outside the range are skipped using the
+Parquet statistics of the `date` column.
+
+Usage:
+    python trade_store.py ingest historical_data.csv [--fear-greed FILE]
+    python trade_store.py info
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+from pipeline import (FEAR_GREED_FILE, TRADER_COLUMNS, ID_COLUMNS, SENTIMENT_ORDER,
+                      load_fear_greed, load_trader_data, clean_trader_data,
+                      merge_sentiment, filter_dates, SentimentLookup)
+from cube import build_cube, combine_cubes, restore_key_dtypes
+
+STORE_DIR = 'trade_store'
+
+# Bump whenever the layout or the stored columns change
+STORE_VERSION = 7
+
+# Per-batch store files, named <kind>-NNNNN.<ext> after the batch that wrote them
+STORE_FILES = {'cube': 'parquet', 'pending': 'parquet', 'ids': 'npy'}
+
+
+def trade_keys(trader_data):
+    """64-bit key per raw fill, used to recognise fills seen in earlier batches.
+
+    Keys are built from the fill identifiers when the export has them, and
+    from the whole row otherwise.
+    """
+    ids = [col for col in ID_COLUMNS if col in trader_data.columns]
+    if ids:
+        key_frame = pd.DataFrame(index=trader_data.index)
+        if 'Transaction Hash' in ids:
+            key_frame['hash'] = trader_data['Transaction Hash'].astype(str).str.lower()
+        if 'Trade ID' in ids:
+            # Trade IDs come back as floats when the column has gaps
+            key_frame['trade_id'] = pd.to_numeric(trader_data['Trade ID'], errors='coerce')
+    else:
+        key_frame = trader_data[[col for col in TRADER_COLUMNS if col in trader_data.columns]]
+        key_frame = key_frame.astype(str)
+    return pd.util.hash_pandas_object(key_frame, index=False).to_numpy(dtype='uint64')
+
+
+def batch_number(name):
+    """Batch number of a store file named <kind>-NNNNN.<ext>."""
+    return int(name.split('-')[1].split('.')[0])
+
+
+class TradeStore:
+    """Directory of Parquet trade parts plus their running aggregate cube.
+
+    Layout (NNNNN is the number of the batch that wrote the file):
+        manifest.json           store version, ingested batches, row counts and
+                                the current cube/pending/ids files
+        ids-NNNNN.npy           sorted keys of every fill seen so far
+        trades/year=YYYY/month=MM/part-NNNNN.parquet
+                                merged trades, one part per batch and month
+        pending-NNNNN.parquet   cleaned trades still waiting for a sentiment
+        cube-NNNNN.parquet      aggregate cube over all stored trades
+    """
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        self.trades_dir = os.path.join(path, 'trades')
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def manifest(self):
+        if not self.exists():
+            return {'version': STORE_VERSION, 'batches': [], 'rows': 0, 'pending': 0,
+                    'partitions': {}, 'first_date': None, 'last_date': None,
+                    'files': dict.fromkeys(STORE_FILES)}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != STORE_VERSION:
+            raise ValueError(f"{self.path} was written by an incompatible store version; "
+                             "delete it and ingest the batches again")
+        return manifest
+
+    def version(self):
+        """Short identifier of the stored dataset, changing with every ingest."""
+        manifest = self.manifest()
+        state = f"{STORE_VERSION}|{len(manifest['batches'])}|{manifest['rows']}"
+        if manifest['batches']:
+            state += '|' + manifest['batches'][-1]['ingested_at']
+        return hashlib.sha1(state.encode('utf-8')).hexdigest()[:12]
+
+    def file_path(self, kind, manifest=None):
+        """Path of the committed cube, pending or ids file, or None if there is none."""
+        name = (manifest or self.manifest())['files'][kind]
+        return None if name is None else os.path.join(self.path, name)
+
+    def seen_ids(self, manifest=None):
+        path = self.file_path('ids', manifest)
+        if path is None:
+            return np.array([], dtype='uint64')
+        return np.load(path)
+
+    def date_range(self):
+        """(first, last) trade day in the store, as Timestamps, or (None, None)."""
+        manifest = self.manifest()
+        if manifest['first_date'] is None:
+            return None, None
+        return pd.Timestamp(manifest['first_date']), pd.Timestamp(manifest['last_date'])
+
+    def partition_files(self, start=None, end=None):
+        """Part files of the year/month partitions overlapping [start, end]."""
+        first = None if start is None else pd.Timestamp(start).to_period('M')
+        last = None if end is None else pd.Timestamp(end).to_period('M')
+        manifest = self.manifest()
+        committed = len(manifest['batches'])
+        files = []
+        for key in sorted(manifest['partitions']):
+            month = pd.Period(key, freq='M')
+            if (first is not None and month < first) or (last is not None and month > last):
+                continue
+            folder = os.path.join(self.trades_dir, f'year={month.year}', f'month={month.month:02d}')
+            files.extend(os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                         if batch_number(name) < committed)
+        return files
+
+    def load_trades(self, columns=None, start=None, end=None):
+        """Stored trades with days in [start, end] (both optional), with the same
+        columns and dtypes as load_merged_data()."""
+        # With no partition in range, one part still supplies the schema; the
+        # date filter below then selects no rows from it
+        files = self.partition_files(start, end) or self.partition_files()[:1]
+        if not files:
+            raise FileNotFoundError(f"Trade store {self.path} holds no trades yet")
+        condition = None
+        if start is not None:
+            condition = ds.field('date') >= pd.Timestamp(start)
+        if end is not None:
+            upper = ds.field('date') <= pd.Timestamp(end)
+            condition = upper if condition is None else condition & upper
+        table = ds.dataset(files, format='parquet').to_table(columns=columns, filter=condition)
+        trades = table.to_pandas()
+        if 'classification' in trades.columns:
+            trades['classification'] = pd.Categorical(trades['classification'],
+                                                      categories=SENTIMENT_ORDER)
+        return trades
+
+    def load_cube(self, start=None, end=None, manifest=None):
+        """The stored aggregate cube, restricted to days in [start, end]."""
+        cube = pd.read_parquet(self.file_path('cube', manifest))
+        return restore_key_dtypes(filter_dates(cube, start, end))
+
+    def _write(self, table, path):
+        table.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def _batch_file(self, kind, batch):
+        return f'{kind}-{batch:05d}.{STORE_FILES[kind]}'
+
+    def _discard_uncommitted(self, manifest):
+        """Delete files left by an ingest that stopped before writing its manifest,
+        and files of earlier batches the manifest no longer names."""
+        committed = len(manifest['batches'])
+        current = set(manifest['files'].values())
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if name.split('-')[0] in STORE_FILES and name not in current:
+                    os.remove(os.path.join(self.path, name))
+        for folder, _, names in os.walk(self.trades_dir):
+            for name in names:
+                if batch_number(name) >= committed:
+                    os.remove(os.path.join(folder, name))
+
+    def ingest(self, batch_path, fear_greed):
+        """Add the new fills of a batch file to the store and return a summary dict.
+
+        `fear_greed` may be the loaded index or a prebuilt SentimentLookup.
+        """
+        manifest = self.manifest()
+        self._discard_uncommitted(manifest)
+        lookup = fear_greed if isinstance(fear_greed, SentimentLookup) else SentimentLookup(fear_greed)
+
+        raw = load_trader_data(batch_path, extra_columns=ID_COLUMNS)
+        keys = trade_keys(raw)
+        seen = self.seen_ids(manifest)
+
+        # New = first occurrence within the batch and not seen in earlier batches
+        _, first = np.unique(keys, return_index=True)
+        is_new = np.zeros(len(raw), dtype=bool)
+        is_new[first] = True
+        is_new &= ~np.isin(keys, seen)
+        new_keys = keys[is_new]
+
+        new_trades = clean_trader_data(raw[is_new].drop(columns=ID_COLUMNS, errors='ignore'))
+        pending_path = self.file_path('pending', manifest)
+        if pending_path is not None:
+            new_trades = pd.concat([pd.read_parquet(pending_path), new_trades], ignore_index=True)
+
+        # Trades after the last index day wait for a later ingest; days the
+        # index skips or predates never get a reading and are dropped
+        ordinal = lookup.day_ordinal(new_trades['date'])
+        covered = lookup.matches(ordinal)
+        waiting = ordinal >= len(lookup.code)
+        pending = new_trades[waiting]
+        dropped = int((~covered & ~waiting).sum())
+        merged = merge_sentiment(new_trades[covered], lookup)
+
+        # Everything below is written under this batch's number and only
+        # becomes part of the store when the manifest naming it is replaced
+        part = len(manifest['batches'])
+        previous = [self.file_path(kind, manifest) for kind in STORE_FILES]
+        if len(merged):
+            months = merged['date'].dt.to_period('M')
+            for month, rows in merged.groupby(months, sort=True).indices.items():
+                folder = os.path.join(self.trades_dir, f'year={month.year}', f'month={month.month:02d}')
+                os.makedirs(folder, exist_ok=True)
+                self._write(merged.iloc[rows], os.path.join(folder, f'part-{part:05d}.parquet'))
+                key = str(month)
+                manifest['partitions'][key] = manifest['partitions'].get(key, 0) + len(rows)
+            first, last = merged['date'].min(), merged['date'].max()
+            if manifest['first_date'] is not None:
+                first = min(first, pd.Timestamp(manifest['first_date']))
+                last = max(last, pd.Timestamp(manifest['last_date']))
+            manifest['first_date'] = first.date().isoformat()
+            manifest['last_date'] = last.date().isoformat()
+            stored_cube = None if manifest['files']['cube'] is None else self.load_cube(manifest=manifest)
+            manifest['files']['cube'] = self._batch_file('cube', part)
+            self._write(combine_cubes(stored_cube, build_cube(merged)), self.file_path('cube', manifest))
+        manifest['files']['pending'] = None
+        if len(pending):
+            manifest['files']['pending'] = self._batch_file('pending', part)
+            self._write(pending.reset_index(drop=True), self.file_path('pending', manifest))
+        manifest['files']['ids'] = self._batch_file('ids', part)
+        np.save(self.file_path('ids', manifest), np.union1d(seen, new_keys))
+
+        batch = {
+            'file': os.path.abspath(batch_path),
+            'rows_read': len(raw),
+            'new_fills': int(is_new.sum()),
+            'duplicates': int(len(raw) - is_new.sum()),
+            'stored': len(merged),
+            'pending': len(pending),
+            'dropped': dropped,
+            'ingested_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        manifest['batches'].append(batch)
+        manifest['rows'] += len(merged)
+        manifest['pending'] = len(pending)
+        # Replacing the manifest commits the batch; before that, the previous
+        # manifest still names the previous files and batch count
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        for path in previous:
+            if path is not None and path not in [self.file_path(kind, manifest) for kind in STORE_FILES]:
+                os.remove(path)
+        return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=STORE_DIR, help='store directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='append new trades from batch CSV files')
+    ingest.add_argument('batches', nargs='+', help='trader CSV exports to ingest, in order')
+    ingest.add_argument('--fear-greed', default=FEAR_GREED_FILE, help='Fear/Greed Index CSV')
+    commands.add_parser('info', help='show the ingested batches and partitions')
+    args = parser.parse_args()
+
+    store = TradeStore(args.store)
+    if args.command == 'ingest':
+        lookup = SentimentLookup(load_fear_greed(args.fear_greed))
+        for path in args.batches:
+            batch = store.ingest(path, lookup)
+            print(f"[OK] {path}: {batch['rows_read']:,} rows read, "
+                  f"{batch['new_fills']:,} new, {batch['duplicates']:,} duplicates")
+            print(f"  Stored: {batch['stored']:,} trades, pending sentiment: {batch['pending']:,}, "
+                  f"dropped (no reading for their day): {batch['dropped']:,}")
+
+    manifest = store.manifest()
+    print(f"\nStore {store.path} (version {store.version()}): "
+          f"{manifest['rows']:,} trades from {len(manifest['batches'])} batches, "
+          f"{manifest['pending']:,} pending")
+    if args.command == 'info' and manifest['partitions']:
+        print(f"  Date range: {manifest['first_date']} to {manifest['last_date']}")
+        for month, rows in sorted(manifest['partitions'].items()):
+            print(f"  {month}: {rows:,} trades")
+
+
+if __name__ == '__main__':
+    main()